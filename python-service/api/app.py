@@ -20,6 +20,13 @@ from utils.environment import environment, is_development, is_production, get_co
 
 # 导入路由
 from api.routes.ocr_routes import ocr_bp
+from services.batch_inference import get_batch_stats
+from services.predictor_pool import get_predictor_pool_stats
+from services.detection_cache import get_detection_cache_stats
+from services.image_cache import get_image_cache_stats
+from services.storage_janitor import start_storage_janitor, get_storage_janitor_stats
+from services.model_warmup import get_model_status
+from utils.file_index import get_file_index
 # from api.routes.upload_routes import upload_bp  # 暂时禁用上传路由
 # from api.routes.image_proxy_routes import image_proxy_bp  # 暂时禁用图像代理路由
 from utils.log_client import info, error
@@ -98,20 +105,73 @@ def create_app(config: Optional[dict] = None) -> Flask:
         except Exception as e:
             error(f"尝试删除results目录时出错: {e}")
 
+    # 在后台重建图片ID到文件路径的索引，建立之前按ID查找时仍扫描目录
+    get_file_index().rebuild_in_background([
+        app.config['UPLOAD_FOLDER'],
+        app.config['TEMP_FOLDER'],
+        app.config['CROPS_FOLDER'],
+        app.config['DOWNLOADS_FOLDER']
+    ])
+
+    # 后台按TTL和容量上限清理文件（由ENABLE_FILE_CLEANUP控制，生产环境总是启用）
+    start_storage_janitor({
+        'uploads': app.config['UPLOAD_FOLDER'],
+        'temp': app.config['TEMP_FOLDER'],
+        'crops': app.config['CROPS_FOLDER'],
+        'downloads': app.config['DOWNLOADS_FOLDER']
+    })
+
     # 注册蓝图
     app.register_blueprint(ocr_bp)
     # app.register_blueprint(upload_bp)  # 暂时禁用上传路由
     # app.register_blueprint(image_proxy_bp)  # 暂时禁用图像代理路由
 
+    # 只有注册了检测路由（上传蓝图）时才需要模型，/health据此决定是否按模型就绪状态返回503
+    app.config['DETECTION_ENABLED'] = 'upload' in app.blueprints
+
     # 健康检查端点
     @app.route('/health')
     def health_check():
         """健康检查端点"""
-        return jsonify({
+        health = {
             'status': 'healthy',
             'service': 'OCR Python Service',
             'version': '1.0.0'
-        })
+        }
+
+        # 模型就绪状态，启用检测路由时预热完成前返回503，负载均衡只把请求发给已预热的worker
+        model_status = get_model_status()
+        health['model'] = model_status
+        model_unready = app.config['DETECTION_ENABLED'] and not model_status['ready']
+        if model_unready:
+            health['status'] = 'warming' if model_status['status'] == 'loading' else 'unhealthy'
+
+        # 检测批处理指标（队列深度、批次大小）
+        batch_stats = get_batch_stats()
+        if batch_stats is not None:
+            health['detector_batching'] = batch_stats
+
+        # 预测器池：借出次数、等待空闲预测器的次数和时间
+        pool_stats = get_predictor_pool_stats()
+        if pool_stats is not None:
+            health['predictor_pool'] = pool_stats
+
+        # 检测结果缓存命中/未命中计数
+        cache_stats = get_detection_cache_stats()
+        if cache_stats is not None:
+            health['detection_cache'] = cache_stats
+
+        # 图片代理派生图片缓存命中/未命中计数
+        image_cache_stats = get_image_cache_stats()
+        if image_cache_stats is not None:
+            health['image_cache'] = image_cache_stats
+
+        # 存储清理：删除的文件数和回收的空间
+        storage_stats = get_storage_janitor_stats()
+        if storage_stats is not None:
+            health['storage'] = storage_stats
+
+        return jsonify(health), (503 if model_unready else 200)
 
     # 注册请求前处理器
     @app.before_request
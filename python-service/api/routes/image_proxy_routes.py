@@ -25,9 +25,10 @@ def get_image(image_id):
     - width: 可选，指定宽度
     - height: 可选，指定高度
     - format: 可选，指定格式 (jpeg, png, gif, webp)
+    - quality: 可选，编码质量 (1-95，仅jpeg/webp)
     
     返回:
-    - 图片文件
+    - 图片文件（带ETag，If-None-Match匹配时返回304）
     """
     info(f"收到图片请求，图片ID: {image_id}")
     
@@ -35,6 +36,7 @@ def get_image(image_id):
     width = request.args.get('width')
     height = request.args.get('height')
     format = request.args.get('format')
+    quality = request.args.get('quality', type=int)
     
     # 转换参数类型
     if width:
@@ -53,7 +55,7 @@ def get_image(image_id):
     image_proxy = get_image_proxy()
     
     # 获取图片响应
-    return image_proxy.get_image_response(image_id, width, height, format)
+    return image_proxy.get_image_response(image_id, width, height, format, quality)
 
 @image_proxy_bp.route('/images/info/<image_id>', methods=['GET'])
 @limiter.limit("60 per minute")
@@ -11,21 +11,124 @@ import uuid
 import json
 import shutil
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, Response
 from api.app import limiter
 
 # 导入服务
 from services.detector import get_detector
 from services.cropper import get_cropper
 from services.ocr_service import process_ocr_request
+from services.annotation import ensure_detect_image
+from services.upload_store import persist_upload, persist_upload_async, wait_for_upload
 from utils.log_client import info, error, warn
 from utils.file_hash import get_file_hash_manager
+from utils.file_index import get_file_index, parse_image_id
+from utils.environment import get_config
+from utils.zip_stream import ManifestEntryError, load_manifest, iter_zip_stream
 
 # 创建蓝图
 upload_bp = Blueprint('upload', __name__)
 
+def _to_frontend_rectangles(detected_objects: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """把检测结果转换为前端需要的矩形格式"""
+    frontend_rectangles = []
+    for obj in detected_objects:
+        bbox = obj['bbox']
+        rect_id = str(obj['id'])
+
+        # 计算坐标
+        x_min = bbox['x_min']
+        y_min = bbox['y_min']
+        x_max = bbox['x_max']
+        y_max = bbox['y_max']
+
+        frontend_rectangles.append({
+            "id": rect_id,
+            "class": obj['class'],
+            "confidence": obj['confidence'],
+            "coords": {
+                "topLeft": {"x": x_min, "y": y_min},
+                "bottomRight": {"x": x_max, "y": y_max}
+            }
+        })
+    return frontend_rectangles
+
+
+def _detect_pdf_upload(file_id: str, original_filename: str, filename: str, filepath: str, file_data: bytes,
+                       imgsz: int, conf: float, temp_folder: str, annotate: bool):
+    """
+    逐页检测上传的PDF，每页对应一张检测结果图像（annotate为False时在第一次请求时生成）
+
+    返回的顶层字段与图片上传一致（取第一页），pages 中包含每一页的结果
+    """
+    dpi = int(request.form.get('dpi', 150))
+    batch = int(request.form.get('batch', 4))
+
+    try:
+        result = get_detector().detect_pdf(file_data, imgsz=imgsz, conf=conf, dpi=dpi, batch=batch, annotate=annotate)
+        if not result['success']:
+            error(f"PDF检测失败: {result.get('error')}")
+            return jsonify({'success': False, 'error': result.get('error')}), 500
+
+        pages = []
+        written = []
+        for page in result['pages']:
+            detect_filename = f"{file_id}_p{page['page']}_detect.jpg"
+            if page.get('annotated_bytes'):
+                detect_filepath = os.path.join(temp_folder, detect_filename)
+                with open(detect_filepath, 'wb') as f:
+                    f.write(page['annotated_bytes'])
+                written.append((detect_filepath, temp_folder))
+
+            rectangles = _to_frontend_rectangles(page['detected_objects'])
+            pages.append({
+                'page': page['page'],
+                'width': page['width'],
+                'height': page['height'],
+                'detect_image_url': f'/temp/{detect_filename}',
+                'rectangles': rectangles,
+                'rectangles_count': len(rectangles)
+            })
+
+        # 保存逐页的JSON结果
+        json_filepath = os.path.join(temp_folder, f"{file_id}_result.json")
+        with open(json_filepath, 'w', encoding='utf-8') as f:
+            json.dump({
+                "image_id": file_id,
+                "image_filename": original_filename,
+                "image_path": filepath,
+                "dpi": dpi,
+                "page_count": result['page_count'],
+                "pages": [{k: v for k, v in page.items() if k != 'annotated_bytes'} for page in result['pages']]
+            }, f, ensure_ascii=False, indent=2)
+        written.append((json_filepath, temp_folder))
+        get_file_index().add_many(written)
+
+        first = pages[0]
+        info(f"PDF检测成功: image_id={file_id}, 页数={len(pages)}")
+        return jsonify({
+            'success': True,
+            'message': '检测成功',
+            'image_id': file_id,
+            'filename': original_filename,
+            'detect_image_url': first['detect_image_url'],
+            'original_image_url': f'/uploads/{filename}',
+            'width': first['width'],
+            'height': first['height'],
+            'rectangles': first['rectangles'],
+            'rectangles_count': first['rectangles_count'],
+            'page_count': len(pages),
+            'pages': pages
+        })
+
+    except Exception as e:
+        import traceback
+        error(f"处理PDF文件时发生错误: {str(e)}", metadata={'traceback': traceback.format_exc()})
+        return jsonify({'success': False, 'error': f'处理PDF文件时发生错误: {str(e)}'}), 500
+
+
 @upload_bp.route('/upload', methods=['POST'])
 @limiter.limit("30 per minute")
 def upload_file():
@@ -111,24 +214,41 @@ def upload_file():
     # 生成唯一文件名防止覆盖
     file_id = str(uuid.uuid4())
 
-    # 直接保存到上传文件夹
+    # 读取上传内容到内存，检测直接使用内存中的数据
     try:
         filename = f"{file_id}_{file.filename}"
         filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        info(f"文件已保存到: {filepath}")
+        file_data = file.read()
     except Exception as e:
-        error(f"保存文件时出错: {e}")
-        return jsonify({'success': False, 'error': f'保存文件时出错: {e}'}), 500
+        error(f"读取上传文件时出错: {e}")
+        return jsonify({'success': False, 'error': f'读取上传文件时出错: {e}'}), 500
+
+    # 保存原始文件（默认后台写入，读取该ID文件的请求会等待写入完成，包括其他worker中的请求）
+    persist_mode = get_config('upload')['persist_mode']
+    if persist_mode == 'sync':
+        try:
+            persist_upload(filepath, file_data)
+        except Exception as e:
+            return jsonify({'success': False, 'error': f'保存文件时出错: {e}'}), 500
+    elif persist_mode != 'none':
+        persist_upload_async(file_id, filepath, file_data)
 
     # 设置预测参数
     imgsz = int(request.form.get('imgsz', 1024))
     conf = float(request.form.get('conf', 0.2))
 
+    # 标注图像默认在第一次请求时生成；不保存原始文件时无法事后生成，只能在检测时绘制
+    annotate = get_config('detector')['annotate_mode'] == 'eager' or persist_mode == 'none'
+
+    # PDF逐页检测，返回每一页的检测结果
+    if file.filename.lower().endswith('.pdf'):
+        return _detect_pdf_upload(file_id, file.filename, filename, filepath, file_data, imgsz, conf,
+                                  TEMP_FOLDER, annotate)
+
     try:
         # 获取检测器实例并进行预测
         detector = get_detector()
-        result = detector.detect(filepath, imgsz=imgsz, conf=conf)
+        result = detector.detect_bytes(file_data, imgsz=imgsz, conf=conf, source=filepath, annotate=annotate)
 
         if not result['success']:
             error(f"检测失败: {result.get('error')}")
@@ -139,13 +259,15 @@ def upload_file():
         height = result['height']
         detected_objects = result['detected_objects']
 
-        # 直接保存检测结果图像到结果文件夹
+        # 保存检测结果图像到结果文件夹（检测器或缓存已有JPEG时直接写入，否则在第一次请求时生成）
+        detect_filename = f"{file_id}_detect.jpg"
         try:
-            annotated_frame = result['annotated_frame']
-            detect_filename = f"{file_id}_detect.jpg"
-            detect_filepath = os.path.join(TEMP_FOLDER, detect_filename)
-            annotated_frame.save(detect_filepath)
-            info(f"检测结果图像已保存到: {detect_filepath}")
+            if result.get('annotated_bytes'):
+                detect_filepath = os.path.join(TEMP_FOLDER, detect_filename)
+                with open(detect_filepath, 'wb') as f:
+                    f.write(result['annotated_bytes'])
+                get_file_index().add(detect_filepath, TEMP_FOLDER)
+                info(f"检测结果图像已保存到: {detect_filepath}")
         except Exception as e:
             error(f"保存检测结果图像时出错: {e}")
             return jsonify({'success': False, 'error': f'保存检测结果图像时出错: {e}'}), 500
@@ -166,6 +288,7 @@ def upload_file():
 
             with open(json_filepath, 'w', encoding='utf-8') as f:
                 json.dump(json_data, f, ensure_ascii=False, indent=2)
+            get_file_index().add(json_filepath, TEMP_FOLDER)
 
             info(f"JSON结果已保存到: {json_filepath}")
         except Exception as e:
@@ -173,26 +296,7 @@ def upload_file():
             return jsonify({'success': False, 'error': f'保存JSON结果时出错: {e}'}), 500
 
         # 转换为前端需要的矩形格式
-        frontend_rectangles = []
-        for obj in detected_objects:
-            bbox = obj['bbox']
-            rect_id = str(obj['id'])
-
-            # 计算坐标
-            x_min = bbox['x_min']
-            y_min = bbox['y_min']
-            x_max = bbox['x_max']
-            y_max = bbox['y_max']
-
-            frontend_rectangles.append({
-                "id": rect_id,
-                "class": obj['class'],
-                "confidence": obj['confidence'],
-                "coords": {
-                    "topLeft": {"x": x_min, "y": y_min},
-                    "bottomRight": {"x": x_max, "y": y_max}
-                }
-            })
+        frontend_rectangles = _to_frontend_rectangles(detected_objects)
 
         response_data = {
             'success': True,
@@ -283,7 +387,8 @@ def crop_image():
         error(f"未提供矩形信息，image_id: {image_id}")
         return jsonify({'success': False, 'error': '未提供矩形信息'}), 400
 
-    # 获取裁剪器实例并执行裁剪
+    # 获取裁剪器实例并执行裁剪（原始文件仍在后台保存时先等待写入完成）
+    wait_for_upload(image_id)
     cropper = get_cropper(UPLOAD_FOLDER, RESULTS_FOLDER, CROPS_FOLDER, DOWNLOADS_FOLDER, TEMP_FOLDER)
     result = cropper.crop_image(image_id, rectangles)
 
@@ -372,6 +477,7 @@ def extract_text():
 def uploaded_file(filename):
     """提供上传的文件"""
     UPLOAD_FOLDER = current_app.config['UPLOAD_FOLDER']
+    wait_for_upload(parse_image_id(filename))
     return send_from_directory(UPLOAD_FOLDER, filename)
 
 @upload_bp.route('/uploads/by-id/<image_id>')
@@ -381,25 +487,31 @@ def uploaded_file_by_id(image_id):
     import os
 
     info(f"通过ID请求图片: {image_id}, 上传文件夹: {UPLOAD_FOLDER}")
+    wait_for_upload(image_id)
 
     # 确保目录存在
     if not os.path.exists(UPLOAD_FOLDER):
         error(f"上传文件夹不存在: {UPLOAD_FOLDER}")
         return jsonify({'success': False, 'error': f'上传文件夹不存在'}), 500
 
-    # 列出目录内容
-    try:
-        files = os.listdir(UPLOAD_FOLDER)
-        info(f"上传文件夹中的文件数量: {len(files)}")
-    except Exception as e:
-        error(f"列出上传文件夹内容时出错: {str(e)}")
-        return jsonify({'success': False, 'error': f'列出上传文件夹内容时出错: {str(e)}'}), 500
+    # 优先查询文件索引，索引尚未建立时才列出目录内容
+    file_index = get_file_index()
+    if file_index.is_ready():
+        matching_files = [os.path.basename(path) for path in file_index.find(image_id, [UPLOAD_FOLDER])
+                          if os.path.dirname(os.path.abspath(path)) == os.path.abspath(UPLOAD_FOLDER)]
+    else:
+        try:
+            files = os.listdir(UPLOAD_FOLDER)
+            info(f"上传文件夹中的文件数量: {len(files)}")
+        except Exception as e:
+            error(f"列出上传文件夹内容时出错: {str(e)}")
+            return jsonify({'success': False, 'error': f'列出上传文件夹内容时出错: {str(e)}'}), 500
 
-    # 查找以image_id开头的文件
-    matching_files = []
-    for filename in files:
-        if filename.startswith(f"{image_id}_"):
-            matching_files.append(filename)
+        # 查找以image_id开头的文件
+        matching_files = []
+        for filename in files:
+            if filename.startswith(f"{image_id}_"):
+                matching_files.append(filename)
 
     if matching_files:
         selected_file = matching_files[0]
@@ -417,9 +529,9 @@ def temp_file(filename):
     # 记录请求信息
     info(f"请求临时文件: {filename}, 临时文件夹: {TEMP_FOLDER}")
 
-    # 检查文件是否存在
+    # 检查文件是否存在，标注图像不存在时按需生成
     file_path = os.path.join(TEMP_FOLDER, filename)
-    if not os.path.exists(file_path):
+    if not os.path.exists(file_path) and not ensure_detect_image(filename, TEMP_FOLDER, current_app.config['UPLOAD_FOLDER']):
         error(f"临时文件不存在: {file_path}")
         return jsonify({'success': False, 'error': f'临时文件不存在: {filename}'}), 404
 
@@ -473,6 +585,36 @@ def crop_file(filename):
     # 使用明确的MIME类型
     return send_from_directory(CROPS_FOLDER, filename, mimetype=mimetype)
 
+def _resolve_manifest_entry(entry: Dict[str, Any]) -> str:
+    """
+    找到清单条目记录的内容所在的文件，只做stat，不读取内容
+
+    原路径存在且大小与清单一致时使用原路径，否则（已被覆盖或删除）按内容哈希查找同内容的其他文件；
+    内容本身在输出时边读取边校验
+    """
+    arcname, file_hash = entry.get('arcname'), entry.get('hash')
+    if not file_hash:
+        raise ManifestEntryError(f"ZIP清单条目缺少内容哈希: {arcname}")
+
+    def matches(path):
+        try:
+            return bool(path) and os.path.isfile(path) and (
+                entry.get('size') is None or os.path.getsize(path) == entry['size'])
+        except OSError:
+            return False
+
+    path = entry.get('path')
+    if matches(path):
+        return path
+    path = get_file_hash_manager().get_file_by_hash(file_hash)
+    if matches(path):
+        return path
+    raise ManifestEntryError(f"ZIP条目的内容已被修改或删除: {arcname}")
+
+def _open_manifest_entry(entry: Dict[str, Any]) -> BinaryIO:
+    """打开清单条目的文件，读取时校验内容哈希，内容与清单不一致时中止输出，不会输出更新后的内容"""
+    return get_file_hash_manager().open_verified(_resolve_manifest_entry(entry), entry['hash'])
+
 @upload_bp.route('/downloads/<path:filename>')
 def download_file(filename):
     """提供下载文件"""
@@ -484,6 +626,22 @@ def download_file(filename):
     # 检查文件是否存在
     file_path = os.path.join(DOWNLOADS_FOLDER, filename)
     if not os.path.exists(file_path):
+        # 裁剪结果的ZIP只保存清单，按清单流式打包
+        manifest = load_manifest(file_path) if filename.endswith('.zip') else None
+        if manifest is not None:
+            info(f"按清单流式输出ZIP: {filename}, 条目数: {len(manifest.get('entries', []))}")
+            try:
+                stream = iter_zip_stream(manifest.get('entries', []), open_entry=_open_manifest_entry,
+                                         check_entry=_resolve_manifest_entry)
+            except ManifestEntryError as e:
+                error(f"无法按清单打包ZIP: {filename}, {e}")
+                return jsonify({'success': False, 'error': f'ZIP内容已失效，请重新裁剪: {e}'}), 410
+            return Response(
+                stream,
+                mimetype='application/zip',
+                headers={'Content-Disposition': f'attachment; filename={os.path.basename(filename)}'}
+            )
+
         error(f"下载文件不存在: {file_path}")
         return jsonify({'success': False, 'error': f'下载文件不存在: {filename}'}), 404
 
@@ -132,6 +132,15 @@ CFG_INT_KEYS = {
     "mask_ratio",
     "max_det",
     "vid_stride",
+    "pdf_dpi",
+    "pdf_prefetch",
+    "prefetch_batches",
+    "prefetch_workers",
+    "tile_size",
+    "tile_overlap",
+    "tile_batch",
+    "threads",
+    "inter_threads",
     "line_width",
     "workspace",
     "nbs",
@@ -172,7 +181,10 @@ CFG_BOOL_KEYS = {
     "nms",
     "profile",
     "multi_scale",
-    "fuse"
+    "fuse",
+    "fused_preprocess",
+    "pinned_input",
+    "rect_batching",
 }
 
 
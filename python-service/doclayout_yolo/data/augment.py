@@ -693,13 +693,18 @@ class LetterBox:
         self.stride = stride
         self.center = center  # Put the image in the middle or top-left
 
-    def __call__(self, labels=None, image=None):
-        """Return updated labels and image with added border."""
-        if labels is None:
-            labels = {}
-        img = labels.get("img") if image is None else image
-        shape = img.shape[:2]  # current shape [height, width]
-        new_shape = labels.pop("rect_shape", self.new_shape)
+    def geometry(self, shape, new_shape=None):
+        """
+        Compute the letterbox geometry for an image of the given shape.
+
+        Args:
+            shape (tuple): Source image (height, width).
+            new_shape (int | tuple, optional): Target shape, defaults to `self.new_shape`.
+
+        Returns:
+            (tuple): ratio (w, h), new_unpad (w, h), padding (dw, dh) and border (top, bottom, left, right).
+        """
+        new_shape = self.new_shape if new_shape is None else new_shape
         if isinstance(new_shape, int):
             new_shape = (new_shape, new_shape)
 
@@ -723,10 +728,55 @@ class LetterBox:
             dw /= 2  # divide padding into 2 sides
             dh /= 2
 
-        if shape[::-1] != new_unpad:  # resize
-            img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
         top, bottom = int(round(dh - 0.1)) if self.center else 0, int(round(dh + 0.1))
         left, right = int(round(dw - 0.1)) if self.center else 0, int(round(dw + 0.1))
+        return ratio, new_unpad, (dw, dh), (top, bottom, left, right)
+
+    def output_shape(self, shape, new_shape=None):
+        """Return the (height, width) of the letterboxed image for a source image of the given shape."""
+        _, (w, h), _, (top, bottom, left, right) = self.geometry(shape, new_shape)
+        return h + top + bottom, w + left + right
+
+    def fill(self, img, out):
+        """
+        Letterbox `img` directly into a preallocated buffer, without intermediate resized or bordered copies.
+
+        The image is resized straight into the interior region of `out` and only the border strips are filled, so the
+        result is identical to `__call__(image=img)` while touching each output pixel once.
+
+        Args:
+            img (np.ndarray): Source HWC image.
+            out (np.ndarray): Destination HWC buffer of shape `output_shape(img.shape[:2])`, same dtype and channels.
+
+        Returns:
+            (np.ndarray): `out`.
+        """
+        _, (w, h), _, (top, bottom, left, right) = self.geometry(img.shape[:2])
+        assert out.shape[:2] == (h + top + bottom, w + left + right), "letterbox buffer has the wrong shape"
+        interior = out[top : top + h, left : left + w]
+        if img.shape[:2] != (h, w):
+            resized = cv2.resize(img, (w, h), dst=interior, interpolation=cv2.INTER_LINEAR)
+            if not np.shares_memory(resized, interior):  # OpenCV could not write into the view
+                interior[...] = resized.reshape(interior.shape)
+        else:
+            interior[...] = img.reshape(interior.shape)
+        out[:top] = 114
+        out[top + h :] = 114
+        out[top : top + h, :left] = 114
+        out[top : top + h, left + w :] = 114
+        return out
+
+    def __call__(self, labels=None, image=None):
+        """Return updated labels and image with added border."""
+        if labels is None:
+            labels = {}
+        img = labels.get("img") if image is None else image
+        shape = img.shape[:2]  # current shape [height, width]
+        new_shape = labels.pop("rect_shape", self.new_shape)
+        ratio, new_unpad, (dw, dh), (top, bottom, left, right) = self.geometry(shape, new_shape)
+
+        if shape[::-1] != new_unpad:  # resize
+            img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
         img = cv2.copyMakeBorder(
             img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114)
         )  # add border
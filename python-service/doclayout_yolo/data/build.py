@@ -12,6 +12,7 @@ from torch.utils.data import dataloader, distributed
 from doclayout_yolo.data.loaders import (
     LOADERS,
     LoadImagesAndVideos,
+    LoadPdf,
     LoadPilAndNumpy,
     LoadScreenshots,
     LoadStreams,
@@ -19,7 +20,7 @@ from doclayout_yolo.data.loaders import (
     SourceTypes,
     autocast_list,
 )
-from doclayout_yolo.data.utils import IMG_FORMATS, VID_FORMATS
+from doclayout_yolo.data.utils import IMG_FORMATS, PDF_FORMATS, VID_FORMATS
 from doclayout_yolo.utils import RANK, colorstr
 from doclayout_yolo.utils.checks import check_file
 from .dataset import YOLODataset
@@ -156,7 +157,7 @@ def check_source(source):
     webcam, screenshot, from_img, in_memory, tensor = False, False, False, False, False
     if isinstance(source, (str, int, Path)):  # int for local usb camera
         source = str(source)
-        is_file = Path(source).suffix[1:] in (IMG_FORMATS | VID_FORMATS)
+        is_file = Path(source).suffix[1:].lower() in (IMG_FORMATS | VID_FORMATS | PDF_FORMATS)
         is_url = source.lower().startswith(("https://", "http://", "rtsp://", "rtmp://", "tcp://"))
         webcam = source.isnumeric() or source.endswith(".streams") or (is_url and not is_file)
         screenshot = source.lower() == "screen"
@@ -177,7 +178,7 @@ def check_source(source):
     return source, webcam, screenshot, from_img, in_memory, tensor
 
 
-def load_inference_source(source=None, batch=1, vid_stride=1, buffer=False):
+def load_inference_source(source=None, batch=1, vid_stride=1, buffer=False, dpi=150, prefetch=2):
     """
     Loads an inference source for object detection and applies necessary transformations.
 
@@ -186,6 +187,8 @@ def load_inference_source(source=None, batch=1, vid_stride=1, buffer=False):
         batch (int, optional): Batch size for dataloaders. Default is 1.
         vid_stride (int, optional): The frame interval for video sources. Default is 1.
         buffer (bool, optional): Determined whether stream frames will be buffered. Default is False.
+        dpi (int, optional): Rasterization DPI for PDF sources. Default is 150.
+        prefetch (int, optional): Number of PDF pages rasterized ahead of inference. Default is 2.
 
     Returns:
         dataset (Dataset): A dataset object for the specified input source.
@@ -204,6 +207,8 @@ def load_inference_source(source=None, batch=1, vid_stride=1, buffer=False):
         dataset = LoadScreenshots(source)
     elif from_img:
         dataset = LoadPilAndNumpy(source)
+    elif Path(source).suffix[1:].lower() in PDF_FORMATS:
+        dataset = LoadPdf(source, batch=batch, dpi=dpi, prefetch=prefetch)
     else:
         dataset = LoadImagesAndVideos(source, batch=batch, vid_stride=vid_stride)
 
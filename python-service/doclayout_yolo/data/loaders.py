@@ -3,10 +3,11 @@
 import glob
 import math
 import os
+import queue
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from threading import Thread
+from threading import Event, Thread
 from urllib.parse import urlparse
 
 import cv2
@@ -502,6 +503,266 @@ class LoadTensor:
         return self.bs
 
 
+class LoadPdf:
+    """
+    Load pages of a PDF document as images, rasterizing lazily in a background thread.
+
+    Pages are rendered one at a time into a bounded queue, so at most `batch + prefetch` pages are held in memory and
+    rasterization of the next pages overlaps with inference on the current batch.
+
+    Attributes:
+        path (str): PDF file path, or '<bytes>' when the document is given as bytes.
+        dpi (int): Rasterization resolution in dots per inch.
+        bs (int): Batch size, number of pages returned per iteration.
+        nf (int): Number of pages that will be yielded.
+        mode (str): Current mode, set to 'image'.
+        count (int): Number of pages yielded so far.
+
+    Methods:
+        _render(doc, index): Rasterize one page to a BGR numpy array.
+    """
+
+    def __init__(self, path, batch=1, dpi=150, prefetch=2, pages=None):
+        """Open the PDF and start rasterizing pages in the background."""
+        try:
+            import fitz  # noqa (PyMuPDF, declared in requirements.txt)
+        except ImportError as e:
+            raise ImportError("PDF sources require PyMuPDF, install it with 'pip install pymupdf'") from e
+
+        if isinstance(path, (bytes, bytearray, memoryview)):
+            self.path = "<bytes>"
+            self._open = lambda: fitz.open(stream=bytes(path), filetype="pdf")
+        else:
+            self.path = str(path)
+            if not os.path.isfile(self.path):
+                raise FileNotFoundError(f"{self.path} does not exist")
+            self._open = lambda: fitz.open(self.path)
+
+        with self._open() as doc:
+            page_count = doc.page_count
+        self.pages = [i for i in (range(page_count) if pages is None else pages) if 0 <= i < page_count]
+        self.nf = len(self.pages)
+        if self.nf == 0:
+            raise FileNotFoundError(f"No pages found in {self.path}")
+
+        self.dpi = dpi
+        self.bs = max(1, batch)
+        self.mode = "image"
+        self.prefetch = max(1, prefetch)
+        self.source_type = SourceTypes()  # allows passing a LoadPdf instance directly as a predict source
+        self._queue = None
+        self._thread = None
+
+    def _render(self, doc, index):
+        """Rasterize a single page to a contiguous BGR numpy array."""
+        import fitz  # noqa
+
+        pix = doc.load_page(index).get_pixmap(dpi=self.dpi, colorspace=fitz.csRGB, alpha=False)
+        im = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        return np.ascontiguousarray(im[:, :, ::-1])  # RGB to BGR
+
+    def _produce(self, q, stop):
+        """Background thread rasterizing pages into the bounded queue."""
+        try:
+            with self._open() as doc:
+                for index in self.pages:
+                    if stop.is_set():
+                        return
+                    q.put((index, self._render(doc, index)))
+            q.put(None)
+        except Exception as e:
+            q.put(e)
+
+    def __iter__(self):
+        """Start (or restart) background rasterization and return the iterator."""
+        self.close()
+        self.count = 0
+        self._stop = Event()
+        self._queue = queue.Queue(maxsize=self.bs + self.prefetch)
+        self._thread = Thread(target=self._produce, args=(self._queue, self._stop), daemon=True)
+        self._thread.start()
+        return self
+
+    def __next__(self):
+        """Return the next batch of rasterized pages along with their paths and metadata."""
+        paths, imgs, info = [], [], []
+        while len(imgs) < self.bs and self.count < self.nf:
+            item = self._queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                self.close()
+                raise item
+            index, im0 = item
+            paths.append(f"{self.path}#page={index + 1}")
+            imgs.append(im0)
+            info.append(f"pdf page {index + 1}/{self.nf} {self.path}: ")
+            self.count += 1
+        if not imgs:
+            self.close()
+            raise StopIteration
+        return paths, imgs, info
+
+    def close(self):
+        """Stop the background rasterization thread."""
+        if self._thread is not None:
+            self._stop.set()
+            while self._thread.is_alive():  # unblock a producer waiting on a full queue
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    self._thread.join(0.05)
+            self._thread = None
+
+    def __len__(self):
+        """Returns the number of batches."""
+        return math.ceil(self.nf / self.bs)
+
+
+class LoadPrefetch:
+    """
+    Wrap a batch loader and decode/transform upcoming batches in background worker threads.
+
+    While the predictor runs inference on batch N, batches N+1..N+depth are decoded and passed through `transform`
+    (e.g. letterboxing) by a thread pool. Batches are returned in source order and at most `depth` prepared batches are
+    held in memory. Image file lists are decoded inside the workers so that several batches decode in parallel; other
+    loaders are iterated by a single producer thread and only the transform runs in the workers.
+
+    Attributes:
+        dataset: Wrapped loader yielding (paths, imgs, info) batches.
+        transform (callable | None): Function applied to the list of images of each batch in a worker thread.
+        depth (int): Maximum number of batches prepared ahead of the consumer.
+        workers (int): Number of worker threads.
+        prepared: Output of `transform` for the batch most recently returned by `__next__`.
+        prepare_dt (float): Seconds spent in `transform` for that batch.
+        stall (ops.Profile): Accumulated time the consumer waited for a batch that was not ready yet.
+    """
+
+    def __init__(self, dataset, transform=None, depth=2, workers=1):
+        """Wrap `dataset`; background work starts when iteration starts."""
+        self.dataset = dataset
+        self.transform = transform
+        self.depth = max(1, depth)
+        self.workers = max(1, workers)
+        self.bs = dataset.bs
+        self.mode = getattr(dataset, "mode", "image")
+        self.source_type = getattr(dataset, "source_type", SourceTypes())
+        self.prepared, self.prepare_dt = None, 0.0
+        self.stall = ops.Profile()
+        self.count = 0
+        self._queue = None
+        self._thread = None
+        self._executor = None
+
+    def __getattr__(self, name):
+        """Delegate other attributes (files, nf, fps, ...) to the wrapped loader."""
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    @staticmethod
+    def _read(files, start, nf):
+        """Decode a batch of image files, matching LoadImagesAndVideos output."""
+        imgs = []
+        for path in files:
+            im0 = cv2.imread(path)  # BGR
+            if im0 is None:
+                raise FileNotFoundError(f"Image Not Found {path}")
+            imgs.append(im0)
+        return list(files), imgs, [f"image {start + i + 1}/{nf} {path}: " for i, path in enumerate(files)]
+
+    def _loads(self):
+        """Yield callables that each return one (paths, imgs, info) batch, in source order."""
+        dataset = self.dataset
+        if isinstance(dataset, LoadImagesAndVideos) and not any(dataset.video_flag):
+            for i in range(0, dataset.nf, dataset.bs):
+                yield lambda i=i: self._read(dataset.files[i : i + dataset.bs], i, dataset.nf)
+        else:
+            for batch in dataset:
+                yield lambda batch=batch: batch
+
+    def _prepare(self, load):
+        """Worker job: load a batch and apply the transform."""
+        paths, imgs, info = load()
+        if self.transform is None:
+            return paths, imgs, info, None, 0.0
+        with ops.Profile() as dt:
+            prepared = self.transform(imgs)
+        return paths, imgs, info, prepared, dt.dt
+
+    def _produce(self, q, stop):
+        """Producer thread submitting batch jobs to the worker pool through the bounded queue."""
+        try:
+            for load in self._loads():
+                if stop.is_set():
+                    return
+                q.put(self._executor.submit(self._prepare, load))
+            q.put(None)
+        except Exception as e:
+            q.put(e)
+
+    def __iter__(self):
+        """Start (or restart) background preparation and return the iterator."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.close()
+        self.count = 0
+        self._stop = Event()
+        self._queue = queue.Queue(maxsize=self.depth)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+        self._thread = Thread(target=self._produce, args=(self._queue, self._stop), daemon=True)
+        self._thread.start()
+        return self
+
+    def __next__(self):
+        """Return the next (paths, imgs, info) batch; its transform output is available as `self.prepared`."""
+        with self.stall:
+            item = self._queue.get()
+            if item is None:
+                self.close()
+                raise StopIteration
+            if isinstance(item, Exception):
+                self.close()
+                raise item
+            try:
+                paths, imgs, info, self.prepared, self.prepare_dt = item.result()
+            except Exception:
+                self.close()
+                raise
+        self.count += len(imgs)
+        return paths, imgs, info
+
+    def close(self):
+        """Stop the producer thread, discard pending batches and shut down the worker pool."""
+        if self._thread is not None:
+            self._stop.set()
+            while self._thread.is_alive():  # unblock a producer waiting on a full queue
+                try:
+                    item = self._queue.get_nowait()
+                    if hasattr(item, "cancel"):
+                        item.cancel()
+                except queue.Empty:
+                    self._thread.join(0.05)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        close = getattr(self.dataset, "close", None)
+        if close is not None:
+            close()
+
+    def __del__(self):
+        """Release background threads when the loader is discarded mid-iteration."""
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __len__(self):
+        """Returns the number of batches."""
+        return len(self.dataset)
+
+
 def autocast_list(source):
     """Merges a list of source of different types into a list of numpy arrays or PIL images."""
     files = []
@@ -552,4 +813,4 @@ def get_best_youtube_url(url, use_pafy=True):
 
 
 # Define constants
-LOADERS = (LoadStreams, LoadPilAndNumpy, LoadImagesAndVideos, LoadScreenshots)
+LOADERS = (LoadStreams, LoadPilAndNumpy, LoadImagesAndVideos, LoadScreenshots, LoadPdf)
@@ -86,7 +86,7 @@ class Model(nn.Module):
 
     def __init__(
         self,
-        model: Union[str, Path] = "yolov8n.pt",
+        model: Union[str, Path, nn.Module] = "yolov8n.pt",
         task: str = None,
         verbose: bool = False,
     ) -> None:
@@ -98,8 +98,9 @@ class Model(nn.Module):
         important attributes of the model and prepares it for operations like training, prediction, or export.
 
         Args:
-            model (Union[str, Path], optional): The path or model file to load or create. This can be a local
-                file path, a model name from Ultralytics HUB, or a Triton Server model. Defaults to 'yolov8n.pt'.
+            model (Union[str, Path, nn.Module], optional): The path or model file to load or create. This can be a local
+                file path, a model name from Ultralytics HUB, a Triton Server model, or an in-memory PyTorch model.
+                Defaults to 'yolov8n.pt'.
             task (Any, optional): The task type associated with the YOLO model, specifying its application domain.
                 Defaults to None.
             verbose (bool, optional): If True, enables verbose output during the model's initialization and subsequent
@@ -122,6 +123,12 @@ class Model(nn.Module):
         self.metrics = None  # validation/training metrics
         self.session = None  # HUB session
         self.task = task  # task type
+
+        # In-memory PyTorch model, i.e. a fused model whose weights are memory-mapped from a tensor store
+        if isinstance(model, nn.Module):
+            self._load_module(model, task=task)
+            return
+
         model = str(model).strip()
 
         # Check if Ultralytics HUB model from https://hub.doclayout_yolo.com
@@ -243,6 +250,23 @@ class Model(nn.Module):
         self.overrides["task"] = self.task
         self.model_name = weights
 
+    def _load_module(self, model: nn.Module, task=None) -> None:
+        """
+        Wraps an already constructed PyTorch model.
+
+        Args:
+            model (nn.Module): model with `args`, `task` and optionally `pt_path` attributes, as produced by
+                `attempt_load_one_weight`
+            task (str | None): model task
+        """
+        self.model = model
+        self.task = task or getattr(model, "task", None) or guess_model_task(model)
+        self.overrides = self.model.args = self._reset_ckpt_args(getattr(model, "args", {}))
+        self.ckpt_path = getattr(model, "pt_path", None)
+        self.overrides["model"] = self.ckpt_path
+        self.overrides["task"] = self.task
+        self.model_name = self.ckpt_path
+
     def _check_is_pytorch_model(self) -> None:
         """Raises TypeError is model is not a PyTorch model."""
         pt_str = isinstance(self.model, (str, Path)) and Path(self.model).suffix == ".pt"
@@ -443,6 +467,25 @@ class Model(nn.Module):
             self.predictor.set_prompts(prompts)
         return self.predictor.predict_cli(source=source) if is_cli else self.predictor(source=source, stream=stream)
 
+    def predictor_pool(self, size: int = 2, threads: int = 0, **kwargs):
+        """
+        Creates a pool of predictors sharing this model's weights for thread-safe concurrent inference.
+
+        Unlike `predict()`, which reuses one predictor and serializes concurrent calls, every call to the pool's
+        `predict()` checks out its own predictor. Fuse the model before creating the pool, the predictors do not.
+
+        Args:
+            size (int): Number of predictors, i.e. how many inferences may run at the same time.
+            threads (int): Total intra-op CPU threads split between the predictors, 0 for `torch.get_num_threads()`.
+            **kwargs (any): Default predictor args of the pool, per-call arguments are passed to `pool.predict()`.
+
+        Returns:
+            (doclayout_yolo.engine.predictor.PredictorPool): The predictor pool.
+        """
+        from doclayout_yolo.engine.predictor import PredictorPool
+
+        return PredictorPool(self, size=size, threads=threads, overrides=kwargs)
+
     def track(
         self,
         source: Union[str, Path, int, list, tuple, np.ndarray, torch.Tensor] = None,
@@ -29,9 +29,13 @@ Usage - formats:
                               yolov8n_ncnn_model         # NCNN
 """
 
+import contextlib
+import math
 import platform
+import queue
 import re
 import threading
+import time
 from pathlib import Path
 
 import cv2
@@ -40,6 +44,7 @@ import torch
 
 from doclayout_yolo.cfg import get_cfg, get_save_dir
 from doclayout_yolo.data import load_inference_source
+from doclayout_yolo.data.loaders import LoadImagesAndVideos, LoadPdf, LoadPrefetch
 from doclayout_yolo.data.augment import LetterBox, classify_transforms
 from doclayout_yolo.nn.autobackend import AutoBackend
 from doclayout_yolo.utils import DEFAULT_CFG, LOGGER, MACOS, WINDOWS, callbacks, colorstr, ops
@@ -110,20 +115,207 @@ class BasePredictor:
         self.callbacks = _callbacks or callbacks.get_default_callbacks()
         self.txt_path = None
         self._lock = threading.Lock()  # for automatic thread-safe inference
+        self._input_buffers = {}  # reusable (optionally pinned) input tensors for the fused preprocess path
+        self.rect_max_pad = 0.1  # max padding fraction of a rect_batching bucket before a new bucket is started
         callbacks.add_integration_callbacks(self)
 
+    def prepare_batch(self, im, new_shape=None):
+        """
+        CPU part of preprocessing: letterbox a list of BGR images into one contiguous uint8 RGB BCHW array.
+
+        Safe to call from loader worker threads (see `LoadPrefetch`).
+
+        Args:
+            im (List(np.ndarray)): [(HWC) x B] BGR images.
+            new_shape (tuple, optional): Letterbox every image to this (h, w) instead of `imgsz`, see `rect_buckets`.
+
+        Returns:
+            (np.ndarray): (B, 3, h, w) uint8 array, or (B, h, w, 3) uint8 BGR array when `fused_preprocess` is set, in
+                which case channel swap, layout change and normalization happen in one pass in `preprocess`.
+        """
+        if self.args.fused_preprocess and type(self).pre_transform is BasePredictor.pre_transform:
+            fused = self.fused_letterbox(im, new_shape)
+            if fused is not None:
+                return fused
+        if new_shape is not None:
+            letterbox = LetterBox(new_shape, auto=False, stride=self.model.stride)
+            im = np.stack([letterbox(image=x) for x in im])
+        else:
+            im = np.stack(self.pre_transform(im))
+        im = im[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW, (n, 3, h, w)
+        return np.ascontiguousarray(im)  # contiguous
+
+    def fused_letterbox(self, im, new_shape=None):
+        """
+        Letterbox a list of BGR images straight into one preallocated (B, h, w, 3) uint8 buffer.
+
+        Same geometry as `pre_transform`, without the per-image resized/bordered copies and the `np.stack` copy.
+
+        Args:
+            im (List(np.ndarray)): [(HWC) x B] BGR images.
+            new_shape (tuple, optional): Fixed (h, w) target instead of `imgsz`.
+
+        Returns:
+            (np.ndarray | None): (B, h, w, 3) uint8 array, or None if the images cannot share one buffer.
+        """
+        if not all(x.ndim == 3 and x.shape[2] == 3 and x.dtype == np.uint8 for x in im):
+            return None
+        if new_shape is not None:
+            letterbox = LetterBox(new_shape, auto=False, stride=self.model.stride)
+        else:
+            same_shapes = len({x.shape for x in im}) == 1
+            letterbox = LetterBox(self.imgsz, auto=same_shapes and self.model.pt, stride=self.model.stride)
+        shapes = {letterbox.output_shape(x.shape[:2]) for x in im}
+        if len(shapes) != 1:
+            return None
+        out = np.empty((len(im), *shapes.pop(), 3), dtype=np.uint8)
+        for x, o in zip(im, out):
+            letterbox.fill(x, o)
+        return out
+
+    def fused_input(self, im):
+        """
+        BGR to RGB, BHWC to BCHW and 0-255 to 0.0-1.0 in a single pass into a reusable input tensor.
+
+        The tensor is reused for batches of the same shape (and pinned when `pinned_input` is set on CUDA), so it is only
+        valid until the next call; stream_inference consumes it before preprocessing the next batch.
+
+        Args:
+            im (np.ndarray): (B, h, w, 3) uint8 BGR array from `fused_letterbox`.
+
+        Returns:
+            (torch.Tensor): (B, 3, h, w) input tensor on `self.device`.
+        """
+        src = torch.from_numpy(im)
+        dtype = torch.float16 if self.model.fp16 else torch.float32
+        key = (*src.shape[:3], dtype)
+        buffer = self._input_buffers.pop(key, None)
+        if buffer is None:
+            pin = self.args.pinned_input and self.device.type == "cuda"
+            buffer = torch.empty((src.shape[0], 3, *src.shape[1:3]), dtype=dtype, pin_memory=pin)
+            while len(self._input_buffers) >= 4:  # keep a few shapes, drop the least recently used
+                self._input_buffers.pop(next(iter(self._input_buffers)))
+        self._input_buffers[key] = buffer
+        for c in range(3):  # each output plane reads one strided input channel
+            torch.mul(src[..., 2 - c], 1 / 255, out=buffer[:, c])
+        return buffer.to(self.device, non_blocking=buffer.is_pinned())
+
+    def should_tile(self, im0s):
+        """Whether a batch runs through `tiled_inference`; overridden by predictors that support `tile_size`."""
+        return False
+
+    def tiled_inference(self, im0s, profilers, *args, **kwargs):
+        """Sliding-window inference over large images, see YOLOv10DetectionPredictor."""
+        raise NotImplementedError(f"{type(self).__name__} does not support tiled inference")
+
+    def rect_buckets(self, im):
+        """
+        Group a batch of images by aspect ratio for rectangular inference (`rect_batching`).
+
+        Each image is scaled exactly as the square letterbox would scale it. Images sorted by aspect ratio are added to
+        the current bucket while padding stays under `rect_max_pad` of the bucket area, and every bucket is padded only
+        to the smallest stride-aligned rectangle covering its images instead of the full `imgsz` square.
+
+        Args:
+            im (List(np.ndarray)): [(HWC) x B] BGR images.
+
+        Returns:
+            (List[tuple] | None): [(indices, (h, w))] per bucket, or None when rectangular batching does not apply.
+        """
+        if (
+            not self.args.rect_batching
+            or self.args.embed
+            or not isinstance(im, list)
+            or len(im) < 2
+            or not self.model.pt
+            or type(self).preprocess is not BasePredictor.preprocess
+            or type(self).pre_transform is not BasePredictor.pre_transform
+        ):
+            return None
+
+        stride = int(self.model.stride)
+        scaled = []
+        for x in im:
+            h, w = x.shape[:2]
+            r = min(self.imgsz[0] / h, self.imgsz[1] / w)
+            scaled.append((int(round(h * r)), int(round(w * r))))
+
+        buckets = []  # [indices, (h, w) covering all images, sum of image areas]
+        for i in sorted(range(len(im)), key=lambda i: scaled[i][0] / scaled[i][1]):
+            h, w = scaled[i]
+            if buckets:
+                indices, (bh, bw), area = buckets[-1]
+                bh, bw = max(bh, h), max(bw, w)
+                if area + h * w >= (1 - self.rect_max_pad) * bh * bw * (len(indices) + 1):
+                    buckets[-1] = [indices + [i], (bh, bw), area + h * w]
+                    continue
+            buckets.append([[i], (h, w), h * w])
+
+        return [
+            (sorted(indices), (math.ceil(bh / stride) * stride, math.ceil(bw / stride) * stride))
+            for indices, (bh, bw), _ in buckets
+        ]
+
+    def prepare_input(self, im):
+        """
+        Loader worker transform: letterbox each rectangular bucket when `rect_batching` applies, else the whole batch.
+
+        Returns:
+            (np.ndarray | List[tuple]): `prepare_batch` output, or [(indices, prepare_batch output)] per bucket.
+        """
+        buckets = self.rect_buckets(im)
+        if buckets is None:
+            return self.prepare_batch(im)
+        return [(indices, self.prepare_batch([im[i] for i in indices], shape)) for indices, shape in buckets]
+
+    def rect_inference(self, buckets, im0s, profilers, *args, **kwargs):
+        """
+        Run preprocess, inference and postprocess per aspect-ratio bucket and merge results in source order.
+
+        Boxes are scaled back per bucket, since postprocess sees each bucket's own input shape.
+
+        Args:
+            buckets (List[tuple]): [(indices, (h, w) | prepared array)] from `rect_buckets` or `prepare_input`.
+            im0s (List(np.ndarray)): Original images of the batch.
+            profilers (tuple): The preprocess/inference/postprocess `ops.Profile` triplet; `dt` is set to the batch total.
+
+        Returns:
+            (tuple): Results in source order and the per-image input tensors.
+        """
+        batch, start = self.batch, [p.t for p in profilers]
+        results, inputs = [None] * len(im0s), [None] * len(im0s)
+        try:
+            for indices, item in buckets:
+                with profilers[0]:
+                    if isinstance(item, tuple):  # bucket shape, letterbox now
+                        item = self.prepare_batch([im0s[i] for i in indices], item)
+                    im = self.preprocess(item)
+                with profilers[1]:
+                    preds = self.inference(im, *args, **kwargs)
+                with profilers[2]:
+                    self.batch = tuple([x[i] for i in indices] for x in batch)  # postprocess reads paths from batch
+                    for j, (i, result) in enumerate(zip(indices, self.postprocess(preds, im, self.batch[1]))):
+                        results[i], inputs[i] = result, im[j]
+        finally:
+            self.batch = batch
+        for p, t in zip(profilers, start):
+            p.dt = p.t - t
+        return results, inputs
+
     def preprocess(self, im):
         """
         Prepares input image before inference.
 
         Args:
-            im (torch.Tensor | List(np.ndarray)): BCHW for tensor, [(HWC) x B] for list.
+            im (torch.Tensor | np.ndarray | List(np.ndarray)): BCHW for tensor, output of `prepare_batch` for array,
+                [(HWC) x B] for list.
         """
         not_tensor = not isinstance(im, torch.Tensor)
         if not_tensor:
-            im = np.stack(self.pre_transform(im))
-            im = im[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW, (n, 3, h, w)
-            im = np.ascontiguousarray(im)  # contiguous
+            if not isinstance(im, np.ndarray):
+                im = self.prepare_batch(im)
+            if im.shape[-1] == 3:  # BHWC from fused_letterbox (BCHW arrays are at least stride wide)
+                return self.fused_input(im)
             im = torch.from_numpy(im)
 
         im = im.to(self.device)
@@ -194,8 +386,23 @@ class BasePredictor:
             batch=self.args.batch,
             vid_stride=self.args.vid_stride,
             buffer=self.args.stream_buffer,
+            dpi=self.args.pdf_dpi,
+            prefetch=self.args.pdf_prefetch,
         )
         self.source_type = self.dataset.source_type
+        if self.args.prefetch_batches > 0 and isinstance(self.dataset, (LoadImagesAndVideos, LoadPdf)):
+            # Decode and letterbox upcoming batches in worker threads while the current batch runs inference. The
+            # letterbox step is only moved off-thread when preprocess is not overridden by a subclass.
+            # Tiled inference letterboxes crops instead of whole images, so only decoding is prefetched then.
+            transform = self.prepare_input if type(self).preprocess is BasePredictor.preprocess else None
+            if self.args.tile_size > 0:
+                transform = None
+            self.dataset = LoadPrefetch(
+                self.dataset,
+                transform=transform,
+                depth=self.args.prefetch_batches,
+                workers=self.args.prefetch_workers,
+            )
         if not getattr(self, "stream", True) and (
             self.source_type.stream
             or self.source_type.screenshot
@@ -235,24 +442,41 @@ class BasePredictor:
                 ops.Profile(device=self.device),
             )
             self.run_callbacks("on_predict_start")
+            prefetch = self.dataset if isinstance(self.dataset, LoadPrefetch) else None
             for self.batch in self.dataset:
                 self.run_callbacks("on_predict_batch_start")
                 paths, im0s, s = self.batch
-
-                # Preprocess
-                with profilers[0]:
-                    im = self.preprocess(im0s)
-
-                # Inference
-                with profilers[1]:
-                    preds = self.inference(im, *args, **kwargs)
-                    if self.args.embed:
-                        yield from [preds] if isinstance(preds, torch.Tensor) else preds  # yield embedding tensors
-                        continue
-
-                # Postprocess
-                with profilers[2]:
-                    self.results = self.postprocess(preds, im, im0s)
+                prepared = None if prefetch is None else prefetch.prepared
+                buckets = prepared if isinstance(prepared, list) else None
+                if prepared is None:
+                    buckets = self.rect_buckets(im0s)
+
+                if self.should_tile(im0s):  # overlapping tiles of large pages, fused back into page coordinates
+                    self.results, inputs = self.tiled_inference(im0s, profilers, *args, **kwargs)
+                    im = inputs[-1][None]
+                elif buckets is not None:  # aspect-ratio buckets, each letterboxed to its own rectangle
+                    self.results, inputs = self.rect_inference(buckets, im0s, profilers, *args, **kwargs)
+                    im = inputs[-1][None]
+                else:
+                    inputs = None
+
+                    # Preprocess
+                    with profilers[0]:
+                        im = self.preprocess(im0s if prepared is None else prepared)
+
+                    # Inference
+                    with profilers[1]:
+                        preds = self.inference(im, *args, **kwargs)
+                        if self.args.embed:
+                            yield from [preds] if isinstance(preds, torch.Tensor) else preds  # yield embedding tensors
+                            continue
+
+                    # Postprocess
+                    with profilers[2]:
+                        self.results = self.postprocess(preds, im, im0s)
+                if prefetch is not None:  # letterbox ran in a loader worker, count it as preprocess time
+                    profilers[0].dt += prefetch.prepare_dt
+                    profilers[0].t += prefetch.prepare_dt
                 self.run_callbacks("on_predict_postprocess_end")
 
                 # Visualize, save, write results
@@ -265,7 +489,7 @@ class BasePredictor:
                         "postprocess": profilers[2].dt * 1e3 / n,
                     }
                     if self.args.verbose or self.args.save or self.args.save_txt or self.args.show:
-                        s[i] += self.write_results(i, Path(paths[i]), im, s)
+                        s[i] += self.write_results(i, Path(paths[i]), im if inputs is None else inputs[i], s)
 
                 # Print batch results
                 if self.args.verbose:
@@ -286,6 +510,8 @@ class BasePredictor:
                 f"Speed: %.1fms preprocess, %.1fms inference, %.1fms postprocess per image at shape "
                 f"{(min(self.args.batch, self.seen), 3, *im.shape[2:])}" % t
             )
+            if prefetch is not None:
+                LOGGER.info("Prefetch: %.1fms waiting for batches per image" % (prefetch.stall.t / self.seen * 1e3))
         if self.args.save or self.args.save_txt or self.args.save_crop:
             nl = len(list(self.save_dir.glob("labels/*.txt")))  # number of labels
             s = f"\n{nl} label{'s' * (nl > 1)} saved to {self.save_dir / 'labels'}" if self.args.save_txt else ""
@@ -303,6 +529,8 @@ class BasePredictor:
             batch=self.args.batch,
             fuse=False,
             verbose=verbose,
+            threads=self.args.threads,
+            inter_threads=self.args.inter_threads,
         )
 
         self.device = self.model.device  # update device
@@ -334,7 +562,7 @@ class BasePredictor:
                 boxes=self.args.show_boxes,
                 conf=self.args.show_conf,
                 labels=self.args.show_labels,
-                im_gpu=None if self.args.retina_masks else im[i],
+                im_gpu=None if self.args.retina_masks else im[min(i, len(im) - 1)],
             )
 
         # Save results
@@ -395,3 +623,143 @@ class BasePredictor:
     def add_callback(self, event: str, func):
         """Add callback."""
         self.callbacks[event].append(func)
+
+
+class PredictorPool:
+    """
+    A fixed set of predictors sharing one AutoBackend, for concurrent inference from many threads.
+
+    `Model.predict` reuses a single predictor whose `stream_inference` holds a lock, so threaded servers run one
+    inference at a time. A pool builds `size` predictors around the same (fused) weights; each keeps its own args,
+    dataset, batch state and input buffers, and callers check one out for the duration of a prediction. The total CPU
+    thread budget is split between the predictors so that `size` concurrent inferences do not oversubscribe the cores.
+
+    Example:
+        ```python
+        pool = model.predictor_pool(size=4)
+        results = pool.predict("page.jpg", imgsz=1024, conf=0.2)  # safe to call from any thread
+        ```
+
+    Attributes:
+        size (int): Number of predictors.
+        threads (int): Intra-op CPU threads of each predictor.
+        args (SimpleNamespace): Base predictor args, per-call kwargs are merged on top of them.
+    """
+
+    # Backends whose forward() can run concurrently on one instance; the others keep per-call state (bindings, infer
+    # requests, input blobs) on the backend object
+    SHARED_BACKENDS = ("pt", "nn_module", "jit", "onnx")
+
+    def __init__(self, model, size=2, threads=0, overrides=None):
+        """
+        Initializes the pool.
+
+        Args:
+            model (doclayout_yolo.engine.model.Model): Loaded model, fused beforehand if desired.
+            size (int): Number of predictors.
+            threads (int): Total intra-op CPU threads shared by the pool, 0 for `torch.get_num_threads()`.
+            overrides (dict, optional): Predictor args on top of `model.overrides`.
+        """
+        size = max(1, int(size))
+        self.threads = max(1, (threads or torch.get_num_threads()) // size)
+        args = {**model.overrides, "conf": 0.25, "batch": 1, "save": False, "mode": "predict", **(overrides or {})}
+        args["threads"] = self.threads  # ONNX Runtime / OpenVINO session threads per run
+
+        predictor_cls = model._smart_load("predictor")
+        first = predictor_cls(overrides=args, _callbacks=model.callbacks)
+        first.setup_model(model=model.model, verbose=False)
+        backend = first.model
+        if size > 1 and not any(getattr(backend, k, False) for k in self.SHARED_BACKENDS):
+            LOGGER.warning(f"WARNING ⚠️ this model format cannot run concurrently, using a pool of 1 instead of {size}")
+            size = 1
+        self.size = size
+        self.args = first.args
+        self._torch_threads = backend.pt or backend.nn_module or backend.jit
+
+        self._idle = queue.Queue()
+        self._idle.put(first)
+        for _ in range(size - 1):
+            predictor = predictor_cls(overrides=args, _callbacks=model.callbacks)
+            predictor.model, predictor.device = backend, first.device
+            predictor.args = get_cfg(self.args)
+            self._idle.put(predictor)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"checkouts": 0, "waits": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "busy": 0}
+
+    @contextlib.contextmanager
+    def checkout(self, timeout=None):
+        """
+        Borrows an idle predictor for the duration of the `with` block, waiting for one to be returned if all are busy.
+
+        Args:
+            timeout (float, optional): Seconds to wait for an idle predictor, None to wait indefinitely.
+
+        Raises:
+            TimeoutError: If no predictor became idle within `timeout`.
+        """
+        t = time.perf_counter()
+        try:
+            predictor = self._idle.get_nowait()
+            waited = False
+        except queue.Empty:
+            try:
+                predictor = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"no idle predictor within {timeout}s, all {self.size} are busy") from None
+            waited = True
+        wait_ms = (time.perf_counter() - t) * 1e3
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["waits"] += waited
+            self._stats["wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+            self._stats["busy"] += 1
+        try:
+            # OpenMP thread counts are per calling thread, so each request thread runs with the predictor's budget
+            if self._torch_threads and torch.get_num_threads() != self.threads:
+                torch.set_num_threads(self.threads)
+            yield predictor
+        finally:
+            with self._stats_lock:
+                self._stats["busy"] -= 1
+            self._idle.put(predictor)
+
+    def _configure(self, predictor, kwargs):
+        """Applies per-call args on top of the pool args, so results do not depend on which predictor was used."""
+        predictor.args = get_cfg(self.args, kwargs)
+        if "project" in kwargs or "name" in kwargs:
+            predictor.save_dir = get_save_dir(predictor.args)
+
+    def _stream(self, source, timeout, kwargs):
+        """Yields results while holding a predictor; it is returned when the generator is exhausted or closed."""
+        with self.checkout(timeout) as predictor:
+            self._configure(predictor, kwargs)
+            yield from predictor(source=source, stream=True)
+
+    def predict(self, source=None, stream=False, timeout=None, **kwargs):
+        """
+        Runs prediction on an idle predictor, see `Model.predict`.
+
+        Args:
+            source (str | Path | np.ndarray | list | LoadPdf): The source of the images.
+            stream (bool): Return a generator that holds the predictor until it is exhausted or closed.
+            timeout (float, optional): Seconds to wait for an idle predictor, None to wait indefinitely.
+            **kwargs (any): Predictor args for this call.
+
+        Returns:
+            (List[doclayout_yolo.engine.results.Results]): Prediction results, or a generator of them if `stream`.
+        """
+        if stream:
+            return self._stream(source, timeout, kwargs)
+        with self.checkout(timeout) as predictor:
+            self._configure(predictor, kwargs)
+            return predictor(source=source, stream=False)
+
+    def get_stats(self):
+        """Returns checkout counters: total checkouts, how many had to wait, wait times and busy predictors."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["size"], stats["threads"] = self.size, self.threads
+        stats["avg_wait_ms"] = round(stats["wait_ms"] / stats["checkouts"], 3) if stats["checkouts"] else 0
+        return stats
@@ -741,3 +741,55 @@ class OBB(BaseTensor):
         y2 = self.xyxyxyxy[..., 1].max(1).values
         xyxy = [x1, y1, x2, y2]
         return np.stack(xyxy, axis=-1) if isinstance(self.data, np.ndarray) else torch.stack(xyxy, dim=-1)
+
+
+class Detections(SimpleClass):
+    """
+    Columnar detection boxes for a batch of images.
+
+    All boxes of the batch live in one numpy array per field, with per-image offsets, so consumers can filter, clip
+    and format dense pages with array ops instead of iterating over `Boxes` one element at a time.
+
+    Attributes:
+        xyxy (numpy.ndarray): Boxes in [x1, y1, x2, y2] format, shape (num_boxes, 4).
+        conf (numpy.ndarray): Confidence scores, shape (num_boxes,).
+        cls (numpy.ndarray): Integer class labels, shape (num_boxes,).
+        offsets (numpy.ndarray): Start index of each image's boxes plus the total count, shape (num_images + 1,).
+        orig_shapes (list): Original image size (height, width) of each image.
+        names (dict): Class names.
+    """
+
+    def __init__(self, xyxy, conf, cls, offsets, orig_shapes, names) -> None:
+        """Initialize from column arrays and per-image offsets."""
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.offsets = offsets
+        self.orig_shapes = orig_shapes
+        self.names = names
+
+    @classmethod
+    def from_results(cls, results):
+        """Build columnar detections from a list of Results with one device transfer for the whole batch."""
+        counts = [len(r.boxes) for r in results]
+        if sum(counts):
+            data = torch.cat([r.boxes.data for r in results]).cpu().numpy()
+        else:
+            data = np.zeros((0, 6), dtype=np.float32)
+        return cls(
+            xyxy=data[:, :4],
+            conf=data[:, -2],
+            cls=data[:, -1].astype(np.int64),
+            offsets=np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+            orig_shapes=[tuple(r.orig_shape) for r in results],
+            names=results[0].names if results else {},
+        )
+
+    def __len__(self):
+        """Return the number of images."""
+        return len(self.orig_shapes)
+
+    def __getitem__(self, idx):
+        """Return the column views (no copy) holding the boxes of image `idx`."""
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {"xyxy": self.xyxy[start:end], "conf": self.conf[start:end], "cls": self.cls[start:end]}
@@ -1,8 +1,12 @@
 from doclayout_yolo.models.yolo.detect import DetectionPredictor
 import torch
+from doclayout_yolo.data.utils import get_windows
 from doclayout_yolo.utils import ops
 from doclayout_yolo.engine.results import Results
 
+# Tile detections within this many source pixels of an inner tile edge are treated as truncated and dropped
+TILE_EDGE_MARGIN = 4
+
 
 class YOLOv10DetectionPredictor(DetectionPredictor):
     def postprocess(self, preds, img, orig_imgs):
@@ -23,16 +27,104 @@ class YOLOv10DetectionPredictor(DetectionPredictor):
         mask = preds[..., 4] > self.args.conf
         if self.args.classes is not None:
             mask = mask & (preds[..., 5:6] == torch.tensor(self.args.classes, device=preds.device).unsqueeze(0)).any(2)
-        
-        preds = [p[mask[idx]] for idx, p in enumerate(preds)]
 
         if not isinstance(orig_imgs, list):  # input images are a torch.Tensor, not a list
             orig_imgs = ops.convert_torch2numpy_batch(orig_imgs)
 
-        results = []
-        for i, pred in enumerate(preds):
-            orig_img = orig_imgs[i]
-            pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
-            img_path = self.batch[0][i]
-            results.append(Results(orig_img, path=img_path, names=self.model.names, boxes=pred))
-        return results
+        # Scale the whole padded batch at once, then split the kept rows into per-image views of one tensor
+        preds = ops.scale_boxes_batch(img.shape[2:], preds, [im.shape for im in orig_imgs])
+        preds = preds[mask].split(mask.sum(1).tolist())
+
+        return [
+            Results(orig_img, path=img_path, names=self.model.names, boxes=pred)
+            for orig_img, img_path, pred in zip(orig_imgs, self.batch[0], preds)
+        ]
+
+    def should_tile(self, im0s):
+        """Tile the batch when `tile_size` is set and some image is larger than one tile."""
+        return (
+            self.args.tile_size > 0
+            and not self.args.embed
+            and isinstance(im0s, list)
+            and any(max(im.shape[:2]) > self.args.tile_size for im in im0s)
+        )
+
+    def _tile_detections(self, crops, profilers, *args, **kwargs):
+        """Run preprocess/inference/postprocess on a list of crops and return their boxes in crop coordinates."""
+        batch = self.batch
+        with profilers[0]:
+            im = self.preprocess(crops)
+        with profilers[1]:
+            preds = self.inference(im, *args, **kwargs)
+        with profilers[2]:
+            self.batch = ([batch[0][0]] * len(crops), crops, [""] * len(crops))  # postprocess reads paths from batch
+            try:
+                boxes = [r.boxes.data for r in self.postprocess(preds, im, crops)]
+            finally:
+                self.batch = batch
+        return boxes, im
+
+    def tiled_inference(self, im0s, profilers, *args, **kwargs):
+        """
+        Sliding-window inference for large pages.
+
+        Every image is covered by `tile_size` windows overlapping by `tile_overlap` pixels (`get_windows`). The tiles
+        and one downscaled full-image pass, for objects larger than a tile, are inferred `tile_batch` crops at a time,
+        so peak memory does not grow with page size. Tile boxes touching an inner tile edge are dropped as truncated;
+        the rest are shifted to page coordinates and merged per class with `ops.fuse_boxes`.
+
+        Args:
+            im0s (List(np.ndarray)): Original images of the batch.
+            profilers (tuple): The preprocess/inference/postprocess `ops.Profile` triplet; `dt` is set to the batch total.
+
+        Returns:
+            (tuple): Results in source order and the per-image input tensors of the full-image pass.
+        """
+        batch, start = self.batch, [p.t for p in profilers]
+        tile, overlap, chunk = self.args.tile_size, self.args.tile_overlap, max(1, self.args.tile_batch)
+        results, inputs = [], []
+        try:
+            for k, im0 in enumerate(im0s):
+                self.batch = tuple([x[k]] for x in batch)
+                h, w = im0.shape[:2]
+                windows = [(0, 0, w, h)]  # full-image pass first
+                if max(h, w) > tile:
+                    windows += [tuple(win) for win in get_windows((h, w), [tile], [min(overlap, tile - 1)], im_rate_thr=0)]
+
+                dets, full_input = [], None
+                for i in range(0, len(windows), chunk):
+                    wins = windows[i : i + chunk]
+                    crops = [im0[y0 : min(y1, h), x0 : min(x1, w)] for x0, y0, x1, y1 in wins]
+                    boxes, im = self._tile_detections(crops, profilers, *args, **kwargs)
+                    if full_input is None:
+                        full_input = im[0]
+                    for (x0, y0, x1, y1), b in zip(wins, boxes):
+                        if (x0, y0) == (0, 0) and (x1, y1) == (w, h):
+                            dets.append(b)
+                            continue
+                        x1, y1 = min(x1, w), min(y1, h)
+                        m = TILE_EDGE_MARGIN
+                        keep = torch.ones(len(b), dtype=torch.bool, device=b.device)
+                        if x0 > 0:
+                            keep &= b[:, 0] > m
+                        if y0 > 0:
+                            keep &= b[:, 1] > m
+                        if x1 < w:
+                            keep &= b[:, 2] < x1 - x0 - m
+                        if y1 < h:
+                            keep &= b[:, 3] < y1 - y0 - m
+                        b = b[keep].clone()
+                        b[:, [0, 2]] += x0
+                        b[:, [1, 3]] += y0
+                        dets.append(b)
+
+                with profilers[2]:
+                    fused = ops.fuse_boxes(torch.cat(dets), iou_thres=self.args.iou, max_det=self.args.max_det)
+                    ops.clip_boxes(fused, (h, w))
+                    results.append(Results(im0, path=batch[0][k], names=self.model.names, boxes=fused))
+                inputs.append(full_input)
+        finally:
+            self.batch = batch
+        for p, t in zip(profilers, start):
+            p.dt = p.t - t
+        return results, inputs
@@ -88,6 +88,8 @@ class AutoBackend(nn.Module):
         batch=1,
         fuse=True,
         verbose=True,
+        threads=0,
+        inter_threads=0,
     ):
         """
         Initialize the AutoBackend for inference.
@@ -101,6 +103,8 @@ class AutoBackend(nn.Module):
             batch (int): Batch-size to assume for inference.
             fuse (bool): Fuse Conv2D + BatchNorm layers for optimization. Defaults to True.
             verbose (bool): Enable verbose logging. Defaults to True.
+            threads (int): Intra-op CPU threads for ONNX Runtime / OpenVINO, 0 for the runtime default.
+            inter_threads (int): Inter-op threads (ONNX Runtime) or inference streams (OpenVINO), 0 for the default.
         """
         super().__init__()
         w = str(weights[0] if isinstance(weights, list) else weights)
@@ -183,7 +187,14 @@ class AutoBackend(nn.Module):
             import onnxruntime
 
             providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if cuda else ["CPUExecutionProvider"]
-            session = onnxruntime.InferenceSession(w, providers=providers)
+            session_options = onnxruntime.SessionOptions()
+            session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if threads:
+                session_options.intra_op_num_threads = threads
+            if inter_threads:
+                session_options.inter_op_num_threads = inter_threads
+                session_options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+            session = onnxruntime.InferenceSession(w, sess_options=session_options, providers=providers)
             output_names = [x.name for x in session.get_outputs()]
             metadata = session.get_modelmeta().custom_metadata_map
 
@@ -204,10 +215,15 @@ class AutoBackend(nn.Module):
             # OpenVINO inference modes are 'LATENCY', 'THROUGHPUT' (not recommended), or 'CUMULATIVE_THROUGHPUT'
             inference_mode = "CUMULATIVE_THROUGHPUT" if batch > 1 else "LATENCY"
             LOGGER.info(f"Using OpenVINO {inference_mode} mode for batch={batch} inference...")
+            ov_config = {"PERFORMANCE_HINT": inference_mode}
+            if threads:
+                ov_config["INFERENCE_NUM_THREADS"] = threads
+            if inter_threads:
+                ov_config["NUM_STREAMS"] = inter_threads
             ov_compiled_model = core.compile_model(
                 ov_model,
                 device_name="AUTO",  # AUTO selects best available device, do not modify
-                config={"PERFORMANCE_HINT": inference_mode},
+                config=ov_config,
             )
             input_name = ov_compiled_model.input().get_any_name()
             metadata = w.parent / "metadata.yaml"
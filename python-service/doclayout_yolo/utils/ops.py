@@ -12,7 +12,7 @@ import torch.nn.functional as F
 import torchvision
 
 from doclayout_yolo.utils import LOGGER
-from doclayout_yolo.utils.metrics import batch_probiou
+from doclayout_yolo.utils.metrics import batch_probiou, box_iou
 
 
 class Profile(contextlib.ContextDecorator):
@@ -124,6 +124,68 @@ def scale_boxes(img1_shape, boxes, img0_shape, ratio_pad=None, padding=True, xyw
     return clip_boxes(boxes, img0_shape)
 
 
+def scale_boxes_batch(img1_shape, boxes, img0_shapes):
+    """
+    Rescales a padded batch of xyxy boxes from the letterboxed inference shape to each image's original shape in a
+    single set of tensor ops, equivalent to calling `scale_boxes` and `clip_boxes` once per image.
+
+    Args:
+        img1_shape (tuple): The letterboxed shape shared by the batch, in the format of (height, width).
+        boxes (torch.Tensor): Boxes of shape (batch, num_boxes, >=4) with xyxy in the first four columns, modified
+            in place.
+        img0_shapes (list): Original shape (height, width, ...) of each image in the batch.
+
+    Returns:
+        boxes (torch.Tensor): The scaled and clipped boxes.
+    """
+    shapes = torch.tensor([s[:2] for s in img0_shapes], dtype=torch.float64)  # (batch, 2) as h, w
+    gain = torch.minimum(img1_shape[0] / shapes[:, 0], img1_shape[1] / shapes[:, 1])  # gain  = old / new
+    pad = torch.round((torch.tensor(img1_shape[:2], dtype=torch.float64)[[1, 0]] - shapes[:, [1, 0]] * gain[:, None]) / 2 - 0.1)
+    limits = shapes[:, [1, 0, 1, 0]]  # w, h, w, h
+
+    to = dict(device=boxes.device, dtype=boxes.dtype)
+    xyxy = boxes[..., :4]
+    xyxy -= pad.repeat(1, 2).to(**to)[:, None, :]  # xy padding
+    xyxy /= gain.to(**to)[:, None, None]
+    boxes[..., :4] = torch.minimum(xyxy.clamp(min=0), limits.to(**to)[:, None, :])
+    return boxes
+
+
+def fuse_boxes(dets, iou_thres=0.55, max_det=300):
+    """
+    Class-aware weighted box fusion of overlapping detections, e.g. the same object seen by several inference tiles.
+
+    Group heads are the detections kept by torchvision NMS, with boxes offset per class as in `batched_nms` so classes
+    never interact. Every detection joins the highest-confidence head of its class whose IoU with it exceeds
+    `iou_thres`, and each group is replaced by its confidence-weighted mean box with the head's confidence. At most
+    `max_det` heads are kept, so the IoU matrix is (max_det, n) rather than (n, n).
+
+    Args:
+        dets (torch.Tensor): Detections of shape (n, 6) as xyxy, conf, cls.
+        iou_thres (float): IoU above which two same-class detections are fused.
+        max_det (int): Maximum number of detections returned.
+
+    Returns:
+        (torch.Tensor): Fused detections of shape (m, 6), sorted by confidence.
+    """
+    if len(dets) < 2:
+        return dets[:max_det]
+    xyxy, conf = dets[:, :4], dets[:, 4]
+    span = xyxy.max() - xyxy.min() + 1  # per-class offset that separates the classes' coordinate ranges
+    boxes = xyxy + dets[:, 5:6] * span
+    heads = torchvision.ops.nms(boxes, conf, iou_thres)[:max_det]  # sorted by descending confidence
+
+    match = box_iou(boxes[heads], boxes) > iou_thres  # (heads, n)
+    match[torch.arange(len(heads), device=dets.device), heads] = True  # degenerate boxes have no IoU with themselves
+    member = match.any(0)  # detections only matched by heads beyond max_det are dropped
+    group = match.int().argmax(0)[member]  # first, i.e. highest-confidence, matching head
+    weights = conf[member].unsqueeze(1)
+
+    box = torch.zeros((len(heads), 4), dtype=dets.dtype, device=dets.device).index_add_(0, group, xyxy[member] * weights)
+    total = torch.zeros((len(heads), 1), dtype=dets.dtype, device=dets.device).index_add_(0, group, weights)
+    return torch.cat([box / total, dets[heads, 4:]], 1)
+
+
 def make_divisible(x, divisor):
     """
     Returns the nearest number that is divisible by the given divisor.
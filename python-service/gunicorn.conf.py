@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Gunicorn配置 - 启动钩子，在worker接收请求之前加载并预热检测模型
+gunicorn会自动读取工作目录下的gunicorn.conf.py，命令行参数优先于这里的配置
+
+MODEL_PRELOAD_MODE:
+    none    不预加载，第一次请求时加载（默认）
+    worker  每个worker初始化后在后台加载模型，失败后自动重试
+    master  在主进程加载一次，fork后的worker通过写时复制共享模型内存（仅CPU）
+
+注册了检测路由时，/health在模型预热完成前返回503
+"""
+
+
+def on_starting(server):
+    """主进程启动时调用，master模式下在fork之前加载模型"""
+    from services.model_warmup import on_master_start
+    on_master_start()
+
+
+def post_worker_init(worker):
+    """worker初始化完成后调用，worker模式下在后台预热模型"""
+    from services.model_warmup import on_worker_start
+    on_worker_start()
@@ -20,7 +20,7 @@ from utils.environment import environment, is_development, is_production, get_co
 
 # 导入Flask应用
 from api.app import create_app as create_flask_app
-from utils.log_client import error
+from utils.log_client import error, flush_logs
 
 # 配置日志 - 使用统一环境检测
 log_config = get_config('log')
@@ -33,6 +33,8 @@ logger = logging.getLogger(__name__)
 def cleanup_resources():
     """清理应用资源"""
     try:
+        # 发送队列中剩余的日志
+        flush_logs()
         logger.info("应用资源清理完成")
     except Exception as e:
         logger.error(f"清理应用资源时出错: {e}")
@@ -101,6 +103,11 @@ def main():
         else:
             logger.warning("非开发环境不建议使用Flask内置服务器，请使用Gunicorn")
 
+        # 开发服务器没有gunicorn启动钩子，在后台预热模型（调试模式下只在重载后的子进程中预热）
+        if get_config('detector')['preload_mode'] != 'none' and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+            from services.model_warmup import warm_in_background
+            warm_in_background()
+
         # 启动应用（仅开发环境使用）
         app.run(host=host, port=port, debug=debug)
 
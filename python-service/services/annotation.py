@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+标注图像模块 - 根据检测结果绘制标注图像
+前端根据JSON自行绘制矩形，标注图像只在第一次请求 /temp/{id}_detect.jpg 时生成并保存，检测请求本身不再承担绘制开销
+"""
+
+import os
+import re
+import json
+import glob
+import zlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from utils.log_client import info, error, warn
+from utils.environment import get_config
+from utils.file_index import get_file_index
+from services.upload_store import wait_for_upload
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# {image_id}_detect.jpg 或 PDF每页的 {image_id}_p{page}_detect.jpg
+DETECT_IMAGE_PATTERN = re.compile(r'^(?P<image_id>[0-9a-fA-F-]{36})(?:_p(?P<page>\d+))?_detect\.jpg$')
+
+# 按文件路径分段加锁，同一张标注图像的并发请求只绘制一次
+_render_locks = [threading.Lock() for _ in range(16)]
+
+
+def render_annotated(image: np.ndarray, detected_objects: List[Dict[str, Any]], renderer: str = 'cv2',
+                     line_width: int = 5, font_size: int = 20) -> np.ndarray:
+    """
+    在图像上绘制检测框和标签
+
+    Args:
+        image: BGR格式的numpy图像（会被直接修改）
+        detected_objects: 检测结果列表（DocumentDetector._format_boxes 的格式）
+        renderer: cv2（默认，不加载字体，速度快）或 pil（与 Results.plot(pil=True) 相同的样式）
+        line_width: 线宽
+        font_size: 字体大小（仅pil）
+
+    Returns:
+        BGR格式的标注图像
+    """
+    from doclayout_yolo.utils.plotting import Annotator, colors
+
+    names = {obj['class_id']: obj['class'] for obj in detected_objects}
+    annotator = Annotator(image, line_width=line_width, font_size=font_size, pil=renderer == 'pil',
+                          example=str(list(names.values())))
+    for obj in detected_objects:
+        bbox = obj['bbox']
+        annotator.box_label(
+            [bbox['x_min'], bbox['y_min'], bbox['x_max'], bbox['y_max']],
+            f"{obj['class']} {obj['confidence']:.2f}",
+            color=colors(obj['class_id'], True)
+        )
+    return np.asarray(annotator.result())
+
+
+def encode_annotated(image: np.ndarray, detected_objects: List[Dict[str, Any]]) -> bytes:
+    """
+    绘制标注图像并编码为JPEG
+
+    Args:
+        image: BGR格式的numpy图像（不会被修改）
+        detected_objects: 检测结果列表
+
+    Returns:
+        JPEG字节
+    """
+    config = get_config('detector')
+    annotated = render_annotated(image.copy(), detected_objects, renderer=config['annotate_renderer'])
+    ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, config['annotate_quality']])
+    if not ok:
+        raise ValueError('标注图像编码失败')
+    return buffer.tobytes()
+
+
+def _load_source_image(result: Dict[str, Any], image_id: str, page: Optional[int], upload_folder: str):
+    """读取检测时使用的原始图像，PDF按检测时的分辨率重新栅格化对应页"""
+    image_path = result.get('image_path')
+    if not image_path or not os.path.exists(image_path):
+        # 兼容没有记录路径的结果文件，按ID在上传目录中查找
+        file_index = get_file_index()
+        if file_index.is_ready():
+            matches = [p for p in file_index.find(image_id, [upload_folder])
+                       if os.path.dirname(p) == os.path.abspath(upload_folder)]
+        else:
+            matches = [p for p in glob.glob(os.path.join(upload_folder, f"{image_id}_*"))
+                       if not os.path.basename(p).startswith('.')]
+        image_path = matches[0] if matches else None
+    if not image_path:
+        return None
+
+    if page is not None:
+        from doclayout_yolo.data.loaders import LoadPdf
+        loader = LoadPdf(image_path, dpi=result.get('dpi', 150), pages=[page - 1])
+        try:
+            for _, imgs, _ in loader:
+                return imgs[0]
+        finally:
+            loader.close()
+        return None
+    return cv2.imread(image_path)
+
+
+def ensure_detect_image(filename: str, temp_folder: str, upload_folder: str) -> Optional[str]:
+    """
+    确保标注图像存在，不存在时根据保存的检测结果和原始图像生成
+
+    Args:
+        filename: 请求的文件名（{image_id}_detect.jpg 或 {image_id}_p{page}_detect.jpg）
+        temp_folder: 临时文件夹（检测结果JSON和标注图像所在目录）
+        upload_folder: 上传文件夹
+
+    Returns:
+        标注图像路径，不是标注图像或无法生成时返回None
+    """
+    match = DETECT_IMAGE_PATTERN.match(os.path.basename(filename))
+    if not match:
+        return None
+
+    path = os.path.join(temp_folder, os.path.basename(filename))
+    if os.path.exists(path):
+        return path
+
+    with _render_locks[zlib.crc32(path.encode('utf-8')) % len(_render_locks)]:
+        if os.path.exists(path):
+            return path
+
+        image_id = match.group('image_id')
+        page = int(match.group('page')) if match.group('page') else None
+        result_path = os.path.join(temp_folder, f"{image_id}_result.json")
+        try:
+            with open(result_path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            warn(f"没有找到检测结果，无法生成标注图像: {result_path}")
+            return None
+
+        if page is not None:
+            pages = {p['page']: p for p in result.get('pages', [])}
+            if page not in pages:
+                return None
+            detected_objects = pages[page]['detected_objects']
+        else:
+            detected_objects = result.get('detected_objects', [])
+
+        # 上传接口可能在原始文件写入完成之前就已返回，先等待该ID的后台保存
+        if not wait_for_upload(image_id):
+            warn(f"原始图像保存未完成，无法生成标注图像: {image_id}")
+            return None
+
+        try:
+            image = _load_source_image(result, image_id, page, upload_folder)
+            if image is None:
+                warn(f"没有找到原始图像，无法生成标注图像: {image_id}")
+                return None
+            data = encode_annotated(image, detected_objects)
+
+            tmp_path = os.path.join(temp_folder, f".{os.path.basename(path)}.{os.getpid()}.part")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            get_file_index().add(path, temp_folder)
+        except Exception as e:
+            error(f"生成标注图像失败: {filename}, {e}")
+            return None
+
+    info(f"已按需生成标注图像: {path}")
+    return path
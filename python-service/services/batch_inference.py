@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量推理模块 - 为文档检测模型提供动态批处理
+这个模块把并发到达的检测请求在一个可配置的时间窗口内合并成一个批次，
+执行一次YOLOv10前向推理，再把每张图片的结果分发回等待中的调用方
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from typing import Any, Dict, List, Optional
+
+# 导入日志客户端
+from utils.log_client import info, error
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# submit() 默认等待结果的最长时间（秒），推理线程异常时调用方不会一直阻塞
+DEFAULT_SUBMIT_TIMEOUT = 120
+
+
+class _PendingRequest:
+    """等待批处理的单个检测请求"""
+
+    __slots__ = ('image', 'params', 'future', 'enqueued_at')
+
+    def __init__(self, image, params, future, enqueued_at):
+        self.image = image
+        self.params = params
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class BatchInferenceServer:
+    """动态批处理推理服务，在模型前面收集请求并批量执行"""
+
+    def __init__(self, model, device, max_batch_size: int = 8, max_wait_ms: float = 10, threads: int = 0):
+        """
+        初始化批处理推理服务
+
+        Args:
+            model: 已加载（并融合）的YOLOv10模型，用于创建批处理服务独占的预测器
+            device: 推理设备
+            max_batch_size: 单个批次的最大图片数量
+            max_wait_ms: 第一个请求到达后最多等待多少毫秒来凑批次
+            threads: 推理使用的CPU线程数，0表示使用PyTorch默认值
+        """
+        # 批处理线程独占一个预测器：model.predict() 会改写共享预测器的参数，
+        # 与其他请求线程共用时批次可能用上别人的conf/imgsz；独占的预测器只在这里按批次设置参数
+        self.predictor = model.predictor_pool(size=1, threads=threads, device=device)
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'last_batch_size': 0,
+            'max_batch_size_seen': 0,
+            'batch_size_histogram': {},
+            'total_wait_ms': 0.0,
+            'total_inference_ms': 0.0
+        }
+
+        self._stopped = False
+        self._worker = threading.Thread(target=self._run, name='detect-batcher', daemon=True)
+        self._worker.start()
+
+        info(f"批处理推理服务已启动，最大批次: {self.max_batch_size}，最大等待: {max_wait_ms}ms")
+
+    def submit(self, image, imgsz: int = 1024, conf: float = 0.2,
+               timeout: Optional[float] = DEFAULT_SUBMIT_TIMEOUT):
+        """
+        提交一张图片并等待其检测结果
+
+        Args:
+            image: BGR格式的numpy图像
+            imgsz: 图像大小
+            conf: 置信度阈值
+            timeout: 等待结果的超时时间（秒），None表示一直等待
+
+        Returns:
+            该图片对应的Results对象
+
+        Raises:
+            TimeoutError: 超时仍未得到结果（尚未开始推理的请求会被取消）
+        """
+        if self._stopped:
+            raise RuntimeError('批处理推理服务已停止')
+
+        future = Future()
+        self._queue.put(_PendingRequest(image, (imgsz, conf), future, time.time()))
+        try:
+            return future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            future.cancel()
+            raise TimeoutError(f'等待批量推理结果超时（{timeout}秒）') from None
+
+    def stop(self):
+        """停止后台批处理线程"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+
+    def _collect_batch(self, first: _PendingRequest) -> List[_PendingRequest]:
+        """以第一个请求为起点，在等待窗口内尽量收集更多请求"""
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        """后台线程主循环"""
+        while not self._stopped:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._collect_batch(first)
+
+            # 不同推理参数的请求不能放在同一个批次里
+            groups: Dict[Any, List[_PendingRequest]] = {}
+            for request in batch:
+                groups.setdefault(request.params, []).append(request)
+
+            for (imgsz, conf), requests in groups.items():
+                # 已超时取消的请求不再推理；其余请求标记为运行中，之后不能再被取消
+                requests = [r for r in requests if r.future.set_running_or_notify_cancel()]
+                if not requests:
+                    continue
+                try:
+                    self._process(requests, imgsz, conf)
+                except Exception as e:
+                    logger.error(f"分发批量推理结果失败: {e}")
+                    error(f"分发批量推理结果失败: {e}", metadata={'batch_size': len(requests)})
+                    self._fail(requests, e)
+
+        # 通知仍在排队的调用方
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item.future.set_running_or_notify_cancel():
+                item.future.set_exception(RuntimeError('批处理推理服务已停止'))
+
+    @staticmethod
+    def _fail(requests: List[_PendingRequest], exc: BaseException):
+        """让所有尚未得到结果的请求以异常结束，调用方不会一直等待"""
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(exc)
+
+    def _process(self, requests: List[_PendingRequest], imgsz: int, conf: float):
+        """对一组请求执行一次批量推理并分发结果"""
+        batch_size = len(requests)
+        started_at = time.time()
+        wait_ms = sum((started_at - r.enqueued_at) * 1000 for r in requests)
+
+        try:
+            results = self.predictor.predict(
+                [r.image for r in requests],
+                imgsz=imgsz,
+                conf=conf,
+                device=self.device,
+                batch=batch_size,
+            )
+            if len(results) != batch_size:
+                raise RuntimeError(f'批量推理返回了 {len(results)} 个结果，预期 {batch_size} 个')
+        except Exception as e:
+            logger.error(f"批量推理失败: {e}")
+            error(f"批量推理失败: {e}", metadata={'batch_size': batch_size})
+            with self._stats_lock:
+                self._stats['failed_batches'] += 1
+            self._fail(requests, e)
+            return
+
+        inference_ms = (time.time() - started_at) * 1000
+        for request, result in zip(requests, results):
+            request.future.set_result(result)
+
+        with self._stats_lock:
+            stats = self._stats
+            stats['requests'] += batch_size
+            stats['batches'] += 1
+            stats['last_batch_size'] = batch_size
+            stats['max_batch_size_seen'] = max(stats['max_batch_size_seen'], batch_size)
+            histogram = stats['batch_size_histogram']
+            histogram[batch_size] = histogram.get(batch_size, 0) + 1
+            stats['total_wait_ms'] += wait_ms
+            stats['total_inference_ms'] += inference_ms
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取批处理统计信息
+
+        Returns:
+            包含队列深度和批次大小等指标的字典
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['batch_size_histogram'] = {str(k): v for k, v in sorted(stats['batch_size_histogram'].items())}
+
+        requests = stats.pop('requests')
+        batches = stats.pop('batches')
+        total_wait_ms = stats.pop('total_wait_ms')
+        total_inference_ms = stats.pop('total_inference_ms')
+
+        stats.update({
+            'queue_depth': self._queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'total_requests': requests,
+            'total_batches': batches,
+            'avg_batch_size': round(requests / batches, 2) if batches else 0,
+            'avg_wait_ms': round(total_wait_ms / requests, 2) if requests else 0,
+            'avg_inference_ms': round(total_inference_ms / batches, 2) if batches else 0
+        })
+        return stats
+
+
+# 单例模式，全局批处理推理服务实例
+_batch_server = None
+_batch_server_lock = threading.Lock()
+
+def get_batch_server(model, device, max_batch_size: int = 8, max_wait_ms: float = 10,
+                     threads: int = 0) -> BatchInferenceServer:
+    """获取批处理推理服务实例（单例模式）"""
+    global _batch_server
+    with _batch_server_lock:
+        if _batch_server is None:
+            _batch_server = BatchInferenceServer(model, device, max_batch_size, max_wait_ms, threads)
+    return _batch_server
+
+def get_batch_stats() -> Optional[Dict[str, Any]]:
+    """获取批处理统计信息，服务尚未启动时返回None"""
+    if _batch_server is None:
+        return None
+    return _batch_server.get_stats()
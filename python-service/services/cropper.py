@@ -13,15 +13,17 @@ import json
 import logging
 import cv2
 import numpy as np
-from PIL import Image
-import zipfile
-import shutil
 from pathlib import Path
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入日志客户端
 from utils.log_client import info, error, warn
 from utils.file_hash import get_file_hash_manager
+from utils.file_index import get_file_index
+from utils.environment import get_config
+from utils.zip_stream import write_manifest
+from services.annotation import ensure_detect_image
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -71,6 +73,58 @@ class ImageCropper:
         # 获取文件哈希管理器
         self.file_hash_manager = get_file_hash_manager()
 
+        # 裁剪图片编码和写入的线程池（cv2编码时会释放GIL），workers<=1时串行处理
+        self.crop_workers = get_config('upload')['crop_workers']
+        self._crop_executor = None
+
+    def _get_crop_executor(self):
+        """获取裁剪线程池（按需创建，实例内复用）"""
+        if self._crop_executor is None:
+            self._crop_executor = ThreadPoolExecutor(max_workers=self.crop_workers,
+                                                     thread_name_prefix='crop-writer')
+        return self._crop_executor
+
+    def _persist_crop(self, task):
+        """
+        编码并保存单个裁剪区域
+
+        Args:
+            task: (image_id, element_id, class_name, cropped_element, ocr_crops_dir)
+
+        Returns:
+            (裁剪图像信息字典, 内容哈希值)
+        """
+        image_id, element_id, class_name, cropped_element, ocr_crops_dir = task
+
+        # 在内存中编码，先哈希再决定是否需要落盘
+        success, encoded = cv2.imencode('.jpg', cropped_element)
+        if not success:
+            raise ValueError(f"无法编码裁剪图像: {element_id}")
+
+        final_class_dir = os.path.join(self.crops_folder, class_name.replace(" ", "_"))
+        candidate_filename = f"{image_id}_{class_name.replace(' ', '_')}_{element_id}.jpg"
+        candidate_path = os.path.join(final_class_dir, candidate_filename)
+
+        # 已存在相同内容的裁剪图片时直接复用，否则只写入一次
+        output_path, crop_hash, written = self.file_hash_manager.store_bytes(
+            encoded.tobytes(), candidate_path, "crop")
+        output_filename = os.path.basename(output_path)
+        if not written and output_path != candidate_path:
+            info(f"发现重复的裁剪图片，使用已存在的文件: {output_path}")
+
+        # 同时保存到OCR专用目录（使用硬链接或复制），沿用已计算的哈希值
+        ocr_output_path = os.path.join(ocr_crops_dir, f"{element_id}.jpg")
+        self.file_hash_manager.create_file_reference(output_path, ocr_output_path, "crop",
+                                                     file_hash=crop_hash)
+
+        return {
+            'id': element_id,
+            'class': class_name,
+            'filename': output_filename,
+            'path': output_path.replace('\\', '/'),  # 确保路径格式一致
+            'relative_path': os.path.join(class_name.replace(" ", "_"), output_filename).replace('\\', '/')
+        }, crop_hash
+
     def find_original_image(self, image_id):
         """
         根据图像ID查找原始图像
@@ -81,7 +135,20 @@ class ImageCropper:
         Returns:
             原始图像路径，如果找不到则返回None
         """
-        # 首先在上传文件夹中查找
+        folders = [self.upload_folder, self.results_folder, self.crops_folder, self.downloads_folder]
+
+        # 优先查询文件索引（按上面的文件夹顺序），只取各文件夹顶层的文件
+        file_index = get_file_index()
+        if file_index.is_ready():
+            top_level = {os.path.abspath(folder) for folder in folders}
+            for path in file_index.find(image_id, folders):
+                filename = os.path.basename(path)
+                if (os.path.dirname(path) in top_level and filename.startswith(image_id + '_')
+                        and not filename.endswith('_detect.jpg')):
+                    return path
+            return None
+
+        # 索引尚未建立时扫描文件夹，首先在上传文件夹中查找
         for filename in os.listdir(self.upload_folder):
             if filename.startswith(image_id + '_') and not filename.endswith('_detect.jpg'):
                 return os.path.join(self.upload_folder, filename)
@@ -120,10 +187,7 @@ class ImageCropper:
                     'error': '找不到原始图片'
                 }
 
-            # 准备裁剪目录
             crop_id = str(uuid.uuid4())
-            crop_dir = os.path.join(self.temp_folder, f"temp_crop_{crop_id}")
-            os.makedirs(crop_dir, exist_ok=True)
 
             # 为OCR服务准备特殊目录
             # 注意：这里的路径必须与OCR服务中的OUTPUT_DIR / image_id / 'crops'一致
@@ -158,11 +222,7 @@ class ImageCropper:
                     }
                 })
 
-            # 获取图像尺寸
-            image = Image.open(image_path)
-            width, height = image.size
-
-            # 执行切割
+            # 执行切割，所有区域都从这一次解码得到的数组中切出
             image_cv = cv2.imread(image_path)
             if image_cv is None:
                 error(f"无法读取图像: {image_path}")
@@ -171,15 +231,14 @@ class ImageCropper:
                     'error': f'无法读取图像: {image_path}'
                 }
 
+            # 获取图像尺寸
+            height, width = image_cv.shape[:2]
+
             # 在原图上绘制所有边界框
             image_with_boxes = image_cv.copy()
 
-            # 为每个类别创建子目录
-            class_dirs = {}
-
-            # 切割并保存每个元素
-            elements_count = 0
-            cropped_images = []
+            # 先串行绘制边界框并切出所有区域（切片是视图，不复制数据）
+            crop_tasks = []
 
             for element in detected_objects:
                 class_name = element['class']
@@ -204,193 +263,91 @@ class ImageCropper:
                 cv2.putText(image_with_boxes, f"{class_name} {confidence:.2f}",
                            (x_min, y_min - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
 
-                # 确保类别目录存在
-                if class_name not in class_dirs:
-                    class_dir = os.path.join(crop_dir, class_name.replace(" ", "_"))
-                    os.makedirs(class_dir, exist_ok=True)
-                    class_dirs[class_name] = class_dir
-
                 # 裁剪元素
                 cropped_element = image_cv[y_min:y_max, x_min:x_max]
+                crop_tasks.append((image_id, element_id, class_name, cropped_element, ocr_crops_dir))
 
-                # 保存裁剪的元素到临时目录
-                temp_output_filename = f"{os.path.splitext(os.path.basename(image_path))[0]}_{class_name.replace(' ', '_')}_{element_id}.jpg"
-                temp_output_path = os.path.join(class_dirs[class_name], temp_output_filename)
-
-                # 保存到临时文件
-                cv2.imwrite(temp_output_path, cropped_element)
-
-                # 检查是否已存在相同内容的裁剪图片
-                exists, crop_hash = self.file_hash_manager.check_file_exists(temp_output_path)
-
-                if exists:
-                    # 如果存在相同内容的裁剪图片，使用已存在的文件
-                    existing_crop_file = self.file_hash_manager.get_file_by_hash(crop_hash)
-                    info(f"发现重复的裁剪图片，使用已存在的文件: {existing_crop_file}")
-
-                    # 删除临时文件
-                    os.remove(temp_output_path)
-
-                    # 使用已存在的文件路径
-                    output_path = existing_crop_file
-                    output_filename = os.path.basename(output_path)
-                else:
-                    # 如果是新文件，移动到裁剪文件夹并添加到哈希数据库
-                    final_class_dir = os.path.join(self.crops_folder, class_name.replace(" ", "_"))
-                    os.makedirs(final_class_dir, exist_ok=True)
-
-                    output_filename = f"{image_id}_{class_name.replace(' ', '_')}_{element_id}.jpg"
-                    output_path = os.path.join(final_class_dir, output_filename)
-
-                    # 移动文件
-                    shutil.copy2(temp_output_path, output_path)
-
-                    # 添加到哈希数据库
-                    self.file_hash_manager.add_file(output_path, "crop")
-
-                # 同时保存到OCR专用目录（使用硬链接或复制）
-                ocr_output_path = os.path.join(ocr_crops_dir, f"{element_id}.jpg")
-                self.file_hash_manager.create_file_reference(output_path, ocr_output_path, "crop")
-
-                elements_count += 1
-
-                # 记录裁剪图像信息
-                cropped_images.append({
-                    'id': element_id,
-                    'class': class_name,
-                    'filename': output_filename,
-                    'path': output_path.replace('\\', '/'),  # 确保路径格式一致
-                    'relative_path': os.path.join(class_name.replace(" ", "_"), output_filename).replace('\\', '/')
-                })
-
-            # 保存带有边界框的图像到临时文件
-            temp_annotated = os.path.join(crop_dir, f"{os.path.splitext(os.path.basename(image_path))[0]}_annotated.jpg")
-            cv2.imwrite(temp_annotated, image_with_boxes)
-
-            # 检查是否已存在相同内容的标注图片
-            exists, annotated_hash = self.file_hash_manager.check_file_exists(temp_annotated)
-
-            if exists:
-                # 如果存在相同内容的标注图片，获取已存在的文件
-                existing_annotated_file = self.file_hash_manager.get_file_by_hash(annotated_hash)
-                info(f"发现重复的标注图片，使用已存在的文件: {existing_annotated_file}")
-
-                # 无论现有文件在哪里，都确保在temp文件夹中有一份
-                output_annotated = os.path.join(self.temp_folder, f"{image_id}_annotated.jpg")
-
-                # 如果temp文件夹中已经有这个文件，直接使用
-                if os.path.exists(output_annotated):
-                    info(f"标注图片已存在于temp文件夹: {output_annotated}")
-                else:
-                    # 否则，复制到temp文件夹
-                    info(f"复制标注图片到temp文件夹: {output_annotated}")
-
-                    # 确保temp文件夹存在
-                    os.makedirs(self.temp_folder, exist_ok=True)
-
-                    # 复制文件
-                    shutil.copy2(existing_annotated_file, output_annotated)
-
-                    # 添加到哈希数据库
-                    self.file_hash_manager.add_file(output_annotated, "annotated")
+            # 编码并保存每个元素，多个区域时在线程池中并行处理；map保证结果顺序与矩形顺序一致
+            if self.crop_workers > 1 and len(crop_tasks) > 1:
+                persisted = list(self._get_crop_executor().map(self._persist_crop, crop_tasks))
             else:
-                # 如果是新文件，直接保存到temp文件夹
-                output_annotated = os.path.join(self.temp_folder, f"{image_id}_annotated.jpg")
+                persisted = [self._persist_crop(task) for task in crop_tasks]
+            cropped_images = [crop_info for crop_info, _ in persisted]
+            elements_count = len(cropped_images)
+
+            # 在内存中编码带有边界框的图像，保存到temp文件夹（相同内容已存在时使用硬链接）
+            success, encoded = cv2.imencode('.jpg', image_with_boxes)
+            if not success:
+                raise ValueError("无法编码标注图像")
+
+            output_annotated = os.path.join(self.temp_folder, f"{image_id}_annotated.jpg")
+            _, annotated_hash, written = self.file_hash_manager.store_bytes(
+                encoded.tobytes(), output_annotated, "annotated", reuse_existing=False)
+            if written:
                 info(f"保存新的标注图片到temp文件夹: {output_annotated}")
+            else:
+                info(f"标注图片内容未变化，复用已存在的文件: {output_annotated}")
 
-                # 确保temp文件夹存在
-                os.makedirs(self.temp_folder, exist_ok=True)
-
-                # 复制文件
-                shutil.copy2(temp_annotated, output_annotated)
-
-                # 添加到哈希数据库
-                self.file_hash_manager.add_file(output_annotated, "annotated")
-
-            # 创建临时ZIP文件
-            temp_zip_filename = f"temp_crop_{crop_id}.zip"
-            temp_zip_filepath = os.path.join(self.temp_folder, temp_zip_filename)
-
-            # 查找detect后缀的图片
+            # 查找detect后缀的图片（标注图像按需生成，此时可能还不存在）
             detect_filename = f"{image_id}_detect.jpg"
             detect_filepath = os.path.join(self.temp_folder, detect_filename)
+            ensure_detect_image(detect_filename, self.temp_folder, self.upload_folder)
 
             # 创建JSON文件，包含所有矩形信息
             json_filename = f"{image_id}_rectangles.json"
             json_filepath = os.path.join(self.temp_folder, json_filename)
+            rectangles_json = json.dumps({
+                'image_id': image_id,
+                'crop_id': crop_id,
+                'rectangles': rectangles
+            }, ensure_ascii=False, indent=2)
 
             # 将矩形信息写入JSON文件
             with open(json_filepath, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'image_id': image_id,
-                    'crop_id': crop_id,
-                    'rectangles': rectangles
-                }, f, ensure_ascii=False, indent=2)
-
-            # 创建ZIP文件
-            with zipfile.ZipFile(temp_zip_filepath, 'w') as zipf:
-                # 按照class属性分类组织裁剪图片
-                class_groups = {}
-
-                # 将裁剪图片按class分组
-                for crop_image in cropped_images:
-                    class_name = crop_image.get('class', 'unknown')
-                    if class_name not in class_groups:
-                        class_groups[class_name] = []
-                    class_groups[class_name].append(crop_image['path'])
-
-                # 添加分类后的裁剪图片
-                for class_name, paths in class_groups.items():
-                    # 为每个类别创建一个目录
-                    for file_path in paths:
-                        # 使用类别名称作为子目录
-                        arcname = os.path.join(class_name, os.path.basename(file_path))
-                        zipf.write(file_path, arcname)
-
-                # 添加标注图片到根目录
-                zipf.write(output_annotated, os.path.basename(output_annotated))
-
-                # 添加detect图片（如果存在）到根目录
-                if os.path.exists(detect_filepath):
-                    zipf.write(detect_filepath, os.path.basename(detect_filepath))
-
-                # 添加JSON文件到根目录
-                zipf.write(json_filepath, os.path.basename(json_filepath))
-
-            # 检查是否已存在相同内容的ZIP文件
-            exists, zip_hash = self.file_hash_manager.check_file_exists(temp_zip_filepath)
-
-            if exists:
-                # 如果存在相同内容的ZIP文件，使用已存在的文件
-                existing_zip_file = self.file_hash_manager.get_file_by_hash(zip_hash)
-                info(f"发现重复的ZIP文件，使用已存在的文件: {existing_zip_file}")
-
-                # 删除临时文件
-                os.remove(temp_zip_filepath)
-
-                # 使用已存在的文件路径
-                zip_filepath = existing_zip_file
-                zip_filename = os.path.basename(zip_filepath)
-            else:
-                # 如果是新文件，移动到下载文件夹并添加到哈希数据库
-                zip_filename = f"crop_{image_id}_{crop_id}.zip"
-                zip_filepath = os.path.join(self.downloads_folder, zip_filename)
+                f.write(rectangles_json)
+
+            # 登记本次生成的文件，按ID查找时不再扫描目录
+            get_file_index().add_many(
+                [(crop_info['path'], self.crops_folder) for crop_info in cropped_images]
+                + [(output_annotated, self.temp_folder), (json_filepath, self.temp_folder)]
+            )
+
+            # 不再在磁盘上生成ZIP，只写入清单，下载时按清单流式打包
+            # 裁剪图片按class分目录；记录内容哈希和大小，之后同名文件被覆盖也能找回本次的内容
+            zip_entries = []
+            for crop_info, crop_hash in persisted:
+                zip_entries.append({
+                    'arcname': os.path.join(crop_info.get('class', 'unknown'), os.path.basename(crop_info['path'])),
+                    'path': crop_info['path'],
+                    'hash': crop_hash,
+                    'size': os.path.getsize(crop_info['path'])
+                })
+
+            # 添加标注图片到根目录
+            zip_entries.append({
+                'arcname': os.path.basename(output_annotated),
+                'path': output_annotated,
+                'hash': annotated_hash,
+                'size': os.path.getsize(output_annotated)
+            })
 
-                # 移动文件
-                shutil.move(temp_zip_filepath, zip_filepath)
+            # 添加detect图片（如果存在）到根目录，同样登记内容哈希
+            if os.path.exists(detect_filepath):
+                detect_hash, _ = self.file_hash_manager.add_file(detect_filepath, "detect")
+                if detect_hash:
+                    zip_entries.append({'arcname': detect_filename, 'path': detect_filepath, 'hash': detect_hash,
+                                        'size': os.path.getsize(detect_filepath)})
 
-                # 添加到哈希数据库
-                self.file_hash_manager.add_file(zip_filepath, "zip")
+            # 矩形信息JSON内联到清单中，作为本次裁剪的快照
+            zip_entries.append({'arcname': json_filename, 'data': rectangles_json})
+
+            zip_filename = f"crop_{image_id}_{crop_id}.zip"
+            zip_filepath = os.path.join(self.downloads_folder, zip_filename)
+            write_manifest(zip_filepath, zip_entries)
 
             info(f"裁剪成功，image_id: {image_id}, 共裁剪 {elements_count} 个元素",
                  metadata={'elements_count': elements_count, 'crop_id': crop_id})
 
-            # 清理临时目录
-            try:
-                shutil.rmtree(crop_dir)
-            except Exception as e:
-                warn(f"清理临时目录失败: {e}")
-
             # 构建相对URL路径 - 确保与前端处理方式一致
             # 前端会在这些路径前添加 /api/python 前缀
             annotated_filename = os.path.basename(output_annotated)
@@ -398,9 +355,6 @@ class ImageCropper:
             annotated_url = f'/temp/{annotated_filename}'
             zip_url = f'/downloads/{zip_filename}'
 
-            # 查找detect后缀的图片
-            detect_filename = f"{image_id}_detect.jpg"
-            detect_filepath = os.path.join(self.temp_folder, detect_filename)
             detect_url = None
 
             if os.path.exists(detect_filepath):
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+检测结果缓存模块 - 按上传内容哈希和推理参数缓存检测结果
+相同的文件（重复扫描件、刷新页面后重新上传）直接返回已有的检测结果和标注图像，不再运行模型
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from utils.log_client import info, error, warn
+from utils.environment import get_config
+from utils.lru_cache import LRUCache
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 磁盘缓存目录，多个gunicorn worker共享
+DETECT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'detect_cache')
+
+
+def _entry_size(value: Dict[str, Any]) -> int:
+    """估算缓存条目占用的内存大小"""
+    return len(value.get('annotated_bytes') or b'') + 200 * len(value.get('detected_objects', [])) + 256
+
+
+class DetectionCache:
+    """检测结果缓存，内存LRU + 磁盘目录，两层都按总大小淘汰"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, cache_dir: str = DETECT_CACHE_DIR):
+        """
+        初始化检测结果缓存
+
+        Args:
+            config: 缓存配置（get_config('cache')），为None时读取环境配置
+            cache_dir: 磁盘缓存目录
+        """
+        config = config or get_config('cache')
+        self.memory = LRUCache(
+            max_entries=config['detect_max_entries'],
+            max_bytes=config['detect_memory_max_bytes'],
+            sizeof=_entry_size
+        )
+        self.disk_max_bytes = config['detect_disk_max_bytes']
+        self.cache_dir = cache_dir if config['detect_disk_enabled'] else None
+
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0,
+                       'stores': 0, 'disk_evictions': 0}
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._disk_bytes = self._scan_disk()[1]
+            except Exception as e:
+                error(f"初始化检测磁盘缓存失败，仅使用内存缓存: {e}")
+                self.cache_dir = None
+
+        info(f"检测结果缓存已启用，磁盘缓存: {'开启' if self.cache_dir else '关闭'}")
+
+    @staticmethod
+    def make_key(content_hash: str, imgsz: int, conf: float, model_version: str) -> str:
+        """
+        根据文件内容哈希、推理参数和模型版本生成缓存键
+
+        Args:
+            content_hash: 上传文件的内容哈希
+            imgsz: 图像大小
+            conf: 置信度阈值
+            model_version: 模型版本标识（模型权重的内容哈希）
+
+        Returns:
+            缓存键
+        """
+        raw = f"{content_hash}|{int(imgsz)}|{float(conf):.4f}|{model_version}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str):
+        """缓存条目在磁盘上的元数据文件和标注图像文件路径"""
+        return (os.path.join(self.cache_dir, f"{key}.json"),
+                os.path.join(self.cache_dir, f"{key}.jpg"))
+
+    def _scan_disk(self):
+        """扫描磁盘缓存目录，返回按最近使用时间排序的条目列表和总大小"""
+        entries = {}
+        for item in os.scandir(self.cache_dir):
+            if not item.is_file() or item.name.startswith('.'):
+                continue
+            key, _ = os.path.splitext(item.name)
+            stat = item.stat()
+            size, mtime = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+        ordered = sorted(entries.items(), key=lambda kv: kv[1][1])
+        return ordered, sum(size for _, (size, _) in ordered)
+
+    def _evict_disk(self):
+        """磁盘缓存超过上限时，删除最久未使用的条目直到低于上限的90%"""
+        ordered, total = self._scan_disk()
+        target = self.disk_max_bytes * 0.9
+        evicted = 0
+        for key, (size, _) in ordered:
+            if total <= target:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+        self._disk_bytes = total
+        self._stats['disk_evictions'] += evicted
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的检测结果
+
+        Returns:
+            包含 width、height、detected_objects、annotated_bytes（可能为None）的字典，未命中时返回None
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            with self._lock:
+                self._stats['hits'] += 1
+                self._stats['memory_hits'] += 1
+            return value
+
+        if self.cache_dir:
+            meta_path, image_path = self._paths(key)
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+                # 标注图像按需生成，条目中可能没有
+                value['annotated_bytes'] = None
+                if os.path.exists(image_path):
+                    with open(image_path, 'rb') as f:
+                        value['annotated_bytes'] = f.read()
+                # 更新修改时间，作为磁盘层的最近使用时间
+                now = time.time()
+                for path in (meta_path, image_path):
+                    if os.path.exists(path):
+                        os.utime(path, (now, now))
+            except FileNotFoundError:
+                value = None
+            except Exception as e:
+                warn(f"读取检测磁盘缓存失败: {e}")
+                value = None
+
+            if value is not None:
+                self.memory.set(key, value)
+                with self._lock:
+                    self._stats['hits'] += 1
+                    self._stats['disk_hits'] += 1
+                return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """
+        写入检测结果
+
+        Args:
+            key: 缓存键
+            value: 包含 width、height、detected_objects、annotated_bytes（可为None）的字典
+        """
+        self.memory.set(key, value)
+        with self._lock:
+            self._stats['stores'] += 1
+
+        if not self.cache_dir:
+            return
+        try:
+            meta_path, image_path = self._paths(key)
+            meta = {k: v for k, v in value.items() if k != 'annotated_bytes'}
+            annotated_bytes = value.get('annotated_bytes') or b''
+
+            # 先写图像再写元数据，读取时以元数据文件作为条目存在的标志
+            writes = [(meta_path, 'w', json.dumps(meta, ensure_ascii=False))]
+            if annotated_bytes:
+                writes.insert(0, (image_path, 'wb', annotated_bytes))
+            for path, mode, payload in writes:
+                tmp_path = os.path.join(self.cache_dir, f".{os.path.basename(path)}.{os.getpid()}.part")
+                with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+
+            with self._lock:
+                self._disk_bytes += len(annotated_bytes) + os.path.getsize(meta_path)
+                if self._disk_bytes > self.disk_max_bytes:
+                    self._evict_disk()
+        except Exception as e:
+            warn(f"写入检测磁盘缓存失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        memory_stats = self.memory.get_stats()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['disk_bytes'] = self._disk_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        stats['memory_entries'] = memory_stats['entries']
+        stats['memory_bytes'] = memory_stats['bytes']
+        stats['disk_enabled'] = bool(self.cache_dir)
+        return stats
+
+
+# 单例模式，全局检测结果缓存实例
+_detection_cache = None
+_detection_cache_lock = threading.Lock()
+
+def get_detection_cache() -> Optional[DetectionCache]:
+    """获取检测结果缓存实例（单例模式），缓存被禁用时返回None"""
+    global _detection_cache
+    if _detection_cache is None:
+        with _detection_cache_lock:
+            if _detection_cache is None:
+                if not get_config('cache')['detect_enabled']:
+                    return None
+                _detection_cache = DetectionCache()
+    return _detection_cache
+
+def get_detection_cache_stats() -> Optional[Dict[str, Any]]:
+    """获取检测结果缓存统计信息，缓存尚未创建时返回None"""
+    if _detection_cache is None:
+        return None
+    return _detection_cache.get_stats()
@@ -10,14 +10,24 @@ import os
 import sys
 import json
 import logging
+import cv2
 import torch
 import numpy as np
-from PIL import Image
 from pathlib import Path
 import time
+import threading
+from contextlib import closing
 
 # 导入日志客户端
 from utils.log_client import info, error
+from utils.environment import get_config
+from utils.file_hash import get_file_hash_manager
+from services.batch_inference import get_batch_server
+from services.predictor_pool import get_predictor_pool
+from services.detection_cache import get_detection_cache
+from services.weight_store import load_shared_model
+from services.model_backend import load_backend_model
+from services.annotation import encode_annotated
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -25,6 +35,8 @@ logger = logging.getLogger(__name__)
 # 确保能够导入DocLayout-YOLO模块
 sys.path.append(os.path.abspath('./DocLayout-YOLO'))
 from doclayout_yolo import YOLOv10
+from doclayout_yolo.data.loaders import LoadPdf
+from doclayout_yolo.engine.results import Detections
 from huggingface_hub import hf_hub_download
 
 # 自定义JSON编码器处理NumPy数据类型
@@ -41,15 +53,26 @@ class NumpyEncoder(json.JSONEncoder):
 # 全局变量，用于存储预加载的模型和设备
 _global_model = None
 _global_device = None
+# 模型版本（模型权重的内容哈希），作为检测结果缓存键的一部分
+_global_model_version = None
+# 防止多个线程同时加载模型
+_model_lock = threading.RLock()
 
 # 预加载模型函数
 def preload_model():
     """预加载YOLO模型，只在模块导入时执行一次"""
-    global _global_model, _global_device
-
     if _global_model is not None:
         return _global_model, _global_device
 
+    with _model_lock:
+        if _global_model is not None:
+            return _global_model, _global_device
+        return _load_model()
+
+def _load_model():
+    """下载（如有必要）并加载YOLO模型，调用方需持有_model_lock"""
+    global _global_model, _global_device, _global_model_version
+
     start_time = time.time()
     logger.info("正在预加载DocLayout-YOLO模型...")
     info("正在预加载DocLayout-YOLO模型...")
@@ -94,8 +117,57 @@ def preload_model():
                 info(f"已将模型复制到本地缓存: {local_model_path}")
                 model_path = local_model_path
 
-        # 加载模型
-        _global_model = YOLOv10(model_path)
+        _global_model_version = get_file_hash_manager().calculate_file_hash(model_path) or os.path.basename(model_path)
+
+        # 加载模型：CPU上可使用导出的ONNX Runtime / OpenVINO后端，否则优先使用内存映射的融合权重
+        detector_config = get_config('detector')
+        backend = detector_config['backend']
+        _global_model = None
+        if backend != 'pytorch':
+            if _global_device == 'cpu':
+                _global_model = load_backend_model(model_path, backend, _global_model_version, detector_config)
+                if _global_model is None:
+                    logger.warning(f"{backend}后端不可用，回退到PyTorch")
+                else:
+                    # 不同后端的输出有细微差异，检测结果缓存按后端区分
+                    _global_model_version = f"{_global_model_version}:{backend}"
+            else:
+                logger.warning(f"{backend}后端仅用于CPU，当前设备为{_global_device}，使用PyTorch")
+        if _global_model is None and detector_config['weight_mmap']:
+            _global_model = load_shared_model(model_path, _global_model_version, detector_config['weight_store_dir'])
+            if _global_model is None:
+                logger.warning("内存映射权重不可用，回退到普通加载")
+        if _global_model is None:
+            _global_model = YOLOv10(model_path)
+
+        # 推理线程数：导出后端通过预测参数传给AutoBackend，PyTorch后端设置进程级线程数
+        intra_threads = detector_config['intra_op_threads']
+        inter_threads = detector_config['inter_op_threads']
+        _global_model.overrides['threads'] = intra_threads
+        _global_model.overrides['inter_threads'] = inter_threads
+        # PDF等多批次输入在后台线程中提前解码和letterbox，与当前批次的推理重叠
+        _global_model.overrides['prefetch_batches'] = detector_config['prefetch_batches']
+        _global_model.overrides['prefetch_workers'] = detector_config['prefetch_workers']
+        # 单次遍历完成letterbox、BGR转RGB、转置和归一化，输入张量按形状复用
+        _global_model.overrides['fused_preprocess'] = detector_config['fused_preprocess']
+        _global_model.overrides['pinned_input'] = detector_config['pinned_input']
+        # 批量检测时按宽高比分组，每组只填充到覆盖该组的最小矩形，而不是整个imgsz正方形
+        _global_model.overrides['rect_batching'] = detector_config['rect_batching']
+        # 超大页面（高分辨率扫描、海报）按重叠的窗口分块检测，结果合并回页面坐标；分块会改变检测结果，缓存按分块参数区分
+        _global_model.overrides['tile_size'] = detector_config['tile_size']
+        _global_model.overrides['tile_overlap'] = detector_config['tile_overlap']
+        _global_model.overrides['tile_batch'] = detector_config['tile_batch']
+        if detector_config['tile_size'] > 0:
+            _global_model_version = f"{_global_model_version}:tile{detector_config['tile_size']}-{detector_config['tile_overlap']}"
+        if isinstance(_global_model.model, torch.nn.Module):
+            try:
+                if intra_threads > 0:
+                    torch.set_num_threads(intra_threads)
+                if inter_threads > 0:
+                    torch.set_num_interop_threads(inter_threads)
+            except RuntimeError as e:
+                # set_num_interop_threads只能在并行任务开始前调用一次
+                logger.warning(f"设置PyTorch线程数失败: {e}")
 
         elapsed_time = time.time() - start_time
         logger.info(f"模型预加载完成，耗时: {elapsed_time:.2f}秒")
@@ -107,10 +179,46 @@ def preload_model():
         error(f"预加载DocLayout-YOLO模型时出错: {e}")
         raise
 
-# 不再在模块导入时预加载模型
-# 模型将在第一次实际需要时加载
-logger.info("模型将在第一次使用时加载")
-info("模型将在第一次使用时加载")
+def warm_model(imgsz=1024):
+    """
+    加载、融合并预热模型
+
+    在gunicorn主进程或worker启动时调用，让第一个请求不再承担下载、构建和预热的开销
+
+    Args:
+        imgsz: 预热推理使用的图像大小
+    """
+    model, device = preload_model()
+    with _model_lock:
+        start_time = time.time()
+        # 用空白图像执行一次推理：创建预测器、分配内存并触发各后端的首次初始化
+        _get_pool(model, device).predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, device=device, verbose=False)
+        logger.info(f"模型预热完成，imgsz: {imgsz}，耗时: {time.time() - start_time:.2f}秒")
+        info(f"DocLayout-YOLO模型预热完成，imgsz: {imgsz}，耗时: {time.time() - start_time:.2f}秒")
+    return model, device
+
+def _get_pool(model, device):
+    """
+    融合模型并创建预测器池，调用方需持有_model_lock
+
+    预测器池在融合之后创建，池中的预测器共享融合后的权重；未启用预测器池（DETECT_POOL_SIZE<=1）时池中只有一个预测器，
+    PDF检测和不经过批处理服务的检测都通过它推理，不使用 model.predict() 共享的预测器（批处理服务有自己的预测器）
+
+    Returns:
+        PredictorPool实例
+    """
+    # 融合Conv+BN，预测器自身不做融合；导出后端在导出时已经融合；重复调用时不会再次融合
+    if isinstance(model.model, torch.nn.Module):
+        model.fuse()
+    detector_config = get_config('detector')
+    return get_predictor_pool(
+        model,
+        device,
+        size=max(1, detector_config['pool_size']),
+        threads=detector_config['intra_op_threads']
+    )
+
+# 不在模块导入时加载模型，由gunicorn启动钩子（见gunicorn.conf.py）或第一次使用时加载
 
 class DocumentDetector:
     """文档区域检测器类"""
@@ -125,8 +233,26 @@ class DocumentDetector:
 
         self.model = _global_model
         self.device = _global_device
-
-    def detect(self, image_path, imgsz=1024, conf=0.2):
+        self.model_version = _global_model_version
+
+        detector_config = get_config('detector')
+        with _model_lock:
+            # 单张图片和PDF都从预测器池中借出预测器；池中有多个预测器时多个请求同时推理
+            self.pool = _get_pool(self.model, self.device)
+
+            # 启用动态批处理时，并发请求会在批处理服务中合并推理，批处理服务使用自己独占的预测器；
+            # 批处理服务只有一个推理线程，启用预测器池时不使用批处理服务，否则池中同时只有一个预测器在工作
+            self.batch_server = None
+            if detector_config['batching_enabled'] and detector_config['pool_size'] <= 1:
+                self.batch_server = get_batch_server(
+                    self.model,
+                    self.device,
+                    max_batch_size=detector_config['max_batch_size'],
+                    max_wait_ms=detector_config['max_wait_ms'],
+                    threads=detector_config['intra_op_threads']
+                )
+
+    def detect(self, image_path, imgsz=1024, conf=0.2, annotate=False):
         """
         检测图像中的文档区域
 
@@ -134,69 +260,149 @@ class DocumentDetector:
             image_path: 图像路径
             imgsz: 图像大小
             conf: 置信度阈值
+            annotate: 是否同时生成JPEG标注图像（annotated_bytes）
 
         Returns:
             检测结果字典
         """
-        logger.info(f"开始检测图片: {image_path}")
-        info(f"开始检测图片: {image_path}", metadata={'imgsz': imgsz, 'conf': conf})
+        def decode():
+            # 在请求线程中解码图像，批处理线程只负责推理
+            return cv2.imread(str(image_path))
 
-        try:
-            # 进行预测
-            results = self.model.predict(
-                image_path,
-                imgsz=imgsz,
-                conf=conf,
-                device=self.device,
-            )
+        content_hash = get_file_hash_manager().calculate_file_hash(image_path) if os.path.exists(image_path) else None
+        return self._detect_cached(content_hash, decode, imgsz, conf, image_path, annotate)
+
+    def detect_bytes(self, data, imgsz=1024, conf=0.2, source='<bytes>', annotate=False):
+        """
+        直接检测内存中的图像数据，不经过磁盘
+
+        Args:
+            data: 编码后的图像字节（如上传文件的内容）
+            imgsz: 图像大小
+            conf: 置信度阈值
+            source: 用于日志的来源描述
+            annotate: 是否同时生成JPEG标注图像（annotated_bytes）
+
+        Returns:
+            检测结果字典
+        """
+        def decode():
+            try:
+                return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            except cv2.error:
+                return None
+
+        content_hash = get_file_hash_manager().calculate_bytes_hash(data)
+        return self._detect_cached(content_hash, decode, imgsz, conf, source, annotate)
+
+    def _detect_cached(self, content_hash, decode, imgsz, conf, source, annotate=False):
+        """
+        先按内容哈希和推理参数查询检测结果缓存，未命中时解码并检测，再写入缓存
+
+        Args:
+            content_hash: 文件内容哈希，为空时不使用缓存
+            decode: 返回BGR图像的解码函数，只在缓存未命中（或需要补画标注图像）时调用
+            imgsz: 图像大小
+            conf: 置信度阈值
+            source: 用于日志的来源描述
+            annotate: 是否需要JPEG编码的标注图像 annotated_bytes
+
+        Returns:
+            检测结果字典
+        """
+        cache = get_detection_cache()
+        cache_key = None
+        if cache is not None and content_hash:
+            cache_key = cache.make_key(content_hash, imgsz, conf, self.model_version)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                info(f"检测结果缓存命中: {source}", metadata={'objects_count': len(cached['detected_objects'])})
+                annotated_bytes = cached.get('annotated_bytes')
+                if annotate and not annotated_bytes:
+                    image = decode()
+                    if image is not None:
+                        annotated_bytes = encode_annotated(image, cached['detected_objects'])
+                        cache.set(cache_key, dict(cached, annotated_bytes=annotated_bytes))
+                return {
+                    "success": True,
+                    "width": cached['width'],
+                    "height": cached['height'],
+                    "detected_objects": cached['detected_objects'],
+                    "annotated_bytes": annotated_bytes,
+                    "cached": True
+                }
+
+        image = decode()
+        if image is None:
+            error(f"无法读取图像: {source}")
+            return {
+                "success": False,
+                "error": f"无法读取图像: {source}"
+            }
+
+        result = self.detect_array(image, imgsz=imgsz, conf=conf, source=source, annotate=annotate)
+        if not result['success']:
+            return result
+
+        if cache_key is not None:
+            cache.set(cache_key, {
+                "width": result['width'],
+                "height": result['height'],
+                "detected_objects": result['detected_objects'],
+                "annotated_bytes": result['annotated_bytes']
+            })
+        return result
+
+    def detect_array(self, image, imgsz=1024, conf=0.2, source='<ndarray>', annotate=False):
+        """
+        检测已解码图像中的文档区域
 
-            # 获取第一个结果
-            result = results[0]
+        解码后的数组会同时用于获取尺寸、推理和绘制标注图像，整个过程只解码一次
 
+        Args:
+            image: BGR格式的numpy图像
+            imgsz: 图像大小
+            conf: 置信度阈值
+            source: 用于日志的来源描述
+            annotate: 是否同时生成JPEG标注图像，默认只返回检测结果，标注图像按需生成（见services.annotation）
+
+        Returns:
+            检测结果字典
+        """
+        logger.info(f"开始检测图片: {source}")
+        info(f"开始检测图片: {source}", metadata={'imgsz': imgsz, 'conf': conf})
+
+        try:
             # 获取图像尺寸
-            image = Image.open(image_path)
-            image_width, image_height = image.size
+            image_height, image_width = image.shape[:2]
+
+            # 进行预测
+            if self.batch_server is not None:
+                result = self.batch_server.submit(image, imgsz=imgsz, conf=conf)
+            else:
+                results = self.pool.predict(
+                    image,
+                    imgsz=imgsz,
+                    conf=conf,
+                    device=self.device,
+                )
+                result = results[0]
 
             # 处理检测结果
-            formatted_results = []
-            for i, box in enumerate(result.boxes):
-                class_id = int(box.cls.item())
-                class_name = result.names[class_id]
-                confidence = float(box.conf.item())
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-
-                # 确保坐标在图像范围内
-                x1 = max(0, x1)
-                y1 = max(0, y1)
-                x2 = min(image_width, x2)
-                y2 = min(image_height, y2)
-
-                formatted_results.append({
-                    "id": i,
-                    "class": class_name,
-                    "class_id": class_id,
-                    "confidence": confidence,
-                    "bbox": {
-                        "x_min": x1,
-                        "y_min": y1,
-                        "x_max": x2,
-                        "y_max": y2
-                    }
-                })
+            formatted_results = self._format_boxes(result, image_width, image_height)
 
-            # 保存检测结果图像
-            annotated_frame = result.plot(pil=True, line_width=5, font_size=20)
-            annotated_frame = Image.fromarray(annotated_frame)
+            # 绘制检测结果图像
+            annotated_bytes = encode_annotated(image, formatted_results) if annotate else None
 
             info(f"检测完成，找到 {len(formatted_results)} 个对象",
-                 metadata={'image_path': str(image_path), 'objects_count': len(formatted_results)})
+                 metadata={'image_path': str(source), 'objects_count': len(formatted_results)})
 
             return {
                 "success": True,
                 "width": image_width,
                 "height": image_height,
                 "detected_objects": formatted_results,
-                "annotated_frame": annotated_frame
+                "annotated_bytes": annotated_bytes
             }
 
         except Exception as e:
@@ -204,12 +410,106 @@ class DocumentDetector:
             import traceback
             logger.error(traceback.format_exc())
             error(f"检测图片时发生错误: {str(e)}",
-                  metadata={'image_path': str(image_path), 'traceback': traceback.format_exc()})
+                  metadata={'image_path': str(source), 'traceback': traceback.format_exc()})
             return {
                 "success": False,
                 "error": str(e)
             }
 
+    def detect_pdf(self, source, imgsz=1024, conf=0.2, dpi=150, batch=4, annotate=False):
+        """
+        逐页检测PDF文档
+
+        页面在后台线程中按需光栅化，并按批次送入模型，光栅化与推理重叠进行，
+        内存中最多只保留一个批次加预取的页面
+
+        Args:
+            source: PDF文件路径或PDF字节数据
+            imgsz: 图像大小
+            conf: 置信度阈值
+            dpi: 光栅化分辨率
+            batch: 每批推理的页数
+            annotate: 是否为每页生成JPEG标注图像
+
+        Returns:
+            检测结果字典，pages 为每页的检测结果列表
+        """
+        source_name = '<bytes>' if isinstance(source, (bytes, bytearray)) else str(source)
+        logger.info(f"开始检测PDF: {source_name}")
+        info(f"开始检测PDF: {source_name}", metadata={'imgsz': imgsz, 'conf': conf, 'dpi': dpi})
+
+        try:
+            loader = LoadPdf(source, batch=batch, dpi=dpi)
+        except Exception as e:
+            error(f"无法打开PDF: {source_name}, {e}")
+            return {
+                "success": False,
+                "error": f"无法打开PDF: {e}"
+            }
+
+        pages = []
+        try:
+            # PDF在预测器池中借出的预测器上逐批推理，整个文档期间占用该预测器，不会阻塞批处理服务，
+            # 也不会被其他请求改写推理参数；生成器结束或关闭时归还预测器
+            stream = self.pool.predict(loader, imgsz=imgsz, conf=conf, device=self.device, batch=batch, stream=True)
+            with closing(stream):
+                for result in stream:
+                    page_height, page_width = result.orig_shape
+                    page = {
+                        "page": len(pages) + 1,
+                        "width": page_width,
+                        "height": page_height,
+                        "detected_objects": self._format_boxes(result, page_width, page_height)
+                    }
+                    if annotate:
+                        page["annotated_bytes"] = encode_annotated(result.orig_img, page["detected_objects"])
+                    pages.append(page)
+        except Exception as e:
+            logger.error(f"检测PDF时发生错误: {str(e)}")
+            error(f"检测PDF时发生错误: {str(e)}", metadata={'source': source_name})
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        finally:
+            loader.close()
+
+        info(f"PDF检测完成，共 {len(pages)} 页",
+             metadata={'source': source_name, 'objects_count': sum(len(p['detected_objects']) for p in pages)})
+        return {
+            "success": True,
+            "page_count": len(pages),
+            "pages": pages
+        }
+
+    @staticmethod
+    def _format_boxes(result, image_width, image_height):
+        """把Results中的检测框转换为接口使用的字典列表（按列整体转换，不逐个访问检测框张量）"""
+        columns = Detections.from_results([result])[0]
+
+        # 坐标截断为整数并确保在图像范围内
+        xyxy = columns['xyxy'].astype(np.int64)
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, image_width)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, image_height)
+
+        names = result.names
+        return [
+            {
+                "id": i,
+                "class": names[class_id],
+                "class_id": class_id,
+                "confidence": confidence,
+                "bbox": {
+                    "x_min": x1,
+                    "y_min": y1,
+                    "x_max": x2,
+                    "y_max": y2
+                }
+            }
+            for i, (class_id, confidence, (x1, y1, x2, y2))
+            in enumerate(zip(columns['cls'].tolist(), columns['conf'].tolist(), xyxy.tolist()))
+        ]
+
 # 单例模式，全局检测器实例
 detector = None
 
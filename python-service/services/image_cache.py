@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+派生图片缓存模块 - 缓存图片代理生成的缩略图和格式转换结果
+按源图片内容哈希和处理参数缓存编码后的图片，编辑器重复获取同一缩略图时不再重新解码、缩放和编码
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from utils.log_client import info, error, warn
+from utils.environment import get_config
+from utils.file_hash import get_file_hash_manager
+from utils.lru_cache import LRUCache
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 磁盘缓存目录，多个gunicorn worker共享
+IMAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'image_cache')
+
+
+class DerivedImageCache:
+    """派生图片缓存，内存LRU + 磁盘目录，两层都按总大小淘汰"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, cache_dir: str = IMAGE_CACHE_DIR):
+        """
+        初始化派生图片缓存
+
+        Args:
+            config: 缓存配置（get_config('cache')），为None时读取环境配置
+            cache_dir: 磁盘缓存目录
+        """
+        config = config or get_config('cache')
+        self.memory = LRUCache(
+            max_entries=config['image_max_entries'],
+            max_bytes=config['image_memory_max_bytes'],
+            sizeof=len
+        )
+        # 源图片内容哈希，按路径、大小和修改时间缓存
+        self._source_hashes = LRUCache(max_entries=10000)
+        self.disk_max_bytes = config['image_disk_max_bytes']
+        self.cache_dir = cache_dir if config['image_disk_enabled'] else None
+
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0,
+                       'stores': 0, 'disk_evictions': 0}
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            except Exception as e:
+                error(f"初始化图片磁盘缓存失败，仅使用内存缓存: {e}")
+                self.cache_dir = None
+
+        info(f"派生图片缓存已启用，磁盘缓存: {'开启' if self.cache_dir else '关闭'}")
+
+    def get_source_hash(self, path: str) -> Optional[str]:
+        """
+        获取源图片的内容哈希，优先使用哈希数据库中登记的值
+
+        Args:
+            path: 源图片路径
+
+        Returns:
+            内容哈希值，读取失败时返回None
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (path, stat.st_size, stat.st_mtime)
+        file_hash = self._source_hashes.get(key)
+        if file_hash is None:
+            manager = get_file_hash_manager()
+            file_hash = manager.get_path_hash(path) or manager.calculate_file_hash(path)
+            if not file_hash:
+                return None
+            self._source_hashes.set(key, file_hash)
+        return file_hash
+
+    @staticmethod
+    def make_key(source_hash: str, width: Optional[int], height: Optional[int], format: str, quality: int) -> str:
+        """
+        根据源图片内容哈希和处理参数生成缓存键（同时用作强ETag）
+
+        Args:
+            source_hash: 源图片内容哈希
+            width: 目标宽度
+            height: 目标高度
+            format: 输出格式（JPEG、PNG、GIF、WEBP等）
+            quality: 编码质量
+
+        Returns:
+            缓存键
+        """
+        raw = f"{source_hash}|{width or 0}|{height or 0}|{format}|{int(quality)}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.img")
+
+    def _scan_disk(self):
+        """扫描磁盘缓存目录，返回按最近使用时间排序的 (路径, 大小, 修改时间) 列表"""
+        entries = []
+        for item in os.scandir(self.cache_dir):
+            if item.is_file() and not item.name.startswith('.'):
+                stat = item.stat()
+                entries.append((item.path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def _evict_disk(self):
+        """磁盘缓存超过上限时，删除最久未使用的条目直到低于上限的90%"""
+        entries = self._scan_disk()
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_max_bytes * 0.9
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._disk_bytes = total
+        self._stats['disk_evictions'] += evicted
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存的图片数据，未命中时返回None"""
+        data = self.memory.get(key)
+        if data is not None:
+            with self._lock:
+                self._stats['hits'] += 1
+                self._stats['memory_hits'] += 1
+            return data
+
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # 更新修改时间，作为磁盘层的最近使用时间
+                now = time.time()
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                data = None
+            except Exception as e:
+                warn(f"读取图片磁盘缓存失败: {e}")
+                data = None
+
+            if data is not None:
+                self.memory.set(key, data)
+                with self._lock:
+                    self._stats['hits'] += 1
+                    self._stats['disk_hits'] += 1
+                return data
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, data: bytes):
+        """写入图片数据"""
+        self.memory.set(key, data)
+        with self._lock:
+            self._stats['stores'] += 1
+
+        if not self.cache_dir:
+            return
+        try:
+            path = self._path(key)
+            tmp_path = os.path.join(self.cache_dir, f".{key}.{os.getpid()}.part")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            with self._lock:
+                self._disk_bytes += len(data)
+                if self._disk_bytes > self.disk_max_bytes:
+                    self._evict_disk()
+        except Exception as e:
+            warn(f"写入图片磁盘缓存失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        memory_stats = self.memory.get_stats()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['disk_bytes'] = self._disk_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        stats['memory_entries'] = memory_stats['entries']
+        stats['memory_bytes'] = memory_stats['bytes']
+        stats['disk_enabled'] = bool(self.cache_dir)
+        return stats
+
+
+# 单例模式，全局派生图片缓存实例
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache() -> Optional[DerivedImageCache]:
+    """获取派生图片缓存实例（单例模式），缓存被禁用时返回None"""
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                if not get_config('cache')['image_enabled']:
+                    return None
+                _image_cache = DerivedImageCache()
+    return _image_cache
+
+def get_image_cache_stats() -> Optional[Dict[str, Any]]:
+    """获取派生图片缓存统计信息，缓存尚未创建时返回None"""
+    if _image_cache is None:
+        return None
+    return _image_cache.get_stats()
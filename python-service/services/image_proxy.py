@@ -13,9 +13,12 @@ from pathlib import Path
 from typing import Optional, Dict, Any, Tuple, List, Union
 
 from PIL import Image
-from flask import send_file, abort, jsonify, current_app
+from flask import send_file, abort, jsonify, current_app, request, Response
 
 from utils.log_client import info, error, warn
+from utils.environment import get_config
+from services.image_cache import get_image_cache
+from utils.file_index import get_file_index
 
 class ImageProxy:
     """图片代理服务类，处理图片请求和转换"""
@@ -63,7 +66,18 @@ class ImageProxy:
         if self.temp_folder:
             folders_to_search.append(self.temp_folder)
 
-        # 记录搜索的文件夹
+        # 优先查询文件索引，按文件夹顺序返回第一个匹配的文件
+        file_index = get_file_index()
+        if file_index.is_ready():
+            matches = file_index.find(image_id, folders_to_search)
+            if matches:
+                filepath = matches[0]
+                info(f"在文件索引中找到匹配的图片: {filepath}")
+                return filepath, self._get_mime_type(filepath)
+            warn(f"文件索引中没有ID为{image_id}的图片")
+            return None, None
+
+        # 索引尚未建立时扫描文件夹
         info(f"将在以下文件夹中搜索图片: {folders_to_search}")
 
         # 在每个文件夹中查找
@@ -112,15 +126,20 @@ class ImageProxy:
 
     def get_image_response(self, image_id: str, width: Optional[int] = None,
                           height: Optional[int] = None,
-                          format: Optional[str] = None) -> Any:
+                          format: Optional[str] = None,
+                          quality: Optional[int] = None) -> Any:
         """
         获取图片响应，支持基本的图片处理
 
+        处理结果按源图片内容哈希和处理参数缓存；响应带有强ETag和Cache-Control，
+        客户端带If-None-Match重复请求时直接返回304
+
         Args:
             image_id: 图片ID
             width: 可选的宽度
             height: 可选的高度
             format: 可选的格式转换
+            quality: 可选的编码质量（JPEG/WEBP）
 
         Returns:
             Flask响应对象
@@ -131,62 +150,100 @@ class ImageProxy:
             error(f"找不到ID为{image_id}的图片")
             return jsonify({'success': False, 'error': f'找不到ID为{image_id}的图片'}), 404
 
+        cache = get_image_cache()
+        cache_config = get_config('cache')
+        source_hash = cache.get_source_hash(filepath) if cache is not None else None
+
         # 如果不需要处理，直接返回文件
         if not width and not height and not format:
+            if source_hash and request.if_none_match.contains(source_hash):
+                return self._not_modified(source_hash, cache_config['image_max_age'])
             info(f"直接返回图片: {filepath}")
-            return send_file(filepath, mimetype=mime_type)
+            response = send_file(filepath, mimetype=mime_type, etag=source_hash or True,
+                                 max_age=cache_config['image_max_age'])
+            response.cache_control.public = False
+            response.cache_control.private = True
+            return response
 
         # 需要处理图片
         try:
-            info(f"处理图片: {filepath}, 宽度: {width}, 高度: {height}, 格式: {format}")
-            img = Image.open(filepath)
+            format = self._resolve_format(filepath, format)
+            quality = max(1, min(95, int(quality or cache_config['image_quality'])))
+            cache_key = cache.make_key(source_hash, width, height, format, quality) if source_hash else None
+            if cache_key and request.if_none_match.contains(cache_key):
+                return self._not_modified(cache_key, cache_config['image_max_age'])
+
+            data = cache.get(cache_key) if cache_key else None
+            if data is None:
+                info(f"处理图片: {filepath}, 宽度: {width}, 高度: {height}, 格式: {format}")
+                data = self._render(filepath, width, height, format, quality)
+                if cache_key:
+                    cache.set(cache_key, data)
+
+            response = Response(data, mimetype=f"image/{format.lower()}")
+            if cache_key:
+                response.set_etag(cache_key)
+            response.cache_control.private = True
+            response.cache_control.max_age = cache_config['image_max_age']
+            return response
 
+        except Exception as e:
+            error(f"处理图片时出错: {str(e)}")
+            return jsonify({'success': False, 'error': f'处理图片时出错: {str(e)}'}), 500
+
+    @staticmethod
+    def _not_modified(etag: str, max_age: int) -> Response:
+        """返回304响应"""
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = max_age
+        return response
+
+    @staticmethod
+    def _resolve_format(filepath: str, format: Optional[str]) -> str:
+        """确定输出格式：指定的格式无效时使用JPEG，未指定时使用原始格式"""
+        if format:
+            format = format.upper()
+            # 确保格式有效
+            return format if format in ['JPEG', 'PNG', 'GIF', 'WEBP'] else 'JPEG'
+        # 只读取文件头获取原始格式
+        with Image.open(filepath) as img:
+            return img.format if img.format else 'JPEG'
+
+    @staticmethod
+    def _render(filepath: str, width: Optional[int], height: Optional[int], format: str, quality: int) -> bytes:
+        """缩放并编码图片"""
+        with Image.open(filepath) as img:
             # 调整大小
             if width or height:
                 # 计算新的尺寸，保持宽高比
                 orig_width, orig_height = img.size
                 if width and not height:
                     # 按宽度等比例缩放
-                    ratio = width / orig_width
-                    height = int(orig_height * ratio)
+                    height = max(1, int(orig_height * width / orig_width))
                 elif height and not width:
                     # 按高度等比例缩放
-                    ratio = height / orig_height
-                    width = int(orig_width * ratio)
+                    width = max(1, int(orig_width * height / orig_height))
 
-                # 调整大小
+                # JPEG在解码时按1/2、1/4、1/8缩小（不小于目标尺寸），再用LANCZOS缩放到精确尺寸
+                if img.format == 'JPEG':
+                    img.draft(img.mode, (width, height))
                 img = img.resize((width, height), Image.LANCZOS)
-
-            # 转换格式
-            if format:
-                format = format.upper()
-                # 确保格式有效
-                if format not in ['JPEG', 'PNG', 'GIF', 'WEBP']:
-                    format = 'JPEG'  # 默认使用JPEG
             else:
-                # 使用原始格式
-                format = img.format if img.format else 'JPEG'
-
-            # 创建内存文件对象
-            img_io = io.BytesIO()
+                img.load()
 
             # 保存到内存文件对象
+            img_io = io.BytesIO()
             if format == 'JPEG':
-                img.save(img_io, format=format, quality=85)
+                if img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                img.save(img_io, format=format, quality=quality)
+            elif format == 'WEBP':
+                img.save(img_io, format=format, quality=quality)
             else:
                 img.save(img_io, format=format)
-
-            img_io.seek(0)
-
-            # 确定MIME类型
-            mime_type = f"image/{format.lower()}"
-
-            # 返回处理后的图片
-            return send_file(img_io, mimetype=mime_type)
-
-        except Exception as e:
-            error(f"处理图片时出错: {str(e)}")
-            return jsonify({'success': False, 'error': f'处理图片时出错: {str(e)}'}), 500
+            return img_io.getvalue()
 
     def _get_mime_type(self, filepath: str) -> str:
         """
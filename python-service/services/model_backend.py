@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+推理后端模块 - 把检测模型导出为ONNX Runtime / OpenVINO格式并在CPU上使用
+导出只进行一次，产物缓存在models目录中原始权重旁边；导出后与PyTorch输出做一致性校验，校验不通过时不使用该产物
+"""
+
+import os
+import json
+import time
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.log_client import info, error, warn
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 导出元数据格式版本，导出参数或流程变化时递增以触发重新导出
+EXPORT_VERSION = 1
+
+# INT8量化模型需要校准数据，不在服务中自动生成，由 python -m services.quantization 产出
+QUANTIZED_BACKEND = 'openvino_int8'
+
+SUPPORTED_BACKENDS = ('onnx', 'openvino', QUANTIZED_BACKEND)
+
+# 各后端导出和加载需要的依赖，声明在 requirements-backends.txt 中，服务运行时不自动安装
+BACKEND_REQUIREMENTS = {
+    'onnx': ('onnx>=1.12.0', 'onnxsim>=0.4.33', 'onnxruntime'),
+    'openvino': ('openvino>=2024.0.0',),
+    QUANTIZED_BACKEND: ('openvino>=2024.0.0',),
+}
+
+
+def get_missing_requirements(requirements) -> List[str]:
+    """
+    检查依赖是否已安装且版本满足要求，不会自动安装
+
+    Args:
+        requirements: 依赖列表，如 ('onnx>=1.12.0', 'onnxruntime')
+
+    Returns:
+        缺失或版本不满足的依赖列表
+    """
+    from doclayout_yolo.utils.checks import check_requirements
+
+    return [r for r in requirements if not check_requirements(r, install=False)]
+
+
+def check_backend_requirements(backend: str) -> bool:
+    """检查推理后端的依赖，缺失时记录需要安装的包并返回False（调用方回退到PyTorch）"""
+    from doclayout_yolo.utils import ARM64
+
+    requirements = list(BACKEND_REQUIREMENTS[backend])
+    if backend == 'onnx' and ARM64:
+        # aarch64上导出器需要cmake来构建onnxsim
+        requirements.append('cmake')
+    missing = get_missing_requirements(requirements)
+    if missing:
+        error(f"{backend}推理后端缺少依赖: {', '.join(missing)}，请运行 pip install -r requirements-backends.txt")
+        return False
+    return True
+
+
+def get_artifact_path(model_path: str, backend: str) -> str:
+    """获取导出产物路径（与Exporter的命名规则一致）"""
+    path = Path(model_path)
+    if backend == 'onnx':
+        return str(path.with_suffix('.onnx'))
+    if backend == QUANTIZED_BACKEND:
+        return str(path.parent / f"{path.stem}_int8_openvino_model")
+    return str(path.parent / f"{path.stem}_openvino_model")
+
+
+def get_meta_path(artifact_path: str) -> str:
+    """获取导出元数据文件路径"""
+    return f"{artifact_path.rstrip(os.sep)}.export.json"
+
+
+def _load_meta(artifact_path: str) -> Optional[Dict[str, Any]]:
+    meta_path = get_meta_path(artifact_path)
+    if not os.path.exists(meta_path) or not os.path.exists(artifact_path):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        warn(f"读取导出元数据失败: {e}")
+        return None
+
+
+@contextmanager
+def _export_lock(artifact_path: str):
+    """跨进程的导出锁，避免多个worker同时导出同一个模型"""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(f"{artifact_path.rstrip(os.sep)}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_parity_images(config: Dict[str, Any]) -> List[str]:
+    """获取一致性校验使用的图片，未配置时使用doclayout_yolo自带的示例图片"""
+    images = [p for p in config.get('parity_images', []) if os.path.isfile(p)]
+    if images:
+        return images
+    from doclayout_yolo.utils import ASSETS
+    return sorted(str(p) for p in Path(ASSETS).glob('*.jpg'))
+
+
+def check_parity(reference, candidate, images: List[str], imgsz: int, conf: float = 0.2,
+                 iou_threshold: float = 0.9, min_match_rate: float = 0.95) -> Dict[str, Any]:
+    """
+    比较两个模型在同一组图片上的检测结果
+
+    检测框按类别和IoU贪心匹配，匹配率 = 匹配上的框数 / 两边框数的较大值
+
+    Args:
+        reference: 参考模型（PyTorch）
+        candidate: 待校验的模型（导出后端）
+        images: 图片路径列表
+        imgsz: 推理图像大小
+        conf: 置信度阈值
+        iou_threshold: 判定为同一个框的最小IoU
+        min_match_rate: 通过校验的最小匹配率
+
+    Returns:
+        校验结果字典
+    """
+    from doclayout_yolo.utils.metrics import box_iou
+
+    matched = total = 0
+    max_conf_diff = 0.0
+    for image in images:
+        ref = reference.predict(image, imgsz=imgsz, conf=conf, verbose=False)[0].boxes.cpu()
+        cand = candidate.predict(image, imgsz=imgsz, conf=conf, verbose=False)[0].boxes.cpu()
+        total += max(len(ref), len(cand))
+        if not len(ref) or not len(cand):
+            continue
+
+        ious = box_iou(ref.xyxy, cand.xyxy)
+        ious[ref.cls[:, None] != cand.cls[None, :]] = 0
+        used = set()
+        for i in ious.max(1).values.argsort(descending=True).tolist():
+            for j in ious[i].argsort(descending=True).tolist():
+                if ious[i, j] < iou_threshold:
+                    break
+                if j not in used:
+                    used.add(j)
+                    matched += 1
+                    max_conf_diff = max(max_conf_diff, abs(float(ref.conf[i]) - float(cand.conf[j])))
+                    break
+
+    match_rate = matched / total if total else 1.0
+    return {
+        'images': len(images),
+        'boxes': total,
+        'matched': matched,
+        'match_rate': round(match_rate, 4),
+        'max_conf_diff': round(max_conf_diff, 4),
+        'passed': match_rate >= min_match_rate
+    }
+
+
+def ensure_artifact(model_path: str, backend: str, source_hash: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    确保导出产物存在且与当前权重和导出参数一致，必要时导出并做一致性校验
+
+    Args:
+        model_path: 原始.pt权重路径
+        backend: onnx 或 openvino
+        source_hash: 原始权重的内容哈希
+        config: 检测配置（get_config('detector')）
+
+    Returns:
+        导出元数据（包含产物路径和校验结果），失败时返回None
+    """
+    from doclayout_yolo import YOLOv10
+
+    artifact_path = get_artifact_path(model_path, backend)
+    expected = {
+        'version': EXPORT_VERSION,
+        'backend': backend,
+        'source_hash': source_hash,
+        'imgsz': config['warmup_imgsz'],
+        'max_det': config['export_max_det']
+    }
+
+    def is_current(meta):
+        return meta is not None and all(meta.get(k) == v for k, v in expected.items())
+
+    meta = _load_meta(artifact_path)
+    if is_current(meta):
+        return meta
+
+    with _export_lock(artifact_path):
+        meta = _load_meta(artifact_path)
+        if is_current(meta):
+            return meta
+
+        start_time = time.time()
+        info(f"正在导出{backend}模型: {artifact_path}")
+        try:
+            reference = YOLOv10(model_path)
+            reference.fuse()
+            # v10Detect在导出模式下输出一对一分支经过max_det筛选后的结果，不需要额外的后处理
+            exported = reference.export(
+                format=backend,
+                imgsz=expected['imgsz'],
+                dynamic=True,
+                simplify=backend == 'onnx',
+                max_det=expected['max_det'],
+            )
+            if not exported:
+                raise RuntimeError('导出器没有返回产物路径')
+            artifact_path = str(exported)
+
+            parity = check_parity(reference, YOLOv10(artifact_path, task='detect'),
+                                  get_parity_images(config), expected['imgsz'])
+        except Exception as e:
+            error(f"导出{backend}模型失败: {e}")
+            return None
+
+        meta = dict(expected, artifact=artifact_path, parity=parity,
+                    export_seconds=round(time.time() - start_time, 2), created_at=time.time())
+        with open(get_meta_path(artifact_path), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        info(f"{backend}模型导出完成，耗时: {meta['export_seconds']}秒，一致性校验: {parity}")
+        return meta
+
+
+def load_backend_model(model_path: str, backend: str, source_hash: str, config: Dict[str, Any]):
+    """
+    加载导出后端的模型
+
+    Args:
+        model_path: 原始.pt权重路径
+        backend: onnx、openvino 或 openvino_int8
+        source_hash: 原始权重的内容哈希
+        config: 检测配置（get_config('detector')）
+
+    Returns:
+        YOLOv10实例，导出失败或一致性校验未通过时返回None（调用方回退到PyTorch）
+    """
+    from doclayout_yolo import YOLOv10
+
+    if backend not in SUPPORTED_BACKENDS:
+        warn(f"不支持的推理后端: {backend}")
+        return None
+    if not check_backend_requirements(backend):
+        return None
+
+    if backend == QUANTIZED_BACKEND:
+        meta = _load_meta(get_artifact_path(model_path, backend))
+        if meta is None or meta.get('source_hash') != source_hash or meta.get('version') != EXPORT_VERSION:
+            warn("没有与当前权重匹配的INT8模型，请先运行 python -m services.quantization")
+            return None
+        if meta.get('imgsz') != config['warmup_imgsz']:
+            warn(f"INT8模型使用固定输入尺寸{meta.get('imgsz')}，与MODEL_WARMUP_IMGSZ={config['warmup_imgsz']}不一致")
+            return None
+    else:
+        meta = ensure_artifact(model_path, backend, source_hash, config)
+    if meta is None:
+        return None
+    if not meta['parity']['passed'] and config['parity_strict']:
+        error(f"{backend}模型与PyTorch输出不一致，不使用该后端: {meta['parity']}")
+        return None
+
+    model = YOLOv10(meta['artifact'], task='detect')
+    info(f"使用{backend}推理后端: {meta['artifact']}")
+    return model
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模型预热模块 - 在gunicorn启动阶段加载并预热检测模型，并记录就绪状态
+这个模块本身不导入torch，/health可以随时查询状态而不会触发模型加载
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from utils.log_client import info, error, warn
+from utils.environment import get_config
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 后台预热失败后的重试间隔（秒），每次失败后加倍，不超过上限
+WARMUP_RETRY_INITIAL = 5
+WARMUP_RETRY_MAX = 300
+
+# 模型加载状态: not_loaded, loading, ready, failed
+_status: Dict[str, Any] = {
+    'status': 'not_loaded',
+    'preload_mode': None,
+    'loaded_in_pid': None,
+    'load_seconds': None,
+    'warmup_imgsz': None,
+    'attempts': 0,
+    'next_retry_at': None,
+    'error': None
+}
+_status_lock = threading.Lock()
+
+
+def _set_status(**kwargs):
+    with _status_lock:
+        _status.update(kwargs)
+
+
+def warm(imgsz: Optional[int] = None) -> bool:
+    """
+    在当前进程中加载、融合并预热模型
+
+    Args:
+        imgsz: 预热推理使用的图像大小，为None时使用配置
+
+    Returns:
+        是否成功
+    """
+    imgsz = imgsz or get_config('detector')['warmup_imgsz']
+    with _status_lock:
+        _status.update(status='loading', warmup_imgsz=imgsz, next_retry_at=None, error=None)
+        _status['attempts'] += 1
+    start_time = time.time()
+    try:
+        # 延迟导入，避免在不需要模型的进程中加载torch
+        from services.detector import warm_model
+        warm_model(imgsz)
+    except Exception as e:
+        logger.error(f"模型预热失败: {e}")
+        error(f"模型预热失败: {e}")
+        _set_status(status='failed', error=str(e))
+        return False
+
+    _set_status(status='ready', loaded_in_pid=os.getpid(), load_seconds=round(time.time() - start_time, 2))
+    return True
+
+
+def _warm_with_retry(imgsz: Optional[int] = None):
+    """预热模型，失败后按指数退避重试直到成功（例如模型下载时的网络故障恢复后）"""
+    delay = WARMUP_RETRY_INITIAL
+    while not warm(imgsz):
+        _set_status(next_retry_at=time.time() + delay)
+        warn(f"模型预热失败，{delay}秒后重试")
+        time.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX)
+
+
+def warm_in_background(imgsz: Optional[int] = None) -> threading.Thread:
+    """在后台线程中预热模型，worker可以立即开始处理心跳，/health在就绪前返回warming，失败后自动重试"""
+    _set_status(status='loading')
+    thread = threading.Thread(target=_warm_with_retry, args=(imgsz,), name='model-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def on_master_start():
+    """gunicorn主进程启动时调用：master模式下在fork之前加载模型"""
+    mode = get_config('detector')['preload_mode']
+    _set_status(preload_mode=mode)
+    if mode != 'master':
+        return
+
+    import gc
+    import torch
+    if torch.cuda.is_available():
+        # CUDA上下文不能跨fork使用，退回到每个worker各自加载
+        warn("CUDA环境不支持在主进程预加载模型，改为在worker中加载")
+        os.environ['MODEL_PRELOAD_MODE'] = 'worker'
+        _set_status(preload_mode='worker')
+        return
+
+    info("在gunicorn主进程中预加载模型，worker通过写时复制共享模型内存")
+    if warm():
+        # 冻结已有对象，避免worker中的垃圾回收触碰这些页面导致写时复制
+        gc.freeze()
+
+
+def on_worker_start():
+    """gunicorn worker初始化完成后调用：worker模式下在后台预热模型"""
+    mode = get_config('detector')['preload_mode']
+    _set_status(preload_mode=mode)
+    if mode == 'worker' or (mode == 'master' and _status['status'] != 'ready'):
+        warm_in_background()
+
+
+def is_ready() -> bool:
+    """
+    worker是否可以接收请求
+
+    预热进行中或失败（等待重试）时返回False；没有启动钩子（默认不预加载）时模型在第一次使用时加载，视为就绪
+    """
+    return _status['status'] not in ('loading', 'failed')
+
+
+def get_model_status() -> Dict[str, Any]:
+    """获取模型加载状态"""
+    with _status_lock:
+        status = dict(_status)
+    status['ready'] = is_ready()
+    return status
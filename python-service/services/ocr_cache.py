@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OCR结果缓存模块 - 按图片内容和矩形几何信息缓存识别结果
+用户在编辑器中调整部分矩形后重新提交时，只有新增或改动的矩形需要发送到OCR服务
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.log_client import info, error, warn
+from utils.environment import get_config
+from utils.file_hash import get_file_hash_manager
+from utils.lru_cache import LRUCache
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 磁盘缓存数据库路径，多个gunicorn worker共享
+OCR_CACHE_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'ocr_cache.db')
+
+# 写入时最多每隔多少秒清理一次磁盘层（删除过期条目并检查容量上限）
+PRUNE_INTERVAL = 60
+
+# 超出磁盘层上限时删除到上限的90%，避免每次写入都触发清理
+EVICT_TARGET_RATIO = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_results_created_at ON ocr_results(created_at);
+"""
+
+
+class OCRResultCache:
+    """OCR结果缓存，内存LRU + 可选的SQLite磁盘层"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, db_path: str = OCR_CACHE_DB_PATH):
+        """
+        初始化OCR结果缓存
+
+        Args:
+            config: 缓存配置（get_config('cache')），为None时读取环境配置
+            db_path: 磁盘缓存数据库路径
+        """
+        config = config or get_config('cache')
+        self.ttl = config['ocr_ttl'] or None
+        self.bbox_grid = config['ocr_bbox_grid']
+        self.memory = LRUCache(max_entries=config['ocr_max_entries'], ttl=self.ttl)
+
+        self.db_path = db_path if config['ocr_disk_enabled'] else None
+        self.disk_max_rows = config['ocr_disk_max_rows']
+        self.disk_max_bytes = config['ocr_disk_max_bytes']
+        self._local = threading.local()
+        self._image_hashes = LRUCache(max_entries=256)
+        self._stats_lock = threading.Lock()
+        self._stats = {'disk_hits': 0, 'stores': 0, 'disk_expired': 0, 'disk_evictions': 0}
+        self._last_prune = 0.0
+
+        if self.db_path:
+            try:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                conn = self._connect()
+                for statement in _SCHEMA.strip().split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                self._prune()
+            except Exception as e:
+                error(f"初始化OCR磁盘缓存失败，仅使用内存缓存: {e}")
+                self.db_path = None
+
+        info(f"OCR结果缓存已启用，磁盘缓存: {'开启' if self.db_path else '关闭'}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（每个线程、每个进程一个连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _prune(self):
+        """删除磁盘层中已过期的条目，超出条目数或总大小上限时从最早写入的条目开始删除"""
+        if not self.db_path:
+            return
+        self._last_prune = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            expired = 0
+            if self.ttl:
+                expired = conn.execute('DELETE FROM ocr_results WHERE created_at < ?',
+                                       (time.time() - self.ttl,)).rowcount
+
+            rows, total = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(length(CAST(value AS BLOB))), 0) FROM ocr_results'
+            ).fetchone()
+            rows_over = rows - int(self.disk_max_rows * EVICT_TARGET_RATIO) \
+                if self.disk_max_rows and rows > self.disk_max_rows else 0
+            bytes_over = total - int(self.disk_max_bytes * EVICT_TARGET_RATIO) \
+                if self.disk_max_bytes and total > self.disk_max_bytes else 0
+
+            victims = []
+            if rows_over > 0 or bytes_over > 0:
+                freed = 0
+                cursor = conn.execute(
+                    'SELECT key, length(CAST(value AS BLOB)) FROM ocr_results ORDER BY created_at'
+                )
+                for key, size in cursor:
+                    if len(victims) >= rows_over and freed >= bytes_over:
+                        break
+                    victims.append((key,))
+                    freed += size
+                conn.executemany('DELETE FROM ocr_results WHERE key = ?', victims)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        with self._stats_lock:
+            self._stats['disk_expired'] += expired
+            self._stats['disk_evictions'] += len(victims)
+        if victims:
+            info(f"OCR磁盘缓存超出上限，删除了 {len(victims)} 个最早写入的条目")
+
+    def get_image_hash(self, image_path: str) -> Optional[str]:
+        """
+        获取图片内容哈希，按路径、大小和修改时间缓存，避免每次请求都重新读取文件
+
+        Args:
+            image_path: 图片路径
+
+        Returns:
+            内容哈希值，读取失败时返回None
+        """
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        key = (image_path, stat.st_size, stat.st_mtime)
+        file_hash = self._image_hashes.get(key)
+        if file_hash is None:
+            file_hash = get_file_hash_manager().calculate_file_hash(image_path)
+            if not file_hash:
+                return None
+            self._image_hashes.set(key, file_hash)
+        return file_hash
+
+    def make_key(self, image_hash: str, rect: Dict[str, Any]) -> str:
+        """
+        根据图片内容哈希、归一化后的矩形坐标和类别生成缓存键
+
+        Args:
+            image_hash: 图片内容哈希
+            rect: 前端格式的矩形（coords.topLeft / coords.bottomRight）
+
+        Returns:
+            缓存键
+        """
+        coords = rect.get('coords', {})
+        top_left = coords.get('topLeft', {})
+        bottom_right = coords.get('bottomRight', {})
+        grid = self.bbox_grid
+        bbox = [int(round(float(v or 0) / grid)) for v in (
+            top_left.get('x', 0), top_left.get('y', 0), bottom_right.get('x', 0), bottom_right.get('y', 0))]
+        class_name = str(rect.get('class', '')).lower()
+        raw = f"{image_hash}|{class_name}|{grid}|{','.join(map(str, bbox))}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存结果，内存未命中时查询磁盘层并回填内存"""
+        value = self.memory.get(key)
+        if value is not None or not self.db_path:
+            return value
+
+        try:
+            row = self._connect().execute(
+                'SELECT value, created_at FROM ocr_results WHERE key = ?', (key,)
+            ).fetchone()
+        except Exception as e:
+            warn(f"读取OCR磁盘缓存失败: {e}")
+            return None
+        if row is None or (self.ttl and row[1] < time.time() - self.ttl):
+            return None
+
+        value = json.loads(row[0])
+        self.memory.set(key, value)
+        with self._stats_lock:
+            self._stats['disk_hits'] += 1
+        return value
+
+    def set_many(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """批量写入缓存结果"""
+        if not items:
+            return
+        for key, value in items:
+            self.memory.set(key, value)
+        with self._stats_lock:
+            self._stats['stores'] += len(items)
+
+        if not self.db_path:
+            return
+        try:
+            now = time.time()
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO ocr_results (key, value, created_at) VALUES (?, ?, ?)',
+                    [(key, json.dumps(value, ensure_ascii=False), now) for key, value in items]
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            warn(f"写入OCR磁盘缓存失败: {e}")
+            return
+
+        if now - self._last_prune >= PRUNE_INTERVAL:
+            try:
+                self._prune()
+            except Exception as e:
+                warn(f"清理OCR磁盘缓存失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        stats = self.memory.get_stats()
+        with self._stats_lock:
+            stats.update(self._stats)
+        stats['disk_enabled'] = bool(self.db_path)
+        return stats
+
+
+# 单例模式，全局OCR结果缓存实例
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """获取OCR结果缓存实例（单例模式），缓存被禁用时返回None"""
+    global _ocr_cache
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                if not get_config('cache')['ocr_enabled']:
+                    return None
+                _ocr_cache = OCRResultCache()
+    return _ocr_cache
@@ -10,10 +10,21 @@ import logging
 import traceback
 import requests
 import os
-from typing import Dict, List, Any
+import time
+import glob
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from requests.adapters import HTTPAdapter
+from flask import current_app, has_app_context
 
 # 导入工具模块
-from utils.log_client import info, error
+from utils.log_client import info, error, warn
+from services.ocr_cache import get_ocr_cache
+from utils.environment import get_config
+from utils.file_index import get_file_index
+from services.upload_store import wait_for_upload
 
 # 日志配置
 logging.basicConfig(
@@ -35,7 +46,14 @@ def get_node_api_config():
 
     return {
         'base_url': base_url,
-        'ocr_endpoint': f"{base_url}/api/ocr/process"
+        'ocr_endpoint': f"{base_url}/api/ocr/process",
+        # 每个请求最多包含的矩形数量，超过时拆分成多个并行请求
+        'chunk_size': max(1, int(os.getenv('NODE_OCR_CHUNK_SIZE', 8))),
+        # 同时发往Node.js后端的最大请求数（所有请求共享）
+        'max_concurrency': max(1, int(os.getenv('NODE_OCR_MAX_CONCURRENCY', 4))),
+        'timeout': float(os.getenv('NODE_OCR_TIMEOUT', 30)),
+        'max_retries': max(0, int(os.getenv('NODE_OCR_MAX_RETRIES', 2))),
+        'backoff_base': float(os.getenv('NODE_OCR_BACKOFF_BASE', 0.5))
     }
 
 # 获取API配置
@@ -43,65 +61,194 @@ api_config = get_node_api_config()
 NODE_API_BASE_URL = api_config['base_url']
 NODE_OCR_ENDPOINT = api_config['ocr_endpoint']
 
+# 可以重试的HTTP状态码
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
 
-def call_node_ocr_api(image_id: str, rectangles: List[Dict[str, Any]]) -> Dict[str, Any]:
+# 连接池和并发线程池，按进程懒加载（Gunicorn fork之后重新创建）
+_client_lock = threading.Lock()
+_client_pid = None
+_session = None
+_executor = None
+
+
+def _get_client():
+    """获取复用连接的HTTP会话和分块请求线程池"""
+    global _client_pid, _session, _executor
+    if _client_pid == os.getpid():
+        return _session, _executor
+    with _client_lock:
+        if _client_pid != os.getpid():
+            concurrency = api_config['max_concurrency']
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            _session = session
+            _executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='node-ocr')
+            _client_pid = os.getpid()
+    return _session, _executor
+
+
+def _post_chunk(image_id: str, rectangles: List[Dict[str, Any]], chunk_index: int = 0) -> Dict[str, Any]:
     """
-    直接调用Node.js后端API进行OCR处理
+    发送一个矩形分块到Node.js后端，连接错误、超时和可重试的状态码会按指数退避重试
 
     Args:
         image_id: 图片ID
-        rectangles: 矩形信息列表
+        rectangles: 本分块的矩形列表
+        chunk_index: 分块序号，用于日志
 
     Returns:
-        OCR处理结果
+        该分块的OCR结果
     """
-    try:
-        # 准备请求数据
-        request_data = {
-            'image_id': image_id,
-            'rectangles': rectangles
-        }
+    session, _ = _get_client()
+    request_data = {
+        'image_id': image_id,
+        'rectangles': rectangles
+    }
+    max_retries = api_config['max_retries']
+    last_error = None
 
-        info(f"调用Node.js OCR API: {NODE_OCR_ENDPOINT}")
+    for attempt in range(max_retries + 1):
+        if attempt:
+            # 指数退避加随机抖动，避免多个分块同时重试
+            delay = api_config['backoff_base'] * (2 ** (attempt - 1))
+            time.sleep(delay + random.uniform(0, delay / 2))
+            logger.warning(f"重试Node.js OCR API分块 {chunk_index}，第 {attempt} 次")
 
-        # 发送HTTP请求到Node.js后端
-        response = requests.post(
-            NODE_OCR_ENDPOINT,
-            json=request_data,
-            timeout=30,  # 30秒超时
-            headers={'Content-Type': 'application/json'}
-        )
+        try:
+            response = session.post(NODE_OCR_ENDPOINT, json=request_data, timeout=api_config['timeout'])
+        except requests.exceptions.Timeout:
+            last_error = "Node.js OCR API调用超时"
+            continue
+        except requests.exceptions.ConnectionError:
+            last_error = "无法连接到Node.js后端服务"
+            continue
 
-        # 检查响应状态
         if response.status_code == 200:
-            result = response.json()
-            info(f"Node.js OCR API调用成功")
-            return result
+            return response.json()
+
+        last_error = f"Node.js OCR API调用失败，状态码: {response.status_code}"
+        if response.status_code not in RETRYABLE_STATUS_CODES:
+            break
+
+    return {
+        'success': False,
+        'error': last_error,
+        'image_id': image_id
+    }
+
+
+# 合并分块结果时由 _merge_chunk_results 单独处理的字段
+_CHUNK_CONTROL_KEYS = {'success', 'error', 'results', 'image_id', 'failed_rectangles'}
+
+
+def _is_duration_key(key: str) -> bool:
+    """耗时类字段（分块并行执行，合并时取最大值而不是求和）"""
+    key = key.lower()
+    return 'time' in key or 'duration' in key or key.endswith('_ms') or key.endswith('_seconds')
+
+
+def _merge_chunk_metadata(values: List[Any], key: str = '') -> Any:
+    """
+    合并各分块同名的元数据字段
+
+    数值求和（计数）或取最大值（耗时），字符串相同时保留一个、不同时保留去重后的列表（例如检测到的语言），
+    列表依次拼接，字典按字段递归合并
+    """
+    if all(isinstance(v, bool) for v in values):
+        return all(values)
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return max(values) if _is_duration_key(key) else sum(values)
+    if all(isinstance(v, list) for v in values):
+        return [item for v in values for item in v]
+    if all(isinstance(v, dict) for v in values):
+        keys = list(dict.fromkeys(k for v in values for k in v))
+        return {k: _merge_chunk_metadata([v[k] for v in values if k in v], k) for k in keys}
+    # 字符串等其他值：各分块相同时保留一个，否则保留去重后的列表
+    distinct = []
+    for v in values:
+        if v not in distinct:
+            distinct.append(v)
+    return distinct[0] if len(distinct) == 1 else distinct
+
+
+def _merge_chunk_results(image_id: str, chunks: List[List[Dict[str, Any]]],
+                         chunk_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按分块顺序合并OCR结果，各分块的其他字段（耗时、语言、计数等）按 _merge_chunk_metadata 合并"""
+    succeeded = []
+    results = []
+    errors = []
+    failed_rectangles = []
+
+    for index, (chunk, result) in enumerate(zip(chunks, chunk_results)):
+        if result.get('success', False):
+            succeeded.append(result)
+            results.extend(result.get('results', []))
         else:
-            error_msg = f"Node.js OCR API调用失败，状态码: {response.status_code}"
-            error(error_msg)
-            return {
-                'success': False,
-                'error': error_msg,
-                'image_id': image_id
-            }
+            errors.append(f"分块 {index}: {result.get('error', '未知错误')}")
+            failed_rectangles.extend(r.get('id') for r in chunk)
 
-    except requests.exceptions.Timeout:
-        error_msg = "Node.js OCR API调用超时"
-        error(error_msg)
+    if not succeeded:
         return {
             'success': False,
-            'error': error_msg,
+            'error': '; '.join(errors),
             'image_id': image_id
         }
-    except requests.exceptions.ConnectionError:
-        error_msg = "无法连接到Node.js后端服务"
-        error(error_msg)
+
+    metadata = [{k: v for k, v in result.items() if k not in _CHUNK_CONTROL_KEYS} for result in succeeded]
+    merged = _merge_chunk_metadata(metadata)
+    merged['success'] = True
+    merged['results'] = results
+    merged['image_id'] = image_id
+    merged['chunk_count'] = len(chunks)
+    if errors:
+        merged['success'] = False
+        merged['error'] = '; '.join(errors)
+        merged['failed_rectangles'] = failed_rectangles
+    return merged
+
+
+def call_node_ocr_api(image_id: str, rectangles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    直接调用Node.js后端API进行OCR处理
+
+    Args:
+        image_id: 图片ID
+        rectangles: 矩形信息列表
+
+    Returns:
+        OCR处理结果
+    """
+    if not rectangles:
+        # 没有需要识别的矩形，不请求Node.js后端
         return {
-            'success': False,
-            'error': error_msg,
+            'success': True,
+            'results': [],
             'image_id': image_id
         }
+
+    try:
+        chunk_size = api_config['chunk_size']
+        chunks = [rectangles[i:i + chunk_size] for i in range(0, len(rectangles), chunk_size)]
+
+        info(f"调用Node.js OCR API: {NODE_OCR_ENDPOINT}，{len(rectangles)} 个矩形分为 {len(chunks)} 个请求")
+
+        if len(chunks) == 1:
+            result = _post_chunk(image_id, chunks[0])
+        else:
+            # 分块并行发送，整体耗时取决于最慢的分块
+            _, executor = _get_client()
+            futures = [executor.submit(_post_chunk, image_id, chunk, index) for index, chunk in enumerate(chunks)]
+            result = _merge_chunk_results(image_id, chunks, [future.result() for future in futures])
+
+        if result.get('success', False):
+            info(f"Node.js OCR API调用成功")
+        else:
+            error(result.get('error', 'Node.js OCR API调用失败'))
+        return result
+
     except Exception as e:
         error_msg = f"调用Node.js OCR API时发生错误: {str(e)}"
         error(error_msg)
@@ -112,6 +259,94 @@ def call_node_ocr_api(image_id: str, rectangles: List[Dict[str, Any]]) -> Dict[s
         }
 
 
+def _find_original_image(image_id: str) -> Optional[str]:
+    """
+    按ID查找原始上传图片（上传文件夹顶层的 {image_id}_原文件名），用于计算OCR缓存的图片内容哈希
+
+    只读取应用配置的上传文件夹，不修改全局裁剪器的文件夹设置
+    """
+    upload_folder = (current_app.config['UPLOAD_FOLDER'] if has_app_context()
+                     else get_config('upload')['upload_folder'])
+    upload_folder = os.path.abspath(upload_folder)
+
+    file_index = get_file_index()
+    if file_index.is_ready():
+        candidates = [p for p in file_index.find(image_id, [upload_folder]) if os.path.dirname(p) == upload_folder]
+    else:
+        candidates = sorted(glob.glob(os.path.join(glob.escape(upload_folder), f"{glob.escape(image_id)}_*")))
+    for path in candidates:
+        filename = os.path.basename(path)
+        if not filename.startswith('.') and not filename.endswith('_detect.jpg') and os.path.isfile(path):
+            return path
+    return None
+
+
+def _call_with_cache(image_id: str, rectangles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    先查询OCR结果缓存，只把未命中的矩形发送到Node.js后端，再按原顺序合并结果
+
+    Args:
+        image_id: 图片ID
+        rectangles: 需要OCR的矩形列表
+
+    Returns:
+        OCR处理结果
+    """
+    cache = get_ocr_cache()
+    if cache:
+        # 原始文件仍在后台保存时先等待写入完成，否则无法计算内容哈希
+        wait_for_upload(image_id)
+    image_path = _find_original_image(image_id) if cache else None
+    image_hash = cache.get_image_hash(image_path) if image_path else None
+    if not image_hash:
+        return call_node_ocr_api(image_id, rectangles)
+
+    keys = [cache.make_key(image_hash, rect) for rect in rectangles]
+    cached = [cache.get(key) for key in keys]
+    misses = [index for index, value in enumerate(cached) if value is None]
+    info(f"OCR缓存命中 {len(rectangles) - len(misses)}/{len(rectangles)} 个矩形")
+
+    fresh: Dict[int, Dict[str, Any]] = {}
+    result: Dict[str, Any] = {'success': True, 'image_id': image_id}
+    if misses:
+        missed_rectangles = [rectangles[index] for index in misses]
+        result = call_node_ocr_api(image_id, missed_rectangles)
+        fresh_results = result.get('results', []) or []
+
+        # 结果优先按矩形id对应，没有id时在数量一致的情况下按顺序对应
+        by_id = {str(r.get('id')): r for r in fresh_results if isinstance(r, dict) and r.get('id') is not None}
+        for position, index in enumerate(misses):
+            rect_id = rectangles[index].get('id')
+            if rect_id is not None and str(rect_id) in by_id:
+                fresh[index] = by_id[str(rect_id)]
+            elif not by_id and result.get('success', False) and len(fresh_results) == len(misses):
+                fresh[index] = fresh_results[position]
+
+        if len(fresh) < len(fresh_results):
+            # 无法把结果对应回矩形，不缓存；也无法与命中缓存的结果按矩形顺序合并，本次绕过缓存全部交给Node.js处理
+            warn("OCR结果无法与矩形一一对应，本次结果不写入缓存")
+            if len(misses) < len(rectangles):
+                result = call_node_ocr_api(image_id, rectangles)
+            result['cache_hits'] = 0
+            return result
+
+        cache.set_many([(keys[index], value) for index, value in fresh.items()])
+
+    results = []
+    for index, rect in enumerate(rectangles):
+        value = fresh.get(index) if cached[index] is None else cached[index]
+        if value is None:
+            continue
+        if rect.get('id') is not None and isinstance(value, dict) and 'id' in value:
+            # 缓存的结果可能来自id不同的同一矩形
+            value = dict(value, id=rect.get('id'))
+        results.append(value)
+
+    result['results'] = results
+    result['cache_hits'] = len(rectangles) - len(misses)
+    return result
+
+
 def process_ocr_request(image_id: str, rectangles: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     处理OCR请求的入口函数 - 重构版本，确保稳定性
@@ -159,8 +394,8 @@ def process_ocr_request(image_id: str, rectangles: List[Dict[str, Any]]) -> Dict
 
         info(f"过滤后需要OCR的矩形数量: {len(text_rectangles)}")
 
-        # 直接调用Node.js后端API进行OCR处理
-        result = call_node_ocr_api(image_id, text_rectangles)
+        # 调用Node.js后端API进行OCR处理，已缓存的矩形不再重复识别
+        result = _call_with_cache(image_id, text_rectangles)
 
         # 确保返回结果包含所有必要字段
         if result.get('success', False):
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+预测器池模块 - 为多线程部署提供可并发的文档检测推理
+模型自带的 predict() 只复用一个预测器并在推理期间加锁，线程化的gunicorn worker中所有检测请求因此串行执行；
+预测器池创建多个共享同一份融合权重的预测器，请求借出一个空闲的预测器推理后归还，CPU线程数在预测器之间平分
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from utils.log_client import info
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+# 单例模式，每个进程一个预测器池
+_predictor_pool = None
+_predictor_pool_lock = threading.Lock()
+
+def get_predictor_pool(model, device, size: int, threads: int = 0):
+    """
+    获取预测器池实例（单例模式）
+
+    Args:
+        model: 已加载（并融合）的YOLOv10模型
+        device: 推理设备
+        size: 预测器数量，即同时进行的推理数
+        threads: 预测器池共用的CPU线程总数，0表示使用PyTorch默认值
+
+    Returns:
+        PredictorPool实例，接口与 model.predict() 相同
+    """
+    global _predictor_pool
+    with _predictor_pool_lock:
+        if _predictor_pool is None:
+            start_time = time.time()
+            _predictor_pool = model.predictor_pool(size=size, threads=threads, device=device)
+            info(f"预测器池已创建，预测器数量: {_predictor_pool.size}，每个预测器线程数: {_predictor_pool.threads}，"
+                 f"耗时: {time.time() - start_time:.2f}秒")
+    return _predictor_pool
+
+def get_predictor_pool_stats() -> Optional[Dict[str, Any]]:
+    """获取预测器池统计信息（借出次数、等待次数和等待时间），预测器池尚未创建时返回None"""
+    if _predictor_pool is None:
+        return None
+    return _predictor_pool.get_stats()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模型量化模块 - 对文档版面模型做INT8训练后量化（OpenVINO + NNCF）并验证精度损失
+用我们自己的文档页面做校准，在DocLayNet/D4LA验证集上对比每个类别的mAP，并测量CPU延迟
+量化结果写在models目录中原始权重旁边，校验通过后可以通过 DETECT_BACKEND=openvino_int8 使用
+
+用法:
+    python -m services.quantization --data doclayout_yolo/cfg/datasets/doclaynet.yaml --calib /path/to/pages
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+from utils.log_client import info, error, warn
+from utils.environment import get_config
+from utils.file_hash import get_file_hash_manager
+from services.model_backend import (EXPORT_VERSION, QUANTIZED_BACKEND, BACKEND_REQUIREMENTS, get_meta_path,
+                                    get_missing_requirements)
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 量化需要的依赖，声明在 requirements-backends.txt 中，不自动安装
+QUANTIZE_REQUIREMENTS = BACKEND_REQUIREMENTS[QUANTIZED_BACKEND] + ('nncf>=2.8.0',)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models',
+                                  'doclayout_yolo_docstructbench_imgsz1024.pt')
+
+
+def collect_calibration_pages(sources: List[str], work_dir: str, limit: int = 300,
+                              seed: int = 0, dpi: int = 150) -> List[str]:
+    """
+    从图片、PDF或目录中随机抽取校准页面，PDF逐页栅格化为图片
+
+    Args:
+        sources: 图片/PDF文件或目录列表（目录会递归查找）
+        work_dir: 栅格化后的页面保存目录
+        limit: 最多抽取的页面数
+        seed: 随机种子，保证多次量化使用同一批页面
+        dpi: PDF栅格化分辨率
+
+    Returns:
+        校准图片路径列表
+    """
+    from doclayout_yolo.data.utils import IMG_FORMATS, PDF_FORMATS
+    from doclayout_yolo.data.loaders import LoadPdf
+
+    files = []
+    for source in sources:
+        path = Path(source)
+        candidates = path.rglob('*') if path.is_dir() else [path]
+        files.extend(p for p in candidates if p.suffix[1:].lower() in IMG_FORMATS | PDF_FORMATS)
+    files = sorted(set(files))
+
+    # 先展开为(文件, 页码)列表再抽样，避免页数多的PDF挤占所有名额
+    pages = []
+    for file in files:
+        if file.suffix[1:].lower() in PDF_FORMATS:
+            try:
+                pages.extend((file, i) for i in range(len(LoadPdf(file, dpi=dpi).pages)))
+            except Exception as e:
+                warn(f"读取PDF失败，跳过: {file}: {e}")
+        else:
+            pages.append((file, None))
+
+    random.Random(seed).shuffle(pages)
+    pages = pages[:limit]
+
+    images = []
+    by_pdf = {}
+    for file, index in pages:
+        if index is None:
+            images.append(str(file))
+        else:
+            by_pdf.setdefault(file, []).append(index)
+    for file, indexes in by_pdf.items():
+        loader = LoadPdf(file, dpi=dpi, pages=sorted(indexes))
+        for paths, imgs, _ in loader:
+            for page_path, im in zip(paths, imgs):
+                page = page_path.rsplit('=', 1)[-1]
+                out = os.path.join(work_dir, f"{file.stem}_p{page}.jpg")
+                cv2.imwrite(out, im)
+                images.append(out)
+    return images
+
+
+def _write_dataset_yaml(images: List[str], names: Dict[int, str], work_dir: str) -> str:
+    """把校准图片写成数据集描述文件，供Exporter的INT8路径读取"""
+    from doclayout_yolo.utils import yaml_save
+
+    list_path = os.path.join(work_dir, 'calib.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(os.path.abspath(p) for p in images))
+    yaml_path = os.path.join(work_dir, 'calib.yaml')
+    yaml_save(yaml_path, {'path': work_dir, 'train': list_path, 'val': list_path, 'names': names})
+    return yaml_path
+
+
+def evaluate(model_path: str, data: str, imgsz: int) -> Dict[str, Any]:
+    """
+    在验证集上评估模型
+
+    Returns:
+        总体 map50/map 以及每个类别的 map50/map
+    """
+    from doclayout_yolo import YOLOv10
+
+    metrics = YOLOv10(model_path, task='detect').val(
+        data=data, imgsz=imgsz, batch=1, conf=0.001, plots=False, save_json=False, verbose=False
+    )
+    per_class = {}
+    for i, c in enumerate(metrics.ap_class_index):
+        _, _, ap50, ap = metrics.class_result(i)
+        per_class[metrics.names[int(c)]] = {'map50': float(ap50), 'map': float(ap)}
+    return {'map50': float(metrics.box.map50), 'map': float(metrics.box.map), 'per_class': per_class}
+
+
+def compare_accuracy(reference: Dict[str, Any], candidate: Dict[str, Any],
+                     max_map_drop: float, max_class_drop: float) -> Dict[str, Any]:
+    """
+    对比两次评估结果，计算总体和每个类别的mAP变化
+
+    Args:
+        reference: FP32模型的评估结果
+        candidate: INT8模型的评估结果
+        max_map_drop: 允许的总体mAP50-95最大下降（绝对值）
+        max_class_drop: 允许的单个类别mAP50-95最大下降（绝对值）
+
+    Returns:
+        对比结果，passed表示精度损失在允许范围内
+    """
+    per_class = {}
+    for name, ref in reference['per_class'].items():
+        cand = candidate['per_class'].get(name, {'map50': 0.0, 'map': 0.0})
+        per_class[name] = {
+            'map50_fp32': round(ref['map50'], 4),
+            'map50_int8': round(cand['map50'], 4),
+            'map_fp32': round(ref['map'], 4),
+            'map_int8': round(cand['map'], 4),
+            'map_delta': round(cand['map'] - ref['map'], 4)
+        }
+    map_delta = candidate['map'] - reference['map']
+    worst = min(per_class.items(), key=lambda kv: kv[1]['map_delta'], default=(None, {'map_delta': 0.0}))
+    return {
+        'map50_delta': round(candidate['map50'] - reference['map50'], 4),
+        'map_delta': round(map_delta, 4),
+        'worst_class': worst[0],
+        'worst_class_delta': worst[1]['map_delta'],
+        'per_class': per_class,
+        'passed': map_delta >= -max_map_drop and worst[1]['map_delta'] >= -max_class_drop
+    }
+
+
+def measure_latency(model_path: str, images: List[str], imgsz: int, threads: int = 0,
+                    warmup: int = 3) -> Dict[str, Any]:
+    """
+    测量单张图片的端到端延迟（加载后的预处理 + 推理 + 后处理）
+
+    Returns:
+        平均/中位数/P95延迟（毫秒）、平均推理时间和每秒处理的页面数
+    """
+    from doclayout_yolo import YOLOv10
+
+    model = YOLOv10(model_path, task='detect')
+    frames = [cv2.imread(p) for p in images]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return {}
+
+    kwargs = {'imgsz': imgsz, 'verbose': False, 'threads': threads}
+    for frame in frames[:warmup]:
+        model.predict(frame, **kwargs)
+
+    totals, inference = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model.predict(frame, **kwargs)[0]
+        totals.append((time.perf_counter() - start) * 1000)
+        inference.append(result.speed['inference'])
+    totals = np.array(totals)
+    return {
+        'images': len(frames),
+        'mean_ms': round(float(totals.mean()), 2),
+        'p50_ms': round(float(np.percentile(totals, 50)), 2),
+        'p95_ms': round(float(np.percentile(totals, 95)), 2),
+        'inference_ms': round(float(np.mean(inference)), 2),
+        'pages_per_second': round(1000 / float(totals.mean()), 2)
+    }
+
+
+def quantize(model_path: str, data: str, calib_sources: List[str], imgsz: int, calib_size: int = 300,
+             max_map_drop: float = 0.01, max_class_drop: float = 0.02, latency_images: int = 20,
+             seed: int = 0, dpi: int = 150) -> Dict[str, Any]:
+    """
+    量化模型并生成报告
+
+    Args:
+        model_path: 原始.pt权重路径
+        data: 精度评估使用的数据集描述文件（如doclaynet.yaml、d4la.yaml）
+        calib_sources: 校准页面来源，为空时使用评估数据集的验证集
+        imgsz: 推理图像大小（INT8模型使用固定输入尺寸）
+        calib_size: 校准页面数量
+        max_map_drop: 允许的总体mAP50-95最大下降
+        max_class_drop: 允许的单个类别mAP50-95最大下降
+        latency_images: 测量延迟使用的页面数量
+        seed: 抽样随机种子
+        dpi: PDF栅格化分辨率
+
+    Returns:
+        量化报告（同时写入产物旁边的 .export.json）
+    """
+    from doclayout_yolo import YOLOv10
+
+    missing = get_missing_requirements(QUANTIZE_REQUIREMENTS)
+    if missing:
+        raise ImportError(f"INT8量化缺少依赖: {', '.join(missing)}，请运行 pip install -r requirements-backends.txt")
+
+    detector_config = get_config('detector')
+    source_hash = get_file_hash_manager().calculate_file_hash(model_path) or os.path.basename(model_path)
+
+    with tempfile.TemporaryDirectory(prefix='calib_') as work_dir:
+        model = YOLOv10(model_path)
+        calib_data = data
+        calib_images = []
+        if calib_sources:
+            calib_images = collect_calibration_pages(calib_sources, work_dir, calib_size, seed, dpi)
+            if not calib_images:
+                raise ValueError(f"没有找到可用的校准页面: {calib_sources}")
+            calib_data = _write_dataset_yaml(calib_images, model.names, work_dir)
+        info(f"开始INT8量化: {model_path}，校准页面: {len(calib_images) or '验证集'}")
+
+        start_time = time.time()
+        model.fuse()
+        # 使用固定输入尺寸：OpenVINO对静态形状的INT8模型优化更充分，AutoBackend按单张图片推理
+        artifact = model.export(format='openvino', int8=True, data=calib_data, imgsz=imgsz,
+                                dynamic=False, max_det=detector_config['export_max_det'])
+        if not artifact:
+            raise RuntimeError('INT8导出失败')
+        artifact = str(artifact).rstrip(os.sep)
+        quantize_seconds = round(time.time() - start_time, 2)
+
+        info("正在评估FP32和INT8模型的精度...")
+        accuracy = compare_accuracy(evaluate(model_path, data, imgsz), evaluate(artifact, data, imgsz),
+                                    max_map_drop, max_class_drop)
+
+        latency_pages = calib_images[:latency_images]
+        if not latency_pages:
+            from services.model_backend import get_parity_images
+            latency_pages = get_parity_images(detector_config)
+        threads = detector_config['intra_op_threads']
+        latency = {
+            'fp32': measure_latency(model_path, latency_pages, imgsz, threads),
+            'int8': measure_latency(artifact, latency_pages, imgsz, threads)
+        }
+        if latency['fp32'] and latency['int8']:
+            latency['speedup'] = round(latency['fp32']['mean_ms'] / latency['int8']['mean_ms'], 2)
+
+    # 与model_backend的导出元数据格式一致，parity.passed决定服务是否使用该模型
+    meta = {
+        'version': EXPORT_VERSION,
+        'backend': QUANTIZED_BACKEND,
+        'source_hash': source_hash,
+        'imgsz': imgsz,
+        'max_det': detector_config['export_max_det'],
+        'artifact': artifact,
+        'parity': {'passed': accuracy['passed'], 'map_delta': accuracy['map_delta'],
+                   'worst_class': accuracy['worst_class'], 'worst_class_delta': accuracy['worst_class_delta']},
+        'accuracy': accuracy,
+        'latency': latency,
+        'calibration': {'pages': len(calib_images) or None, 'sources': calib_sources, 'seed': seed},
+        'data': data,
+        'export_seconds': quantize_seconds,
+        'created_at': time.time()
+    }
+    with open(get_meta_path(artifact), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def _print_report(meta: Dict[str, Any]):
+    accuracy, latency = meta['accuracy'], meta['latency']
+    print(f"\nINT8模型: {meta['artifact']}")
+    print(f"{'类别':<20}{'mAP50-95 FP32':>15}{'INT8':>10}{'变化':>10}")
+    for name, row in sorted(accuracy['per_class'].items(), key=lambda kv: kv[1]['map_delta']):
+        print(f"{name:<20}{row['map_fp32']:>15.4f}{row['map_int8']:>10.4f}{row['map_delta']:>+10.4f}")
+    print(f"{'全部':<20}{'':>15}{'':>10}{accuracy['map_delta']:>+10.4f}  (mAP50 {accuracy['map50_delta']:+.4f})")
+    for name in ('fp32', 'int8'):
+        if latency.get(name):
+            row = latency[name]
+            print(f"{name.upper()} 延迟: 平均 {row['mean_ms']}ms，P95 {row['p95_ms']}ms，{row['pages_per_second']} 页/秒")
+    if 'speedup' in latency:
+        print(f"加速比: {latency['speedup']}x")
+    print("精度校验: " + ("通过" if accuracy['passed'] else "未通过，服务不会使用该模型"))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='DocLayout-YOLO INT8训练后量化')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help='原始.pt权重路径')
+    parser.add_argument('--data', required=True, help='精度评估数据集描述文件，如doclaynet.yaml、d4la.yaml')
+    parser.add_argument('--calib', nargs='*', default=[], help='校准页面（图片/PDF/目录），默认使用评估数据集的验证集')
+    parser.add_argument('--calib-size', type=int, default=300, help='校准页面数量')
+    parser.add_argument('--imgsz', type=int, default=get_config('detector')['warmup_imgsz'], help='推理图像大小')
+    parser.add_argument('--max-map-drop', type=float, default=0.01, help='允许的总体mAP50-95最大下降')
+    parser.add_argument('--max-class-drop', type=float, default=0.02, help='允许的单个类别mAP50-95最大下降')
+    parser.add_argument('--latency-images', type=int, default=20, help='测量延迟使用的页面数量')
+    parser.add_argument('--seed', type=int, default=0, help='校准页面抽样随机种子')
+    parser.add_argument('--dpi', type=int, default=150, help='PDF栅格化分辨率')
+    args = parser.parse_args(argv)
+
+    try:
+        meta = quantize(args.model, args.data, args.calib, args.imgsz, args.calib_size, args.max_map_drop,
+                        args.max_class_drop, args.latency_images, args.seed, args.dpi)
+    except Exception as e:
+        error(f"INT8量化失败: {e}")
+        print(f"INT8量化失败: {e}")
+        return 2
+
+    _print_report(meta)
+    return 0 if meta['accuracy']['passed'] else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    sys.exit(main())
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+存储清理模块 - 在后台按TTL和容量上限清理上传、临时、裁剪和下载文件夹
+硬链接按inode统计，只有所有链接都被删除时才计入回收的空间；删除时同步更新哈希数据库和文件索引
+文件的年龄按最近一次使用计算：去重时新的引用硬链接到旧文件，修改时间不变，因此同时参考inode的ctime和哈希数据库中的引用时间
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.log_client import info, error, warn
+from utils.environment import get_config
+from utils.file_hash import get_file_hash_manager
+from utils.file_index import get_file_index
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 跨进程锁文件，多个gunicorn worker中同一时间只有一个在清理
+LOCK_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'storage_janitor.lock')
+
+# 启动后等待多久开始第一次清理，避开模型加载和预热
+START_DELAY = 60
+
+# 超出容量上限时删除到上限的90%，避免每次清理都刚好卡在上限附近
+EVICT_TARGET_RATIO = 0.9
+
+
+@contextmanager
+def _try_lock(path: str):
+    """非阻塞地获取跨进程锁，返回是否获取成功"""
+    try:
+        import fcntl
+    except ImportError:
+        yield True
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class StorageJanitor:
+    """存储清理器，定期删除过期文件并把各文件夹控制在容量上限以内"""
+
+    def __init__(self, folders: Dict[str, str], config: Optional[Dict[str, Any]] = None):
+        """
+        初始化存储清理器
+
+        Args:
+            folders: 文件夹名称（uploads、temp、crops、downloads）到路径的映射
+            config: 清理配置（get_config('cleanup')），为None时读取环境配置
+        """
+        config = config or get_config('cleanup')
+        self.interval = config['interval']
+        self.batch_size = config['batch_size']
+        self.batch_pause = config['batch_pause_ms'] / 1000.0
+        self.min_age = config['min_age']
+
+        # 同一路径只由一个名称管理（例如temp和results指向同一目录）
+        self.folders: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        seen = set()
+        for name, path in folders.items():
+            policy = config['folders'].get(name)
+            if not path or policy is None or os.path.abspath(path) in seen:
+                continue
+            seen.add(os.path.abspath(path))
+            self.folders[name] = (path, policy)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'runs': 0,
+            'skipped_runs': 0,
+            'files_removed': 0,
+            'bytes_reclaimed': 0,
+            'hash_refs_released': 0,
+            'errors': 0,
+            'last_run_at': None,
+            'last_duration': None,
+            'folders': {name: {'files': 0, 'usage_bytes': 0, 'files_removed': 0, 'bytes_reclaimed': 0}
+                        for name in self.folders}
+        }
+
+    def _scan(self, root: str) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """
+        扫描文件夹（递归），按inode分组
+
+        Returns:
+            (st_dev, st_ino) 到 {'paths', 'size', 'last_used', 'nlink'} 的映射；
+            last_used 取修改时间和ctime中较晚的一个（新建硬链接会更新inode的ctime）
+        """
+        groups = {}
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            try:
+                items = list(os.scandir(current))
+            except OSError as e:
+                warn(f"扫描文件夹失败: {current}, {e}")
+                continue
+            for item in items:
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        stack.append(item.path)
+                        continue
+                    if not item.is_file(follow_symlinks=False):
+                        continue
+                    stat = item.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                group = groups.setdefault((stat.st_dev, stat.st_ino), {
+                    'paths': [], 'size': stat.st_size, 'last_used': max(stat.st_mtime, stat.st_ctime),
+                    'nlink': stat.st_nlink
+                })
+                group['paths'].append(item.path)
+        return groups
+
+    def _apply_references(self, groups: Dict[Tuple[int, int], Dict[str, Any]], now: float):
+        """
+        按哈希数据库中的引用时间更新 last_used：同一内容最近被引用（例如去重时新建的裁剪图片引用）时不删除
+
+        比min_age还新的文件本来就不会被删除，不查询数据库
+        """
+        candidates = [group for group in groups.values() if now - group['last_used'] >= self.min_age]
+        if not candidates:
+            return
+        referenced = get_file_hash_manager().get_last_referenced(
+            [path for group in candidates for path in group['paths']])
+        for group in candidates:
+            for path in group['paths']:
+                if path in referenced:
+                    group['last_used'] = max(group['last_used'], referenced[path])
+
+    def _select(self, groups: Dict[Tuple[int, int], Dict[str, Any]], policy: Dict[str, Any],
+                now: float) -> Tuple[List[str], int]:
+        """
+        选出需要删除的文件
+
+        过期的文件全部删除；超出容量上限时从最久未使用的开始删除。年龄按inode的 last_used 计算，
+        一个inode的任何路径比TTL或min_age新时，所有路径都不会被删除。
+        硬链接到文件夹之外的inode删除后不会释放空间，不计入容量，也不为了容量而删除
+
+        Returns:
+            (要删除的路径列表, 清理前的占用字节数)
+        """
+        ttl, max_bytes = policy['ttl'], policy['max_bytes']
+        selected, remaining = [], []
+        usage = current = 0
+        for group in groups.values():
+            owned = len(group['paths']) >= group['nlink']
+            age = now - group['last_used']
+            expired = ttl > 0 and age > ttl and age >= self.min_age
+            if owned:
+                usage += group['size']
+                if not expired:
+                    current += group['size']
+            if expired:
+                selected.extend(group['paths'])
+            elif owned and age >= self.min_age:
+                remaining.append(group)
+
+        if max_bytes > 0 and current > max_bytes:
+            target = max_bytes * EVICT_TARGET_RATIO
+            for group in sorted(remaining, key=lambda g: g['last_used']):
+                if current <= target:
+                    break
+                selected.extend(group['paths'])
+                current -= group['size']
+        return selected, usage
+
+    def _remove_batch(self, paths: List[str]) -> Tuple[int, int, int]:
+        """
+        删除一批文件，并从哈希数据库和文件索引中移除
+
+        Returns:
+            (删除的文件数, 回收的字节数, 释放的哈希引用数)
+        """
+        manager = get_file_hash_manager()
+        removed, reclaimed, released = [], 0, 0
+        with manager.batch():
+            for path in paths:
+                try:
+                    stat = os.lstat(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    warn(f"删除文件失败: {path}, {e}")
+                    with self._lock:
+                        self._stats['errors'] += 1
+                    continue
+                else:
+                    # 最后一个链接被删除时空间才真正释放
+                    if stat.st_nlink <= 1:
+                        reclaimed += stat.st_size
+                removed.append(path)
+                if manager.get_path_hash(path):
+                    manager.remove_file(path)
+                    released += 1
+        get_file_index().remove_many(removed)
+        return len(removed), reclaimed, released
+
+    def _remove_empty_dirs(self, root: str, now: float):
+        """删除已空的子目录（例如 crops/<image_id>/），文件夹本身保留"""
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            if dirpath == root or dirnames or filenames:
+                continue
+            try:
+                if now - os.stat(dirpath).st_mtime >= self.min_age:
+                    os.rmdir(dirpath)
+            except OSError:
+                pass
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """
+        执行一次清理
+
+        Returns:
+            本次清理的统计信息，其他进程正在清理时返回None
+        """
+        with _try_lock(LOCK_PATH) as acquired:
+            if not acquired:
+                with self._lock:
+                    self._stats['skipped_runs'] += 1
+                return None
+
+            start_time = time.time()
+            summary = {}
+            for name, (root, policy) in self.folders.items():
+                if self._stop_event.is_set():
+                    break
+                if not os.path.isdir(root):
+                    continue
+
+                groups = self._scan(root)
+                now = time.time()
+                self._apply_references(groups, now)
+                selected, usage = self._select(groups, policy, now)
+                files_removed, bytes_reclaimed = 0, 0
+                for i in range(0, len(selected), self.batch_size):
+                    try:
+                        removed, reclaimed, released = self._remove_batch(selected[i:i + self.batch_size])
+                    except Exception as e:
+                        error(f"清理文件夹失败: {root}, {e}")
+                        with self._lock:
+                            self._stats['errors'] += 1
+                        break
+                    files_removed += removed
+                    bytes_reclaimed += reclaimed
+                    with self._lock:
+                        self._stats['files_removed'] += removed
+                        self._stats['bytes_reclaimed'] += reclaimed
+                        self._stats['hash_refs_released'] += released
+                    # 批次之间让出磁盘IO和哈希数据库写锁
+                    if self._stop_event.wait(self.batch_pause):
+                        break
+                self._remove_empty_dirs(root, time.time())
+
+                folder_stats = {
+                    'files': sum(len(group['paths']) for group in groups.values()) - files_removed,
+                    'usage_bytes': usage - bytes_reclaimed
+                }
+                summary[name] = dict(folder_stats, files_removed=files_removed, bytes_reclaimed=bytes_reclaimed)
+                with self._lock:
+                    totals = self._stats['folders'][name]
+                    totals.update(folder_stats)
+                    totals['files_removed'] += files_removed
+                    totals['bytes_reclaimed'] += bytes_reclaimed
+
+            duration = time.time() - start_time
+            with self._lock:
+                self._stats['runs'] += 1
+                self._stats['last_run_at'] = start_time
+                self._stats['last_duration'] = round(duration, 3)
+
+        removed = sum(s['files_removed'] for s in summary.values())
+        if removed:
+            info(f"存储清理完成，删除 {removed} 个文件，回收 {sum(s['bytes_reclaimed'] for s in summary.values())} 字节，"
+                 f"耗时: {duration:.2f}秒", metadata={'folders': summary})
+        return summary
+
+    def _run(self):
+        if self._stop_event.wait(min(START_DELAY, self.interval)):
+            return
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"存储清理失败: {e}")
+                error(f"存储清理失败: {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+            if self._stop_event.wait(self.interval):
+                return
+
+    def start(self) -> threading.Thread:
+        """启动后台清理线程"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='storage-janitor', daemon=True)
+            self._thread.start()
+            info(f"存储清理已启动，间隔: {self.interval}秒，文件夹: {list(self.folders)}")
+        return self._thread
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台清理线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取清理统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['folders'] = {name: dict(folder) for name, folder in self._stats['folders'].items()}
+        stats['interval'] = self.interval
+        return stats
+
+
+# 单例模式，每个进程一个后台清理器
+_storage_janitor = None
+_storage_janitor_lock = threading.Lock()
+
+def start_storage_janitor(folders: Dict[str, str]) -> Optional[StorageJanitor]:
+    """
+    启动后台存储清理（单例模式），清理被禁用时返回None
+
+    Args:
+        folders: 文件夹名称（uploads、temp、crops、downloads）到路径的映射
+    """
+    global _storage_janitor
+    config = get_config('cleanup')
+    if not config['enabled']:
+        info("存储清理未启用")
+        return None
+    with _storage_janitor_lock:
+        if _storage_janitor is None:
+            _storage_janitor = StorageJanitor(folders, config)
+        _storage_janitor.start()
+    return _storage_janitor
+
+def get_storage_janitor_stats() -> Optional[Dict[str, Any]]:
+    """获取存储清理统计信息，清理器尚未启动时返回None"""
+    if _storage_janitor is None:
+        return None
+    return _storage_janitor.get_stats()
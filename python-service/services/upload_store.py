@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上传文件保存模块 - 保存原始上传文件，后台保存时记录每个图片ID的保存任务
+上传接口在后台写入完成之前就返回图片ID，之后按ID读取原始文件的请求（原图、标注图像、OCR缓存）
+先通过 wait_for_upload 等待该ID的写入完成。
+后台保存在返回之前同步创建隐藏的临时文件 .{文件名}.part 作为写入标记，写完后原子替换为正式文件；
+同一进程内等待保存任务，其他gunicorn worker看不到保存任务，轮询磁盘上的写入标记直到它消失
+"""
+
+import os
+import glob
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Dict, Optional
+
+from flask import current_app, has_app_context
+
+from utils.log_client import info, error, warn
+from utils.environment import get_config
+from utils.file_index import get_file_index
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 读取方等待后台保存完成的最长时间（秒）；写入标记比这更旧时视为写入进程已退出，不再等待
+PERSIST_WAIT_TIMEOUT = 30
+
+# 其他进程中的后台保存：轮询写入标记的间隔（秒）
+PERSIST_POLL_INTERVAL = 0.05
+
+# 后台保存原始上传文件的线程池，避免磁盘写入占用请求延迟
+_persist_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upload-persist')
+
+# 图片ID到尚未完成的后台保存任务
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+
+def _get_tmp_path(filepath: str) -> str:
+    """获取上传文件的临时文件路径，也是后台保存的写入标记"""
+    return os.path.join(os.path.dirname(filepath), f".{os.path.basename(filepath)}.part")
+
+
+def persist_upload(filepath: str, data: bytes):
+    """将上传的原始文件内容写入磁盘"""
+    try:
+        # 先写入隐藏的临时文件再原子替换，避免按ID查找时读到写了一半的文件
+        tmp_path = _get_tmp_path(filepath)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+        get_file_index().add(filepath, os.path.dirname(filepath))
+        info(f"文件已保存到: {filepath}")
+    except Exception as e:
+        error(f"保存文件时出错: {e}")
+        raise
+
+
+def persist_upload_async(image_id: str, filepath: str, data: bytes) -> Future:
+    """
+    在后台线程中保存上传文件，并登记为该图片ID的待完成任务
+
+    Args:
+        image_id: 图片ID
+        filepath: 保存路径
+        data: 文件内容
+
+    Returns:
+        保存任务，完成（或失败）后从登记中移除
+    """
+    # 同步创建写入标记（空的临时文件），返回响应后其他worker中的读取方就能看到该ID正在写入
+    tmp_path = _get_tmp_path(filepath)
+    open(tmp_path, 'wb').close()
+
+    def _persist():
+        try:
+            persist_upload(filepath, data)
+        finally:
+            # 写入失败时删除标记，读取方不再等待
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    key = image_id.lower()
+    with _pending_lock:
+        future = _persist_executor.submit(_persist)
+        _pending[key] = future
+
+    def _done(_):
+        with _pending_lock:
+            if _pending.get(key) is future:
+                del _pending[key]
+
+    future.add_done_callback(_done)
+    return future
+
+
+def _find_pending_markers(image_id: str, upload_folder: str):
+    """查找上传文件夹中该ID未过期的写入标记"""
+    now = time.time()
+    markers = []
+    for path in glob.glob(os.path.join(glob.escape(upload_folder), f".{glob.escape(image_id)}_*.part")):
+        try:
+            if now - os.path.getmtime(path) < PERSIST_WAIT_TIMEOUT:
+                markers.append(path)
+        except OSError:
+            continue
+    return markers
+
+
+def wait_for_upload(image_id: Optional[str], timeout: float = PERSIST_WAIT_TIMEOUT,
+                    upload_folder: Optional[str] = None) -> bool:
+    """
+    等待图片ID对应的后台保存完成
+
+    当前进程中的保存任务直接等待其结果；其他进程（gunicorn worker）中的保存通过轮询磁盘上的写入标记等待
+
+    Args:
+        image_id: 图片ID，为None时直接返回
+        timeout: 最长等待时间（秒）
+        upload_folder: 上传文件夹，为None时使用应用配置
+
+    Returns:
+        没有待完成的保存或保存成功时返回True，保存失败或超时返回False
+    """
+    if not image_id:
+        return True
+    with _pending_lock:
+        future = _pending.get(image_id.lower())
+    if future is not None:
+        try:
+            future.result(timeout=timeout)
+            return True
+        except FuturesTimeoutError:
+            warn(f"等待上传文件保存超时: {image_id}")
+        except Exception as e:
+            warn(f"上传文件保存失败: {image_id}, {e}")
+        return False
+
+    if upload_folder is None:
+        upload_folder = (current_app.config['UPLOAD_FOLDER'] if has_app_context()
+                         else get_config('upload')['upload_folder'])
+    deadline = time.time() + timeout
+    while _find_pending_markers(image_id, upload_folder):
+        if time.time() >= deadline:
+            warn(f"等待其他进程保存上传文件超时: {image_id}")
+            return False
+        time.sleep(PERSIST_POLL_INTERVAL)
+    return True
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模型权重存储模块 - 把融合后的模型权重保存为可直接内存映射的平铺文件
+多个gunicorn worker映射同一个文件，权重页面由操作系统页缓存共享，不再各自反序列化一份完整的权重
+"""
+
+import os
+import json
+import mmap
+import time
+import logging
+from typing import Any, Dict, Optional
+
+import torch
+from torch import nn
+
+from utils.log_client import info, error, warn
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 存储格式版本，格式变化时旧文件自动重建
+STORE_VERSION = 1
+
+# 每个张量在文件中的起始偏移按64字节对齐
+ALIGNMENT = 64
+
+_DTYPES = {
+    'float32': torch.float32,
+    'float16': torch.float16,
+    'float64': torch.float64,
+    'int64': torch.int64,
+    'int32': torch.int32,
+    'uint8': torch.uint8,
+    'bool': torch.bool,
+}
+
+
+def get_store_paths(model_path: str, store_dir: Optional[str] = None):
+    """获取权重存储的数据文件和索引文件路径"""
+    store_dir = store_dir or os.path.dirname(os.path.abspath(model_path))
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    prefix = os.path.join(store_dir, f"{stem}.fused")
+    return f"{prefix}.bin", f"{prefix}.json"
+
+
+def export_store(model_path: str, source_hash: str, store_dir: Optional[str] = None) -> bool:
+    """
+    加载.pt权重、融合Conv+BN，并写入平铺的权重文件和索引
+
+    Args:
+        model_path: 原始.pt权重路径
+        source_hash: 原始权重的内容哈希，用于判断存储是否过期
+        store_dir: 存储目录，默认与权重文件相同
+
+    Returns:
+        是否成功
+    """
+    from doclayout_yolo.nn.tasks import attempt_load_one_weight
+
+    bin_path, index_path = get_store_paths(model_path, store_dir)
+    start_time = time.time()
+    try:
+        model, _ = attempt_load_one_weight(model_path)
+        model = model.fuse(verbose=False).eval()
+
+        tensors = []
+        offset = 0
+        tmp_bin = f"{bin_path}.{os.getpid()}.part"
+        with open(tmp_bin, 'wb') as f:
+            for name, tensor in model.state_dict().items():
+                tensor = tensor.detach().cpu().contiguous()
+                data = tensor.numpy().tobytes()
+                padding = (-offset) % ALIGNMENT
+                f.write(b'\0' * padding)
+                offset += padding
+                tensors.append({
+                    'name': name,
+                    'dtype': str(tensor.dtype).replace('torch.', ''),
+                    'shape': list(tensor.shape),
+                    'offset': offset,
+                    'nbytes': len(data)
+                })
+                f.write(data)
+                offset += len(data)
+
+        index = {
+            'version': STORE_VERSION,
+            'source_hash': source_hash,
+            'source_path': os.path.basename(model_path),
+            'total_bytes': offset,
+            'task': model.task,
+            'yaml': model.yaml,
+            'names': model.names,
+            'args': model.args,
+            'stride': model.stride.tolist(),
+            'tensors': tensors
+        }
+        tmp_index = f"{index_path}.{os.getpid()}.part"
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump(index, f, default=str)
+
+        # 先替换数据文件再替换索引，索引存在即表示数据完整
+        os.replace(tmp_bin, bin_path)
+        os.replace(tmp_index, index_path)
+        info(f"已导出可内存映射的融合权重: {bin_path}，{offset / 1024 / 1024:.1f}MB，耗时: {time.time() - start_time:.2f}秒")
+        return True
+    except Exception as e:
+        error(f"导出融合权重失败: {e}")
+        return False
+
+
+def _load_index(index_path: str, source_hash: str) -> Optional[Dict[str, Any]]:
+    """读取索引，版本或源权重不匹配时返回None"""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except Exception as e:
+        warn(f"读取权重索引失败: {e}")
+        return None
+    if index.get('version') != STORE_VERSION or index.get('source_hash') != source_hash:
+        return None
+    return index
+
+
+def _set_tensor(model: nn.Module, name: str, tensor: torch.Tensor):
+    """把模型中的参数或缓冲区替换为给定张量（不复制数据）"""
+    module_name, _, leaf = name.rpartition('.')
+    module = model.get_submodule(module_name) if module_name else model
+    if leaf in module._parameters:
+        module._parameters[leaf] = nn.Parameter(tensor, requires_grad=False)
+    elif leaf in module._buffers:
+        module._buffers[leaf] = tensor
+    else:
+        raise KeyError(name)
+
+
+def load_store(model_path: str, source_hash: str, store_dir: Optional[str] = None) -> Optional[nn.Module]:
+    """
+    从权重存储构建融合后的模型，所有参数都直接指向内存映射的文件
+
+    Args:
+        model_path: 原始.pt权重路径
+        source_hash: 原始权重的内容哈希
+        store_dir: 存储目录
+
+    Returns:
+        融合后的模型，存储不存在或不匹配时返回None
+    """
+    from doclayout_yolo.nn.tasks import YOLOv10DetectionModel
+
+    bin_path, index_path = get_store_paths(model_path, store_dir)
+    index = _load_index(index_path, source_hash)
+    if index is None or not os.path.exists(bin_path):
+        return None
+
+    start_time = time.time()
+    try:
+        # 按检查点中的结构定义构建骨架并融合，使参数名称和形状与存储一致
+        model = YOLOv10DetectionModel(cfg=index['yaml'], verbose=False).fuse(verbose=False).eval()
+        expected = {name: tuple(t.shape) for name, t in model.state_dict().items()}
+        stored = {t['name']: tuple(t['shape']) for t in index['tensors']}
+        if expected != stored:
+            warn("权重存储与模型结构不一致，将重新导出")
+            return None
+
+        with open(bin_path, 'rb') as f:
+            # ACCESS_COPY 是私有映射：只读访问时所有进程共享同一份页缓存，写入不会影响文件
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        for entry in index['tensors']:
+            dtype = _DTYPES[entry['dtype']]
+            count = int(torch.Size(entry['shape']).numel())
+            if count == 0:
+                tensor = torch.empty(entry['shape'], dtype=dtype)
+            else:
+                tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=entry['offset']).view(entry['shape'])
+            _set_tensor(model, entry['name'], tensor)
+
+        model.names = {int(k): v for k, v in index['names'].items()}
+        model.args = index['args']
+        model.task = index['task']
+        model.pt_path = model_path
+        model.stride = torch.tensor(index['stride'])
+        for m in model.modules():
+            if hasattr(m, "inplace"):
+                m.inplace = True
+
+        info(f"已从内存映射加载融合权重: {bin_path}，耗时: {time.time() - start_time:.2f}秒")
+        return model
+    except Exception as e:
+        error(f"从权重存储加载模型失败: {e}")
+        return None
+
+
+def load_shared_model(model_path: str, source_hash: str, store_dir: Optional[str] = None):
+    """
+    加载使用内存映射权重的YOLOv10模型，存储不存在或过期时先导出
+
+    Args:
+        model_path: 原始.pt权重路径
+        source_hash: 原始权重的内容哈希
+        store_dir: 存储目录
+
+    Returns:
+        YOLOv10实例，失败时返回None（调用方应回退到普通加载）
+    """
+    from doclayout_yolo import YOLOv10
+
+    module = load_store(model_path, source_hash, store_dir)
+    if module is None:
+        if not export_store(model_path, source_hash, store_dir):
+            return None
+        module = load_store(model_path, source_hash, store_dir)
+        if module is None:
+            return None
+    return YOLOv10(module)
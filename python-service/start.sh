@@ -145,7 +145,9 @@ else
 
     # 添加安全相关的Gunicorn选项
     ${GUNICORN_PATH} \
+        --config gunicorn.conf.py \
         -w ${WORKERS} \
+        --threads ${THREADS:-4} \
         -b ${FLASK_HOST}:${FLASK_PORT} \
         --log-level ${LOG_LEVEL} \
         --access-logfile "$LOG_DIR/gunicorn_access.log" \
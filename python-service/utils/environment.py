@@ -241,7 +241,17 @@ class EnvironmentDetector:
             'level': os.getenv('LOG_LEVEL', level),
             'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             'api_endpoint': os.getenv('LOG_API_ENDPOINT', ''),
-            'enable_api_logging': bool(os.getenv('LOG_API_ENDPOINT'))
+            'enable_api_logging': bool(os.getenv('LOG_API_ENDPOINT')),
+            # 后台日志发送配置
+            'queue_size': int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+            'batch_size': int(os.getenv('LOG_BATCH_SIZE', 100)),
+            'flush_interval_ms': float(os.getenv('LOG_FLUSH_INTERVAL_MS', 1000)),
+            'timeout': float(os.getenv('LOG_API_TIMEOUT', 5)),
+            # 批量格式: single(在同一连接上逐条POST，与原有收集服务兼容，默认), array(一次POST一个日志数组，需要收集服务支持)
+            'batch_format': os.getenv('LOG_BATCH_FORMAT', 'single').lower(),
+            # 队列已满或收集服务不可用时: drop(丢弃), spill(写入本地文件)
+            'overflow_policy': os.getenv('LOG_OVERFLOW_POLICY', 'drop').lower(),
+            'spill_path': os.getenv('LOG_SPILL_PATH', './logs/log_spill.jsonl')
         }
 
     def get_api_config(self) -> Dict[str, Any]:
@@ -259,7 +269,124 @@ class EnvironmentDetector:
             'upload_folder': os.getenv('UPLOAD_FOLDER', './uploads'),
             'results_folder': os.getenv('RESULTS_FOLDER', './temp'),
             'allowed_extensions': os.getenv('ALLOWED_EXTENSIONS', 'jpg,jpeg,png,gif,webp,heic,pdf').split(','),
-            'max_file_size': int(os.getenv('MAX_CONTENT_LENGTH', 25000000))
+            'max_file_size': int(os.getenv('MAX_CONTENT_LENGTH', 25000000)),
+            # 原始上传文件的保存方式: background(后台写入，默认), sync(同步写入), none(不保存)
+            # background时按ID读取的请求会等待写入完成：同一进程内等待写入任务，其他gunicorn worker轮询磁盘上的写入标记
+            'persist_mode': os.getenv('UPLOAD_PERSIST_MODE', 'background').lower(),
+            # 裁剪图片并行编码/写入的线程数，设为1时串行处理
+            'crop_workers': int(os.getenv('CROP_WORKERS', min(4, os.cpu_count() or 1)))
+        }
+
+    def get_detector_config(self) -> Dict[str, Any]:
+        """获取文档检测配置"""
+        return {
+            'batching_enabled': os.getenv('DETECT_BATCHING_ENABLED', 'true').lower() == 'true',
+            'max_batch_size': int(os.getenv('DETECT_MAX_BATCH_SIZE', 8)),
+            'max_wait_ms': float(os.getenv('DETECT_MAX_WAIT_MS', 10)),
+            # 模型预加载方式: none(第一次使用时加载，默认), worker(每个worker启动后在后台加载), master(在gunicorn主进程加载，fork后写时复制共享)
+            # 上传（检测）路由目前未注册，默认不预加载，避免每个worker都加载用不到的模型
+            'preload_mode': os.getenv('MODEL_PRELOAD_MODE', 'none').lower(),
+            # 预热推理使用的图像大小，应与请求中的imgsz一致
+            'warmup_imgsz': int(os.getenv('MODEL_WARMUP_IMGSZ', 1024)),
+            # 使用内存映射的融合权重，多个worker共享同一份权重内存
+            'weight_mmap': os.getenv('MODEL_WEIGHT_MMAP', 'false').lower() == 'true',
+            # 融合权重存储目录，为空时与.pt文件放在一起（可设为/dev/shm使用共享内存）
+            'weight_store_dir': os.getenv('MODEL_WEIGHT_STORE_DIR', '') or None,
+            # 推理后端: pytorch, onnx(ONNX Runtime), openvino；非pytorch后端在第一次加载时导出一次并缓存在models目录
+            # openvino_int8 使用 python -m services.quantization 生成并通过精度校验的INT8模型
+            'backend': os.getenv('DETECT_BACKEND', 'pytorch').lower(),
+            # 推理线程数，0表示使用后端默认值
+            'intra_op_threads': int(os.getenv('DETECT_INTRA_OP_THREADS', 0)),
+            'inter_op_threads': int(os.getenv('DETECT_INTER_OP_THREADS', 0)),
+            # 预测器池大小：大于1时创建多个共享权重的预测器，多个请求线程同时推理，CPU线程数（intra_op_threads）在预测器之间平分
+            # 启用预测器池时不使用动态批处理（DETECT_BATCHING_ENABLED）
+            'pool_size': int(os.getenv('DETECT_POOL_SIZE', 1)),
+            # 多批次输入（PDF、图片目录）提前解码和letterbox的批次数及线程数，0表示不预取
+            'prefetch_batches': int(os.getenv('DETECT_PREFETCH_BATCHES', 2)),
+            'prefetch_workers': int(os.getenv('DETECT_PREFETCH_WORKERS', 2)),
+            # 融合预处理：直接缩放到预分配的缓冲区，一次完成通道转换、转置和归一化；GPU上可使用锁页内存
+            'fused_preprocess': os.getenv('DETECT_FUSED_PREPROCESS', 'true').lower() == 'true',
+            'pinned_input': os.getenv('DETECT_PINNED_INPUT', 'false').lower() == 'true',
+            # 按宽高比分组的矩形批处理（批量检测不同尺寸的页面时减少填充）
+            'rect_batching': os.getenv('DETECT_RECT_BATCHING', 'true').lower() == 'true',
+            # 分块检测：长边超过tile_size像素的图像按重叠窗口分块推理，0表示不分块；tile_batch为每次前向推理的分块数
+            'tile_size': int(os.getenv('DETECT_TILE_SIZE', 0)),
+            'tile_overlap': int(os.getenv('DETECT_TILE_OVERLAP', 256)),
+            'tile_batch': int(os.getenv('DETECT_TILE_BATCH', 8)),
+            # 导出模型的最大检测框数量
+            'export_max_det': int(os.getenv('DETECT_EXPORT_MAX_DET', 300)),
+            # 导出后与PyTorch对比的校验图片（逗号分隔的路径），为空时使用自带的示例图片
+            'parity_images': [p.strip() for p in os.getenv('DETECT_PARITY_IMAGES', '').split(',') if p.strip()],
+            # 校验不通过时是否回退到PyTorch
+            'parity_strict': os.getenv('DETECT_PARITY_STRICT', 'true').lower() == 'true',
+            # 标注图像生成方式: lazy(第一次请求/temp/{id}_detect.jpg时生成), eager(检测时生成)
+            'annotate_mode': os.getenv('DETECT_ANNOTATE_MODE', 'lazy').lower(),
+            # 标注绘制方式: cv2(不加载字体，速度快), pil(与Results.plot(pil=True)样式一致)
+            'annotate_renderer': os.getenv('DETECT_ANNOTATE_RENDERER', 'cv2').lower(),
+            'annotate_quality': int(os.getenv('DETECT_ANNOTATE_QUALITY', 75))
+        }
+
+    def get_cache_config(self) -> Dict[str, Any]:
+        """获取结果缓存配置"""
+        return {
+            # OCR结果缓存：按图片内容哈希 + 矩形坐标 + 类别缓存识别结果
+            'ocr_enabled': os.getenv('OCR_CACHE_ENABLED', 'true').lower() == 'true',
+            'ocr_max_entries': int(os.getenv('OCR_CACHE_MAX_ENTRIES', 20000)),
+            'ocr_ttl': float(os.getenv('OCR_CACHE_TTL', 7 * 24 * 3600)),
+            'ocr_disk_enabled': os.getenv('OCR_CACHE_DISK_ENABLED', 'true').lower() == 'true',
+            # 磁盘层的条目数和总大小上限，超出时删除最早写入的条目，0表示不限制
+            'ocr_disk_max_rows': int(os.getenv('OCR_CACHE_DISK_MAX_ROWS', 200000)),
+            'ocr_disk_max_bytes': int(os.getenv('OCR_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024)),
+            # 坐标归一化的网格大小（像素），在此范围内的微小拖动视为同一矩形
+            'ocr_bbox_grid': max(1, int(os.getenv('OCR_CACHE_BBOX_GRID', 1))),
+            # 检测结果缓存：按上传内容哈希 + imgsz + conf + 模型版本缓存检测结果和标注图像
+            'detect_enabled': os.getenv('DETECT_CACHE_ENABLED', 'true').lower() == 'true',
+            'detect_max_entries': int(os.getenv('DETECT_CACHE_MAX_ENTRIES', 500)),
+            'detect_memory_max_bytes': int(os.getenv('DETECT_CACHE_MEMORY_MAX_BYTES', 128 * 1024 * 1024)),
+            'detect_disk_enabled': os.getenv('DETECT_CACHE_DISK_ENABLED', 'true').lower() == 'true',
+            'detect_disk_max_bytes': int(os.getenv('DETECT_CACHE_DISK_MAX_BYTES', 1024 * 1024 * 1024)),
+            # 图片代理派生图片缓存：按源图片内容哈希 + 宽高 + 格式 + 质量缓存缩放/转换后的图片
+            'image_enabled': os.getenv('IMAGE_CACHE_ENABLED', 'true').lower() == 'true',
+            'image_max_entries': int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', 2000)),
+            'image_memory_max_bytes': int(os.getenv('IMAGE_CACHE_MEMORY_MAX_BYTES', 64 * 1024 * 1024)),
+            'image_disk_enabled': os.getenv('IMAGE_CACHE_DISK_ENABLED', 'true').lower() == 'true',
+            'image_disk_max_bytes': int(os.getenv('IMAGE_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024)),
+            'image_quality': int(os.getenv('IMAGE_CACHE_QUALITY', 85)),
+            # 图片响应的浏览器缓存时间（秒），配合ETag做条件请求
+            'image_max_age': int(os.getenv('IMAGE_CACHE_MAX_AGE', 86400))
+        }
+
+    def get_cleanup_config(self) -> Dict[str, Any]:
+        """获取存储清理配置（TTL单位为秒，容量单位为字节，0表示不限制）"""
+        day = 24 * 3600
+        gb = 1024 * 1024 * 1024
+        return {
+            'enabled': self.should_enable_file_cleanup(),
+            # 两次清理之间的间隔
+            'interval': float(os.getenv('CLEANUP_INTERVAL', 600)),
+            # 每批删除的文件数，批次之间暂停，避免长时间占用磁盘IO和哈希数据库写锁
+            'batch_size': max(1, int(os.getenv('CLEANUP_BATCH_SIZE', 200))),
+            'batch_pause_ms': float(os.getenv('CLEANUP_BATCH_PAUSE_MS', 50)),
+            # 宽限期，比这更新的文件不会被删除（可能仍在处理中）
+            'min_age': float(os.getenv('CLEANUP_MIN_AGE', 600)),
+            'folders': {
+                'uploads': {
+                    'ttl': float(os.getenv('CLEANUP_UPLOADS_TTL', 3 * day)),
+                    'max_bytes': int(os.getenv('CLEANUP_UPLOADS_MAX_BYTES', 2 * gb))
+                },
+                'temp': {
+                    'ttl': float(os.getenv('CLEANUP_TEMP_TTL', day)),
+                    'max_bytes': int(os.getenv('CLEANUP_TEMP_MAX_BYTES', gb))
+                },
+                'crops': {
+                    'ttl': float(os.getenv('CLEANUP_CROPS_TTL', 3 * day)),
+                    'max_bytes': int(os.getenv('CLEANUP_CROPS_MAX_BYTES', 2 * gb))
+                },
+                'downloads': {
+                    'ttl': float(os.getenv('CLEANUP_DOWNLOADS_TTL', day)),
+                    'max_bytes': int(os.getenv('CLEANUP_DOWNLOADS_MAX_BYTES', gb))
+                }
+            }
         }
 
 
@@ -307,7 +434,7 @@ def get_config(config_type: str) -> Dict[str, Any]:
     """获取指定类型的配置
 
     Args:
-        config_type: 配置类型 ('flask', 'cors', 'log', 'api', 'upload')
+        config_type: 配置类型 ('flask', 'cors', 'log', 'api', 'upload', 'detector', 'cache', 'cleanup')
 
     Returns:
         配置字典
@@ -317,7 +444,10 @@ def get_config(config_type: str) -> Dict[str, Any]:
         'cors': environment.get_cors_config,
         'log': environment.get_log_config,
         'api': environment.get_api_config,
-        'upload': environment.get_upload_config
+        'upload': environment.get_upload_config,
+        'detector': environment.get_detector_config,
+        'cache': environment.get_cache_config,
+        'cleanup': environment.get_cleanup_config
     }
 
     if config_type not in config_methods:
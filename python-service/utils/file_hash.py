@@ -7,16 +7,23 @@
 """
 
 import os
+import time
 import hashlib
 import json
 import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Optional, Tuple, List, Union
+from typing import BinaryIO, Dict, Optional, Tuple, List, Union
 
 from utils.log_client import info, error, warn
 
-# 哈希数据库文件路径
-HASH_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'file_hashes.json')
+# 哈希数据库文件路径（SQLite，WAL模式，支持多进程并发访问）
+HASH_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'file_hashes.db')
+
+# 旧版JSON哈希数据库路径，首次打开SQLite数据库时会自动导入
+LEGACY_HASH_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'file_hashes.json')
 
 # 确保数据目录存在
 try:
@@ -24,45 +31,239 @@ try:
 except Exception as e:
     error(f"创建数据目录失败: {e}")
     # 使用备用路径
-    HASH_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'temp', 'file_hashes.json')
+    HASH_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'temp', 'file_hashes.db')
     os.makedirs(os.path.dirname(HASH_DB_PATH), exist_ok=True)
 
+# 内容哈希算法，可选 md5（默认，兼容已有记录）、xxhash、blake3、blake2b
+# 非md5算法的哈希值带有算法前缀（如 "xxh3:..."），切换算法后不会与旧记录混淆
+HASH_ALGORITHM = os.getenv('FILE_HASH_ALGORITHM', 'md5').lower()
+
+def _resolve_hash_algorithm(name: str):
+    """根据名称返回 (算法标识, 哈希对象构造函数)，可选依赖缺失时回退到md5"""
+    if name in ('xxhash', 'xxh3'):
+        try:
+            import xxhash
+            return 'xxh3', xxhash.xxh3_128
+        except ImportError:
+            warn("未安装xxhash，文件哈希回退到md5")
+    elif name == 'blake3':
+        try:
+            from blake3 import blake3
+            return 'blake3', blake3
+        except ImportError:
+            warn("未安装blake3，文件哈希回退到md5")
+    elif name == 'blake2b':
+        return 'blake2b', lambda: hashlib.blake2b(digest_size=16)
+    elif name != 'md5':
+        warn(f"不支持的文件哈希算法: {name}，回退到md5")
+    return 'md5', hashlib.md5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    hash TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS file_paths (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_file_paths_hash ON file_paths(hash);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class ContentHashMismatch(ValueError):
+    """读取到的文件内容与期望的哈希值不一致"""
+
+
+class _VerifyingReader:
+    """边读取边计算哈希，读到文件末尾时与期望的哈希值比较，不一致时抛出 ContentHashMismatch"""
+
+    def __init__(self, f: BinaryIO, hasher, expected_hash: str, format_digest):
+        self._f = f
+        self._hasher = hasher
+        self._expected_hash = expected_hash
+        self._format_digest = format_digest
+        self._verified = False
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        if data:
+            self._hasher.update(data)
+        elif not self._verified:
+            self._verified = True
+            actual_hash = self._format_digest(self._hasher)
+            if actual_hash != self._expected_hash:
+                raise ContentHashMismatch(f"文件内容与期望的哈希值不一致: {self._f.name}，"
+                                          f"期望 {self._expected_hash}，实际 {actual_hash}")
+        return data
+
+    def fileno(self) -> int:
+        return self._f.fileno()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 class FileHashManager:
     """文件哈希管理器，处理文件哈希计算、检查和引用"""
 
-    def __init__(self):
-        """初始化文件哈希管理器"""
-        self.hash_db = self._load_hash_db()
+    def __init__(self, db_path: Union[str, Path] = HASH_DB_PATH):
+        """
+        初始化文件哈希管理器
 
-    def _load_hash_db(self) -> Dict:
-        """加载哈希数据库"""
-        if os.path.exists(HASH_DB_PATH):
-            try:
-                with open(HASH_DB_PATH, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                error(f"加载哈希数据库失败: {e}")
-                return {"files": {}}
+        Args:
+            db_path: SQLite哈希数据库路径
+        """
+        self.db_path = str(db_path)
+        self.hash_name, self._hasher = _resolve_hash_algorithm(HASH_ALGORITHM)
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（每个线程、每个进程一个连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def batch(self):
+        """
+        在一个写事务中执行多次操作
+
+        同一线程中可以嵌套使用，只有最外层会提交。BEGIN IMMEDIATE 会获取跨进程的写锁，
+        其他gunicorn worker会在busy_timeout内等待，而不是互相覆盖
+        """
+        conn = self._connect()
+        if self._local.depth == 0:
+            conn.execute('BEGIN IMMEDIATE')
+        self._local.depth += 1
+        try:
+            yield conn
+        except Exception:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute('ROLLBACK')
+            raise
         else:
-            return {"files": {}}
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute('COMMIT')
+
+    def _init_db(self):
+        """创建表结构，并在需要时导入旧版JSON数据库"""
+        with self.batch() as conn:
+            for statement in _SCHEMA.strip().split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+
+            imported = conn.execute("SELECT value FROM meta WHERE key = 'legacy_json_imported'").fetchone()
+            if imported is None:
+                self._import_legacy_json(conn)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                             (str(time.time()),))
+
+    def _import_legacy_json(self, conn: sqlite3.Connection):
+        """导入旧版 file_hashes.json 中的记录"""
+        if not os.path.exists(LEGACY_HASH_DB_PATH):
+            return
 
-    def _save_hash_db(self):
-        """保存哈希数据库"""
         try:
-            with open(HASH_DB_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.hash_db, f, ensure_ascii=False, indent=2)
+            with open(LEGACY_HASH_DB_PATH, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
         except Exception as e:
-            error(f"保存哈希数据库失败: {e}")
+            error(f"加载旧版哈希数据库失败: {e}")
+            return
+
+        count = 0
+        for file_hash, entry in legacy.get("files", {}).items():
+            created_at = entry.get("created_at") or time.time()
+            for path in entry.get("paths", []):
+                self._register(conn, path, file_hash, entry.get("category", "unknown"), created_at)
+                count += 1
+        info(f"已从旧版JSON哈希数据库导入 {count} 条文件记录")
+
+    def _register(self, conn: sqlite3.Connection, path: str, file_hash: str, category: str,
+                  created_at: float) -> bool:
+        """
+        在事务中登记一个路径，返回该哈希是否为新内容
+        """
+        row = conn.execute('SELECT hash FROM file_paths WHERE path = ?', (path,)).fetchone()
+        if row is not None:
+            if row[0] == file_hash:
+                return False
+            # 同一路径的内容已变化，先释放旧内容的引用
+            self._unregister(conn, path, row[0])
+
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO files (hash, category, created_at, ref_count) VALUES (?, ?, ?, 0)',
+            (file_hash, category, created_at)
+        )
+        is_new = cursor.rowcount == 1
+        conn.execute('INSERT INTO file_paths (path, hash, added_at) VALUES (?, ?, ?)',
+                     (path, file_hash, time.time()))
+        conn.execute('UPDATE files SET ref_count = ref_count + 1 WHERE hash = ?', (file_hash,))
+        return is_new
+
+    def _unregister(self, conn: sqlite3.Connection, path: str, file_hash: str) -> int:
+        """
+        在事务中移除一个路径的引用，返回剩余引用数
+        """
+        conn.execute('DELETE FROM file_paths WHERE path = ?', (path,))
+        conn.execute('UPDATE files SET ref_count = ref_count - 1 WHERE hash = ?', (file_hash,))
+        row = conn.execute('SELECT ref_count FROM files WHERE hash = ?', (file_hash,)).fetchone()
+        remaining = row[0] if row else 0
+        if remaining <= 0:
+            conn.execute('DELETE FROM files WHERE hash = ?', (file_hash,))
+            remaining = 0
+        return remaining
+
+    def _format_digest(self, hasher) -> str:
+        """格式化哈希值，md5保持无前缀以兼容已有记录"""
+        digest = hasher.hexdigest()
+        return digest if self.hash_name == 'md5' else f"{self.hash_name}:{digest}"
+
+    def calculate_bytes_hash(self, data: bytes) -> str:
+        """
+        计算内存中数据的哈希值，无需先写入磁盘
+
+        Args:
+            data: 文件内容（如编码后的图片字节）
+
+        Returns:
+            str: 内容哈希值
+        """
+        hasher = self._hasher()
+        hasher.update(data)
+        return self._format_digest(hasher)
 
     def calculate_file_hash(self, file_path: Union[str, Path]) -> str:
         """
-        计算文件的MD5哈希值
+        计算文件的哈希值
 
         Args:
             file_path: 文件路径
 
         Returns:
-            str: 文件的MD5哈希值
+            str: 文件的哈希值
         """
         file_path = Path(file_path)
         if not file_path.exists():
@@ -70,23 +271,90 @@ class FileHashManager:
             return ""
 
         try:
-            md5_hash = hashlib.md5()
             with open(file_path, "rb") as f:
-                # 读取文件块并更新哈希
-                for chunk in iter(lambda: f.read(4096), b""):
-                    md5_hash.update(chunk)
-            return md5_hash.hexdigest()
+                return self.calculate_stream_hash(f)
         except Exception as e:
             error(f"计算文件哈希值失败: {e}")
             return ""
 
-    def add_file(self, file_path: Union[str, Path], category: str) -> Tuple[str, bool]:
+    def calculate_stream_hash(self, f: BinaryIO) -> str:
+        """
+        从已打开文件的当前位置读取到末尾并计算哈希值
+
+        Args:
+            f: 以二进制模式打开的文件对象
+
+        Returns:
+            str: 内容哈希值
+        """
+        hasher = self._hasher()
+        # 读取文件块并更新哈希
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+        return self._format_digest(hasher)
+
+    def open_verified(self, file_path: Union[str, Path], expected_hash: str) -> BinaryIO:
+        """
+        以二进制模式打开文件，读取过程中计算哈希，不需要预先读一遍文件
+
+        Args:
+            file_path: 文件路径
+            expected_hash: 期望的内容哈希值
+
+        Returns:
+            类文件对象，读到末尾时内容哈希与expected_hash不一致则抛出 ContentHashMismatch
+        """
+        return _VerifyingReader(open(file_path, 'rb'), self._hasher(), expected_hash, self._format_digest)
+
+    def get_path_hash(self, file_path: Union[str, Path]) -> Optional[str]:
+        """
+        获取数据库中登记的某个路径的哈希值（不读取文件）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            Optional[str]: 已登记的哈希值，未登记时返回None
+        """
+        row = self._connect().execute(
+            'SELECT hash FROM file_paths WHERE path = ?', (str(Path(file_path)),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_last_referenced(self, paths: List[Union[str, Path]]) -> Dict[str, float]:
+        """
+        批量获取路径上的内容最近一次被引用的时间，即同一哈希下所有登记路径中最新的 added_at
+
+        去重时新的引用会硬链接到已有的文件，文件本身的修改时间不会变化，需要按这个时间判断内容是否仍在使用
+
+        Args:
+            paths: 文件路径列表
+
+        Returns:
+            Dict[str, float]: 路径（与传入的形式一致）到时间戳的映射，未登记的路径不在结果中
+        """
+        by_key = {str(Path(path)): str(path) for path in paths}
+        keys = list(by_key)
+        result = {}
+        conn = self._connect()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                'SELECT p.path, MAX(q.added_at) FROM file_paths p JOIN file_paths q ON q.hash = p.hash '
+                f'WHERE p.path IN ({",".join("?" * len(chunk))}) GROUP BY p.path', chunk
+            ).fetchall()
+            result.update((by_key[path], added_at) for path, added_at in rows)
+        return result
+
+    def add_file(self, file_path: Union[str, Path], category: str,
+                 file_hash: Optional[str] = None) -> Tuple[str, bool]:
         """
         添加文件到哈希数据库
 
         Args:
             file_path: 文件路径
             category: 文件类别 (original, detect, crop, zip)
+            file_hash: 已知的内容哈希值，提供时不再重新读取文件
 
         Returns:
             Tuple[str, bool]: (文件哈希值, 是否为新文件)
@@ -97,29 +365,114 @@ class FileHashManager:
             return "", False
 
         # 计算文件哈希值
-        file_hash = self.calculate_file_hash(file_path)
+        file_hash = file_hash or self.calculate_file_hash(file_path)
         if not file_hash:
             return "", False
 
-        # 检查是否已存在相同哈希的文件
-        is_new = True
-        if file_hash in self.hash_db["files"]:
-            # 文件已存在，添加新的引用路径
-            if str(file_path) not in self.hash_db["files"][file_hash]["paths"]:
-                self.hash_db["files"][file_hash]["paths"].append(str(file_path))
-            is_new = False
-        else:
-            # 添加新文件
-            self.hash_db["files"][file_hash] = {
-                "category": category,
-                "paths": [str(file_path)],
-                "created_at": os.path.getmtime(file_path)
-            }
-
-        # 保存哈希数据库
-        self._save_hash_db()
+        try:
+            with self.batch() as conn:
+                is_new = self._register(conn, str(file_path), file_hash, category, os.path.getmtime(file_path))
+        except Exception as e:
+            error(f"保存哈希记录失败: {e}")
+            return "", False
         return file_hash, is_new
 
+    def add_files(self, files: List[Tuple[Union[str, Path], str]]) -> List[Tuple[str, bool]]:
+        """
+        批量添加文件到哈希数据库（单个事务）
+
+        Args:
+            files: (文件路径, 文件类别) 列表
+
+        Returns:
+            List[Tuple[str, bool]]: 与输入顺序一致的 (文件哈希值, 是否为新文件) 列表
+        """
+        with self.batch():
+            return [self.add_file(file_path, category) for file_path, category in files]
+
+    def store_bytes(self, data: bytes, target_path: Union[str, Path], category: str,
+                    file_hash: Optional[str] = None, reuse_existing: bool = True) -> Tuple[str, str, bool]:
+        """
+        保存内存中的内容（先哈希后落盘，每份内容最多写入一次）
+
+        Args:
+            data: 文件内容
+            target_path: 目标文件路径
+            category: 文件类别
+            file_hash: 已知的内容哈希值，未提供时在内存中计算
+            reuse_existing: 为True时，若已有相同内容的文件则直接返回该文件路径；
+                为False时目标路径一定会存在，优先用硬链接指向已有文件
+
+        Returns:
+            Tuple[str, str, bool]: (文件路径, 文件哈希值, 是否写入了新内容)
+        """
+        target_path = Path(target_path)
+        file_hash = file_hash or self.calculate_bytes_hash(data)
+
+        # 目标路径已登记为相同内容，无需任何操作
+        if target_path.exists() and self.get_path_hash(target_path) == file_hash:
+            return str(target_path), file_hash, False
+
+        existing = self.get_file_by_hash(file_hash)
+        if existing and reuse_existing:
+            return existing, file_hash, False
+
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        if target_path.exists():
+            target_path.unlink()
+
+        written = True
+        if existing:
+            try:
+                os.link(existing, target_path)
+                written = False
+            except OSError:
+                pass
+
+        if written:
+            # 先写入临时文件再原子替换，避免其他进程读到不完整的文件
+            tmp_path = target_path.with_name(f".{target_path.name}.part")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, target_path)
+
+        self.add_file(target_path, category, file_hash=file_hash)
+        return str(target_path), file_hash, written
+
+    def remove_file(self, file_path: Union[str, Path]) -> int:
+        """
+        从哈希数据库中移除一个路径的引用
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            int: 该内容剩余的引用数，路径不在数据库中时返回0
+        """
+        path = str(Path(file_path))
+        try:
+            with self.batch() as conn:
+                row = conn.execute('SELECT hash FROM file_paths WHERE path = ?', (path,)).fetchone()
+                if row is None:
+                    return 0
+                return self._unregister(conn, path, row[0])
+        except Exception as e:
+            error(f"移除哈希记录失败: {e}")
+            return 0
+
+    def get_ref_count(self, file_hash: str) -> int:
+        """
+        获取某个内容哈希的引用数
+
+        Args:
+            file_hash: 文件哈希值
+
+        Returns:
+            int: 引用该内容的路径数量
+        """
+        row = self._connect().execute('SELECT ref_count FROM files WHERE hash = ?', (file_hash,)).fetchone()
+        return row[0] if row else 0
+
     def get_file_by_hash(self, file_hash: str) -> Optional[str]:
         """
         通过哈希值获取文件路径
@@ -130,11 +483,13 @@ class FileHashManager:
         Returns:
             Optional[str]: 文件路径，如果不存在则返回None
         """
-        if file_hash in self.hash_db["files"] and self.hash_db["files"][file_hash]["paths"]:
-            # 返回第一个存在的文件路径
-            for path in self.hash_db["files"][file_hash]["paths"]:
-                if os.path.exists(path):
-                    return path
+        rows = self._connect().execute(
+            'SELECT path FROM file_paths WHERE hash = ? ORDER BY added_at', (file_hash,)
+        ).fetchall()
+        # 返回第一个存在的文件路径
+        for (path,) in rows:
+            if os.path.exists(path):
+                return path
         return None
 
     def check_file_exists(self, file_path: Union[str, Path]) -> Tuple[bool, Optional[str]]:
@@ -157,12 +512,13 @@ class FileHashManager:
             if not file_hash:
                 return False, None
 
-            # 检查哈希值是否存在
-            if file_hash in self.hash_db["files"]:
-                # 检查是否有存在的文件
-                for path in self.hash_db["files"][file_hash]["paths"]:
-                    if os.path.exists(path) and path != str(file_path):
-                        return True, file_hash
+            # 检查是否有存在的其他文件
+            rows = self._connect().execute(
+                'SELECT path FROM file_paths WHERE hash = ? AND path != ?', (file_hash, str(file_path))
+            ).fetchall()
+            for (path,) in rows:
+                if os.path.exists(path):
+                    return True, file_hash
 
             return False, file_hash
         except Exception as e:
@@ -170,7 +526,7 @@ class FileHashManager:
             return False, None
 
     def create_file_reference(self, source_path: Union[str, Path], target_path: Union[str, Path],
-                             category: str) -> bool:
+                             category: str, file_hash: Optional[str] = None) -> bool:
         """
         创建文件引用（如果内容相同则创建硬链接或复制）
 
@@ -178,6 +534,7 @@ class FileHashManager:
             source_path: 源文件路径
             target_path: 目标文件路径
             category: 文件类别
+            file_hash: 源文件已知的内容哈希值，提供时不再重新读取源文件
 
         Returns:
             bool: 是否成功创建引用
@@ -193,17 +550,17 @@ class FileHashManager:
         target_path.parent.mkdir(parents=True, exist_ok=True)
 
         # 检查源文件是否已在哈希数据库中
-        file_hash = self.calculate_file_hash(source_path)
+        file_hash = file_hash or self.get_path_hash(source_path) or self.calculate_file_hash(source_path)
         if not file_hash:
             return False
 
         try:
             # 如果目标文件已存在且哈希值相同，不需要操作
             if target_path.exists():
-                target_hash = self.calculate_file_hash(target_path)
+                target_hash = self.get_path_hash(target_path) or self.calculate_file_hash(target_path)
                 if target_hash == file_hash:
                     # 确保在哈希数据库中
-                    self.add_file(target_path, category)
+                    self.add_file(target_path, category, file_hash=file_hash)
                     return True
                 else:
                     # 哈希值不同，删除目标文件
@@ -220,7 +577,7 @@ class FileHashManager:
                 info(f"复制文件: {source_path} -> {target_path}")
 
             # 添加到哈希数据库
-            self.add_file(target_path, category)
+            self.add_file(target_path, category, file_hash=file_hash)
             return True
 
         except Exception as e:
@@ -267,16 +624,47 @@ def get_file_hash_manager() -> FileHashManager:
             def calculate_file_hash(self, file_path):
                 return ""
 
-            def add_file(self, file_path, category):
+            def calculate_bytes_hash(self, data):
+                return ""
+
+            def get_path_hash(self, file_path):
+                return None
+
+            def get_last_referenced(self, paths):
+                return {}
+
+            def open_verified(self, file_path, expected_hash):
+                return open(file_path, 'rb')
+
+            def store_bytes(self, data, target_path, category, file_hash=None, reuse_existing=True):
+                Path(target_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(target_path, 'wb') as f:
+                    f.write(data)
+                return str(target_path), "", True
+
+            def add_file(self, file_path, category, file_hash=None):
                 return "", False
 
+            def add_files(self, files):
+                return [("", False) for _ in files]
+
+            def remove_file(self, file_path):
+                return 0
+
+            def get_ref_count(self, file_hash):
+                return 0
+
+            @contextmanager
+            def batch(self):
+                yield None
+
             def get_file_by_hash(self, file_hash):
                 return None
 
             def check_file_exists(self, file_path):
                 return False, None
 
-            def create_file_reference(self, source_path, target_path, category):
+            def create_file_reference(self, source_path, target_path, category, file_hash=None):
                 try:
                     # 简单复制文件
                     shutil.copy2(source_path, target_path)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件索引模块 - 维护图片ID到文件路径的持久化索引
+上传、裁剪和清理时更新索引，启动时在后台重建；按ID查找文件时直接查询索引，不再列出整个目录
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from utils.log_client import info, error, warn
+
+# 索引数据库文件路径（SQLite，WAL模式，支持多进程并发访问）
+INDEX_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'file_index.db')
+
+# 文件名以图片ID（uuid）开头，后面跟 _ 或扩展名，例如 {id}_原文件名.png、{id}_detect.jpg
+_IMAGE_ID_PATTERN = re.compile(r'^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})(?=[_.]|$)')
+
+# 启动时多个worker同时重建索引没有意义，这个时间内已重建过则跳过
+REBUILD_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_index (
+    path TEXT PRIMARY KEY,
+    image_id TEXT NOT NULL,
+    root TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_file_index_image_id ON file_index(image_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def parse_image_id(filename: str) -> Optional[str]:
+    """从文件名中解析图片ID，不是以ID开头的文件返回None"""
+    match = _IMAGE_ID_PATTERN.match(os.path.basename(filename))
+    return match.group(1).lower() if match else None
+
+
+class FileIndex:
+    """图片ID到文件路径的索引"""
+
+    def __init__(self, db_path: str = INDEX_DB_PATH):
+        """
+        初始化文件索引
+
+        Args:
+            db_path: SQLite索引数据库路径
+        """
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self._ready = False
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._transaction() as conn:
+            for statement in _SCHEMA.strip().split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            # 上次运行留下的索引在写入时持续更新，可以直接使用，后台重建只用于修正外部改动
+            self._ready = conn.execute("SELECT 1 FROM meta WHERE key = 'rebuilt_at'").fetchone() is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（每个线程、每个进程一个连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    @staticmethod
+    def _row(path: str, root: str) -> Optional[Tuple]:
+        image_id = parse_image_id(path)
+        if image_id is None or os.path.basename(path).startswith('.'):
+            return None
+        path, root = os.path.abspath(path), os.path.abspath(root)
+        depth = os.path.relpath(path, root).count(os.sep)
+        return path, image_id, root, depth, time.time()
+
+    def add(self, path: str, root: str) -> bool:
+        """
+        登记一个文件
+
+        Args:
+            path: 文件路径
+            root: 所属文件夹（上传、临时、裁剪、下载文件夹），子目录中的文件按层级排在后面
+
+        Returns:
+            文件名是否包含图片ID（不包含时不登记）
+        """
+        return self.add_many([(path, root)]) > 0
+
+    def add_many(self, entries: Iterable[Tuple[str, str]]) -> int:
+        """批量登记文件，参数为 (路径, 所属文件夹) 列表，返回登记的数量"""
+        rows = [row for row in (self._row(*entry) for entry in entries) if row is not None]
+        if not rows:
+            return 0
+        try:
+            with self._transaction() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO file_index (path, image_id, root, depth, added_at) VALUES (?, ?, ?, ?, ?)',
+                    rows
+                )
+        except Exception as e:
+            error(f"更新文件索引失败: {e}")
+            return 0
+        return len(rows)
+
+    def remove(self, path: str):
+        """从索引中移除一个文件"""
+        self.remove_many([path])
+
+    def remove_many(self, paths: Iterable[str]):
+        """从索引中批量移除文件"""
+        rows = [(os.path.abspath(path),) for path in paths]
+        if not rows:
+            return
+        try:
+            with self._transaction() as conn:
+                conn.executemany('DELETE FROM file_index WHERE path = ?', rows)
+        except Exception as e:
+            error(f"更新文件索引失败: {e}")
+
+    def find(self, image_id: str, folders: Sequence[str]) -> List[str]:
+        """
+        按图片ID查找文件
+
+        Args:
+            image_id: 图片ID
+            folders: 要查找的文件夹，按优先级排列
+
+        Returns:
+            存在的文件路径列表，按文件夹优先级、层级和文件名排序；已不存在的文件会从索引中移除
+        """
+        folders = list(dict.fromkeys(os.path.abspath(folder) for folder in folders if folder))
+        if not folders:
+            return []
+        placeholders = ','.join('?' * len(folders))
+        rows = self._connect().execute(
+            f'SELECT path, root, depth FROM file_index WHERE image_id = ? AND root IN ({placeholders})',
+            (image_id.lower(), *folders)
+        ).fetchall()
+        order = {folder: i for i, folder in enumerate(folders)}
+        rows.sort(key=lambda row: (order[row[1]], row[2], os.path.basename(row[0])))
+
+        paths, stale = [], []
+        for path, _, _ in rows:
+            (paths if os.path.exists(path) else stale).append(path)
+        if stale:
+            self.remove_many(stale)
+        return paths
+
+    def is_ready(self) -> bool:
+        """索引是否可用（已重建过）；不可用时调用方应回退到目录扫描"""
+        return self._ready
+
+    def rebuild(self, folders: Sequence[str], force: bool = False) -> int:
+        """
+        扫描文件夹（包括一层子目录）重建索引
+
+        Args:
+            folders: 要索引的文件夹列表
+            force: 忽略 REBUILD_INTERVAL，总是重建
+
+        Returns:
+            登记的文件数量，跳过重建时返回-1
+        """
+        start_time = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'rebuilt_at'").fetchone()
+        if not force and row is not None and start_time - float(row[0]) < REBUILD_INTERVAL:
+            self._ready = True
+            return -1
+
+        folders = list(dict.fromkeys(os.path.abspath(folder) for folder in folders if folder))
+        rows = []
+        for root in folders:
+            if not os.path.isdir(root):
+                continue
+            try:
+                for item in os.scandir(root):
+                    if item.is_dir():
+                        rows.extend(self._row(sub.path, root) for sub in os.scandir(item.path) if sub.is_file())
+                    elif item.is_file():
+                        rows.append(self._row(item.path, root))
+            except OSError as e:
+                warn(f"扫描文件夹失败: {root}, {e}")
+        rows = [row for row in rows if row is not None]
+
+        with self._transaction() as conn:
+            conn.executemany('DELETE FROM file_index WHERE root = ?', [(root,) for root in folders])
+            conn.executemany(
+                'INSERT OR REPLACE INTO file_index (path, image_id, root, depth, added_at) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rebuilt_at', ?)", (str(time.time()),))
+        self._ready = True
+        info(f"文件索引重建完成，共 {len(rows)} 个文件，耗时: {time.time() - start_time:.2f}秒")
+        return len(rows)
+
+    def rebuild_in_background(self, folders: Sequence[str]) -> threading.Thread:
+        """在后台线程中重建索引，不阻塞启动"""
+        def run():
+            try:
+                self.rebuild(folders)
+            except Exception as e:
+                error(f"重建文件索引失败: {e}")
+        thread = threading.Thread(target=run, name='file-index-rebuild', daemon=True)
+        thread.start()
+        return thread
+
+
+# 单例模式
+_file_index = None
+_file_index_lock = threading.Lock()
+
+def get_file_index() -> FileIndex:
+    """获取文件索引实例（单例模式）"""
+    global _file_index
+    if _file_index is None:
+        with _file_index_lock:
+            if _file_index is None:
+                _file_index = FileIndex()
+    return _file_index
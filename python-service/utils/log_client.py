@@ -4,22 +4,230 @@
 """
 日志客户端模块 - 将日志发送到中央日志收集服务
 这个模块负责收集Python服务的日志并发送到Node.js服务的日志收集API
+日志先放入内存队列，由后台线程批量发送，请求处理路径上不再等待网络往返
 """
 
 import os
 import json
+import time
+import queue
+import atexit
 import socket
 import logging
+import threading
 import traceback
 from datetime import datetime
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 
+from utils.environment import get_config
+
 # 默认配置
 DEFAULT_LOG_API_ENDPOINT = "http://localhost:3000/api/logs/collect"
 
+
+class LogShipper:
+    """后台日志发送器，使用有界队列缓存日志并通过复用的连接批量发送"""
+
+    def __init__(self, api_endpoint: str, config: Dict[str, Any]):
+        """
+        初始化日志发送器
+
+        Args:
+            api_endpoint: 日志收集API端点
+            config: 日志配置（get_config('log')）
+        """
+        self.api_endpoint = api_endpoint
+        self.batch_size = max(1, int(config.get('batch_size', 100)))
+        self.flush_interval = max(0.01, float(config.get('flush_interval_ms', 1000)) / 1000.0)
+        self.timeout = float(config.get('timeout', 5))
+        self.batch_format = config.get('batch_format', 'single')
+        self.overflow_policy = config.get('overflow_policy', 'drop')
+        self.spill_path = config.get('spill_path', './logs/log_spill.jsonl')
+
+        self._queue = queue.Queue(maxsize=max(1, int(config.get('queue_size', 10000))))
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'enqueued': 0, 'sent': 0, 'dropped': 0, 'spilled': 0, 'failed_batches': 0}
+
+        self._pid = None
+        self._worker = None
+        self._session = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_worker(self):
+        """确保当前进程中有发送线程（Gunicorn fork之后需要重新启动线程和连接）"""
+        if self._pid == os.getpid() and self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._worker is not None and self._worker.is_alive():
+                return
+            if self._pid != os.getpid():
+                # 子进程不能复用父进程的连接和队列锁
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._session = None
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name='log-shipper', daemon=True)
+            self._worker.start()
+
+    def _get_session(self) -> requests.Session:
+        """获取复用连接的HTTP会话"""
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def enqueue(self, log_data: Dict[str, Any]) -> bool:
+        """
+        将日志放入发送队列，不阻塞调用方
+
+        Returns:
+            是否已进入队列（或写入本地溢出文件）
+        """
+        if self._closed:
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(log_data)
+        except queue.Full:
+            return self._overflow([log_data])
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def _overflow(self, entries: List[Dict[str, Any]]) -> bool:
+        """队列已满或发送失败时按策略处理日志"""
+        if self.overflow_policy == 'spill':
+            try:
+                with self._spill_lock:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+                    with open(self.spill_path, 'a', encoding='utf-8') as f:
+                        for entry in entries:
+                            f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+                with self._stats_lock:
+                    self._stats['spilled'] += len(entries)
+                return True
+            except Exception as e:
+                print(f"写入日志溢出文件时出错: {e}")
+
+        with self._stats_lock:
+            self._stats['dropped'] += len(entries)
+        return False
+
+    def _run(self):
+        """后台线程主循环：攒够一批或到达刷新间隔后发送"""
+        while True:
+            batch = []
+            waiters = []
+            deadline = None
+            stop = False
+
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    # flush请求：立即发送已收集的日志
+                    waiters.append(item)
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.time() + self.flush_interval
+
+            if batch:
+                self._send_batch(batch)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _send_batch(self, batch: List[Dict[str, Any]]):
+        """发送一批日志到收集服务"""
+        try:
+            session = self._get_session()
+            if self.batch_format == 'array':
+                response = session.post(self.api_endpoint, json=batch, timeout=self.timeout)
+                ok = response.status_code in (200, 201)
+            else:
+                ok = True
+                for entry in batch:
+                    # 与原有收集服务的约定一致：每条日志一个JSON对象，成功时返回201
+                    response = session.post(self.api_endpoint, json=entry, timeout=self.timeout)
+                    ok = ok and response.status_code == 201
+        except RequestException as e:
+            print(f"发送日志时出错: {e}")
+            ok = False
+        except Exception as e:
+            print(f"发送日志时发生未知错误: {e}")
+            ok = False
+
+        if ok:
+            with self._stats_lock:
+                self._stats['sent'] += len(batch)
+            return
+
+        with self._stats_lock:
+            self._stats['failed_batches'] += 1
+        self._overflow(batch)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        等待队列中已有的日志发送完毕
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            是否在超时前完成
+        """
+        if self._worker is None or self._pid != os.getpid() or not self._worker.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """刷新剩余日志并停止发送线程"""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._worker.join(timeout)
+        if self._session is not None:
+            self._session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取发送统计信息"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_size'] = self._queue.maxsize
+        stats['overflow_policy'] = self.overflow_policy
+        return stats
+
+
 class LogClient:
     """日志客户端类，用于发送日志到中央日志收集服务"""
 
@@ -37,6 +245,9 @@ class LogClient:
             self.api_endpoint = api_endpoint or os.environ.get('LOG_API_ENDPOINT', DEFAULT_LOG_API_ENDPOINT)
         self.hostname = socket.gethostname()
 
+        # 后台批量发送器
+        self.shipper = LogShipper(self.api_endpoint, get_config('log')) if self.api_endpoint else None
+
         # 配置Python日志系统
         self.logger = logging.getLogger('python-service')
 
@@ -56,7 +267,7 @@ class LogClient:
             **kwargs: 其他字段
 
         Returns:
-            是否发送成功
+            是否已提交发送（日志由后台线程异步发送）
         """
         # 如果API端点为空，则不发送日志
         if not self.api_endpoint:
@@ -77,16 +288,29 @@ class LogClient:
                 if value is not None:
                     log_data[key] = value
 
-            # 发送到API
-            response = requests.post(self.api_endpoint, json=log_data, timeout=5)
-            return response.status_code == 201
-        except RequestException as e:
-            print(f"发送日志时出错: {e}")
-            return False
+            # 放入后台发送队列
+            return self.shipper.enqueue(log_data)
         except Exception as e:
             print(f"发送日志时发生未知错误: {e}")
             return False
 
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待已提交的日志发送完毕"""
+        if self.shipper is None:
+            return True
+        return self.shipper.flush(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """刷新剩余日志并停止后台发送"""
+        if self.shipper is not None:
+            self.shipper.close(timeout)
+
+    def get_stats(self) -> Optional[Dict[str, Any]]:
+        """获取日志发送统计信息，未启用发送时返回None"""
+        if self.shipper is None:
+            return None
+        return self.shipper.get_stats()
+
 
 class LogApiHandler(logging.Handler):
     """自定义日志处理器，将日志发送到API"""
@@ -140,6 +364,13 @@ class LogApiHandler(logging.Handler):
 # 创建全局日志客户端实例
 log_client = LogClient()
 
+# 进程退出时发送剩余日志
+atexit.register(log_client.close)
+
+def flush_logs(timeout: float = 5.0) -> bool:
+    """等待已提交的日志发送完毕"""
+    return log_client.flush(timeout)
+
 # 导出日志级别函数，方便使用
 def info(message: str, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> bool:
     """发送INFO级别日志"""
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+内存缓存工具模块 - 线程安全的LRU缓存，支持过期时间和按大小淘汰
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class LRUCache:
+    """线程安全的LRU缓存，按条目数量、总大小和过期时间淘汰"""
+
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大条目数
+            ttl: 过期时间（秒），None或0表示不过期
+            max_bytes: 缓存值的最大总大小（字节），None表示不限制
+            sizeof: 计算缓存值大小的函数，设置max_bytes时使用
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl or None
+        self.max_bytes = max_bytes or None
+        self.sizeof = sizeof or (lambda value: 0)
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key, default=None):
+        """读取缓存，命中时将条目移到最近使用的位置"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats['misses'] += 1
+                return default
+
+            value, expires_at, size = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                self._bytes -= size
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return default
+
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value):
+        """写入缓存，超出数量或大小限制时淘汰最久未使用的条目"""
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            # 单个值比整个缓存还大，不缓存
+            return
+        expires_at = time.time() + self.ttl if self.ttl else None
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        """删除缓存条目"""
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is not None:
+                self._bytes -= item[2]
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._data)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        return stats
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ZIP流式打包工具模块 - 按需生成ZIP下载内容
+这个模块根据清单（manifest）在下载时边读取边输出ZIP数据，不在磁盘上生成ZIP文件
+"""
+
+import io
+import os
+import json
+import time
+import zipfile
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+
+from utils.log_client import info, error
+
+# 清单文件后缀，清单与ZIP下载地址一一对应: crop_xxx.zip -> crop_xxx.zip.manifest.json
+MANIFEST_SUFFIX = '.manifest.json'
+
+# 已经是压缩格式的文件直接存储，不再重复压缩
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip'}
+
+# 每次读取源文件的块大小
+CHUNK_SIZE = 256 * 1024
+
+
+class ManifestEntryError(Exception):
+    """清单条目对应的内容已被删除或修改，无法再打包出与清单一致的ZIP"""
+
+
+class _StreamBuffer(io.RawIOBase):
+    """只写、不可寻址的缓冲区，ZipFile写入后由生成器取走数据"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def get_manifest_path(zip_path: str) -> str:
+    """获取ZIP路径对应的清单文件路径"""
+    return f"{zip_path}{MANIFEST_SUFFIX}"
+
+
+def write_manifest(zip_path: str, entries: List[Dict[str, Any]]) -> str:
+    """
+    写入ZIP清单文件
+
+    Args:
+        zip_path: ZIP下载路径（文件本身不会被创建）
+        entries: 条目列表，每个条目包含 arcname，以及 path、内容哈希 hash 和可选的大小 size，或内联的 data
+
+    Returns:
+        清单文件路径
+
+    Raises:
+        ValueError: 文件条目没有记录内容哈希（路径上的内容之后可能被覆盖，下载时无法校验）
+    """
+    for entry in entries:
+        if 'data' not in entry and not entry.get('hash'):
+            raise ValueError(f"ZIP清单条目缺少内容哈希: {entry.get('arcname')}")
+
+    manifest_path = get_manifest_path(zip_path)
+    tmp_path = os.path.join(os.path.dirname(manifest_path), f".{os.path.basename(manifest_path)}.part")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'filename': os.path.basename(zip_path),
+            'created_at': time.time(),
+            'entries': entries
+        }, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+def load_manifest(zip_path: str) -> Optional[Dict[str, Any]]:
+    """读取ZIP清单，不存在时返回None"""
+    manifest_path = get_manifest_path(zip_path)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        error(f"读取ZIP清单失败: {manifest_path}, {e}")
+        return None
+
+
+def _check_path(entry: Dict[str, Any]):
+    """默认的条目检查方式：记录的路径存在"""
+    if not entry.get('path') or not os.path.isfile(entry['path']):
+        raise ManifestEntryError(f"ZIP条目对应的文件不存在: {entry.get('arcname')}")
+
+
+def _open_path(entry: Dict[str, Any]) -> BinaryIO:
+    """默认的条目打开方式：直接打开记录的路径"""
+    try:
+        return open(entry['path'], 'rb')
+    except (KeyError, OSError) as e:
+        raise ManifestEntryError(f"ZIP条目对应的文件不存在: {entry.get('arcname')}") from e
+
+
+def iter_zip_stream(entries: List[Dict[str, Any]],
+                    open_entry: Optional[Callable[[Dict[str, Any]], BinaryIO]] = None,
+                    check_entry: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[bytes]:
+    """
+    检查清单中的文件都存在，返回逐块生成ZIP数据的迭代器
+
+    开始输出之前只检查文件是否存在（不读取内容），首字节时间与条目数量和大小无关；
+    每个文件在写入对应条目时才打开，写完即关闭，同一时间只打开一个文件。
+    打开的文件在读取过程中发现内容与清单不一致时抛出异常，输出随之中止，客户端得到的是不完整的ZIP而不是内容错误的ZIP
+
+    Args:
+        entries: 清单条目列表
+        open_entry: 可选的回调，接收条目并返回以二进制模式打开的文件（例如边读取边校验内容哈希）
+        check_entry: 可选的回调，在开始输出前检查条目，无法提供与清单一致的内容时抛出 ManifestEntryError
+
+    Returns:
+        ZIP数据块的迭代器
+
+    Raises:
+        ManifestEntryError: 任一条目的文件不存在
+    """
+    check_entry = check_entry or _check_path
+    for entry in entries:
+        if 'data' not in entry:
+            check_entry(entry)
+    return _iter_zip_data(entries, open_entry or _open_path)
+
+
+def _iter_zip_data(entries: List[Dict[str, Any]],
+                   open_entry: Callable[[Dict[str, Any]], BinaryIO]) -> Iterator[bytes]:
+    """按条目顺序输出ZIP数据，写入每个文件条目之前才打开对应的文件"""
+    buffer = _StreamBuffer()
+    date_time = time.localtime(time.time())[:6]
+
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for entry in entries:
+            arcname = entry['arcname']
+
+            # 内联数据（如矩形信息JSON）
+            if 'data' in entry:
+                zinfo = zipfile.ZipInfo(arcname, date_time=date_time)
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                zipf.writestr(zinfo, entry['data'])
+                yield buffer.pop()
+                continue
+
+            try:
+                with open_entry(entry) as src:
+                    stat = os.fstat(src.fileno())
+                    zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(stat.st_mtime)[:6])
+                    zinfo.file_size = stat.st_size
+                    ext = os.path.splitext(arcname)[1].lower()
+                    zinfo.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+                    with zipf.open(zinfo, 'w') as dest:
+                        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                            dest.write(chunk)
+                            data = buffer.pop()
+                            if data:
+                                yield data
+            except Exception as e:
+                error(f"ZIP流式输出中止: {arcname}, {e}")
+                raise
+
+            data = buffer.pop()
+            if data:
+                yield data
+
+    # 中央目录
+    data = buffer.pop()
+    if data:
+        yield data
+
+    info(f"ZIP流式输出完成，共 {len(entries)} 个条目")